@@ -0,0 +1,41 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+
+# Set.jsonのLOG_LEVEL -> ログレベル
+LOG_LEVELS = {
+    "0": logging.ERROR,
+    "1": logging.WARNING,
+    "2": logging.INFO,
+    "3": logging.DEBUG,
+}
+
+
+# キューに追加するだけのハンドラ(メッセージの整形は出力スレッドで行う)
+#   引数はそのまま出力スレッドに渡るため、後で変更される辞書・リストなどは文字列かコピーにして渡すこと
+class LazyQueueHandler(logging.handlers.QueueHandler):
+
+    def prepare(self, record):
+        # 例外のトレースバックのみ呼び出し元のスレッドで文字列にしておく
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+
+# ロガーの出力をバックグラウンドのスレッドで行うように設定
+#   handlers: 実際に出力するハンドラ(ファイル、標準出力など)
+def set_queue_logging(logger, handlers, level=logging.INFO):
+    log_queue = queue.SimpleQueue()
+    logger.setLevel(level)
+    logger.propagate = False
+    logger.addHandler(LazyQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # 終了時に未出力のログを出力してから停止
+    atexit.register(listener.stop)
+    return listener
+
+
+def get_log_level(value, default=logging.INFO):
+    return LOG_LEVELS.get(str(value), default)
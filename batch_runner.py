@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# 複数シナリオの並列実行
+#   シナリオごとにsumo_sim.pyを別プロセスで起動し、TraCIポート・受信ポート・出力ディレクトリを分けて実行する
+#   実行結果(終了コード、実行時間)はsummary.csvに出力する
+import concurrent.futures
+import csv
+import datetime
+import glob
+import optparse
+import os
+import subprocess
+import sys
+import time
+
+SCENARIO_ROOT = "/home/traffic/SUMO_SCENARIO"
+SUMO_SIM = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sumo_sim.py")
+SUMMARY_COLUMNS = ["map", "scenario", "traci_port", "http_port", "return_code", "start_time", "end_time", "elapsed_s", "output_directory"]
+
+
+def get_options(args=None):
+    optParser = optparse.OptionParser(usage="%prog [options] [-- sumo_sim.py options]")
+    optParser.add_option("--map", help="map name (scenario names in --scenario-list are relative to this map)")
+    optParser.add_option("--scenario-list",
+                            help="comma separated scenarios (map/scenario, scenario, map name or glob like tatemachi_*/scenario_*)")
+    optParser.add_option("--scenario-root", default=SCENARIO_ROOT, help="scenario root directory")
+    optParser.add_option("--sim-config", default="Set.json", help="sumo simulation config file")
+    optParser.add_option("--workers", type=int, default=os.cpu_count() or 1, help="number of parallel runs")
+    optParser.add_option("--traci-port", type=int, default=8813, help="first TraCI port (incremented per run)")
+    optParser.add_option("--http-port", type=int, default=5100, help="first receiver port (incremented per run)")
+    optParser.add_option("--output-directory", default="result", help="output root directory")
+    optParser.add_option("--time", type=int, help="sim time (required)")
+    optParser.add_option("--seed", type=int, help="random seed")
+    options, args = optParser.parse_args(args)
+    return options, args
+
+
+# シナリオ指定を(マップ名, シナリオ名)のリストに展開
+def expand_scenarios(scenario_list, scenario_root, map_name=None, sim_config="Set.json"):
+    scenarios = []
+    for entry in scenario_list.split(","):
+        entry = entry.strip().strip("/")
+        if entry == "":
+            continue
+        if map_name and "/" not in entry:
+            entry = map_name + "/" + entry
+
+        paths = sorted(glob.glob(os.path.join(scenario_root, entry)))
+        for path in paths:
+            if os.path.isfile(os.path.join(path, sim_config)):
+                scenarios.append(os.path.relpath(path, scenario_root))
+            else:
+                # マップ名のみ指定された場合はマップ内のすべてのシナリオ
+                for sub_path in sorted(glob.glob(os.path.join(path, "*", sim_config))):
+                    scenarios.append(os.path.relpath(os.path.dirname(sub_path), scenario_root))
+
+    result = []
+    for scenario in scenarios:
+        map_scenario = tuple(scenario.split(os.sep, 1))
+        if len(map_scenario) == 2 and map_scenario not in result:
+            result.append(map_scenario)
+    return result
+
+
+# 1シナリオ分の実行
+def run_scenario(map_name, scenario, traci_port, http_port, options, extra_args):
+    output_directory = os.path.join(options.output_directory, map_name, scenario)
+    os.makedirs(output_directory, exist_ok=True)
+    cmd = [
+        sys.executable, SUMO_SIM, "--nogui",
+        "--map", map_name,
+        "--scenario", scenario,
+        "--scenario-root", options.scenario_root,
+        "--sim-config", options.sim_config,
+        "--traci-port", str(traci_port),
+        "--http-port", str(http_port),
+        "--output-directory", output_directory,
+    ]
+    if options.time is not None:
+        cmd += ["--time", str(options.time)]
+    if options.seed is not None:
+        cmd += ["--seed", str(options.seed)]
+    cmd += extra_args
+
+    start_time = datetime.datetime.now()
+    start = time.perf_counter()
+    with open(os.path.join(output_directory, "run.log"), "w") as log_file:
+        return_code = subprocess.call(cmd, stdout=log_file, stderr=subprocess.STDOUT, cwd=os.path.dirname(SUMO_SIM))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "map": map_name,
+        "scenario": scenario,
+        "traci_port": traci_port,
+        "http_port": http_port,
+        "return_code": return_code,
+        "start_time": start_time.isoformat(timespec="seconds"),
+        "end_time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "elapsed_s": round(elapsed, 3),
+        "output_directory": output_directory,
+    }
+
+
+# すべてのシナリオを並列実行してsummary.csvを出力(失敗したシナリオ数を返す)
+def run_batch(options, extra_args):
+    scenarios = expand_scenarios(options.scenario_list or "", options.scenario_root, options.map, options.sim_config)
+    if not scenarios:
+        print("実行するシナリオがありません。")
+        return 1
+
+    # sumo_sim.pyはスクリプトのディレクトリで実行するため絶対パスにしておく
+    options.output_directory = os.path.abspath(options.output_directory)
+    options.scenario_root = os.path.abspath(options.scenario_root)
+    os.makedirs(options.output_directory, exist_ok=True)
+    workers = max(1, options.workers)
+    print("%d scenarios, %d workers" % (len(scenarios), workers))
+
+    results = []
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for i, (map_name, scenario) in enumerate(scenarios):
+            futures.append(executor.submit(
+                run_scenario, map_name, scenario, options.traci_port + i, options.http_port + i, options, extra_args))
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print("%s/%s: return code %d (%.1f s)" % (result["map"], result["scenario"], result["return_code"], result["elapsed_s"]))
+
+    results.sort(key=lambda result: (result["map"], result["scenario"]))
+    summary_file = os.path.join(options.output_directory, "summary.csv")
+    with open(summary_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(results)
+
+    failed = sum(1 for result in results if result["return_code"] != 0)
+    print("finished: %d scenarios, %d failed, %.1f s -> %s" % (len(results), failed, time.perf_counter() - start, summary_file))
+    return failed
+
+
+def main(args=None):
+    options, extra_args = get_options(args)
+    if options.time is None:
+        print("シミュレーション時間(--time)を指定してください。")
+        return 1
+    return 1 if run_batch(options, extra_args) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# 受信サーバ(SumoSim.post_sim_recv)のスループット計測
+#   起動中のシミュレータにコマンドをPOSTし、リクエスト数/秒とレイテンシを表示する
+#   デフォルトのコマンド(0x00000070)は受信処理のみ行われ、シミュレーションには反映されない
+import json
+import optparse
+import threading
+import time
+
+from event_sender import pack_commands
+from command_codec import encode_command
+from http_pool import HttpConnectionPool
+
+
+def get_options():
+    optParser = optparse.OptionParser()
+    optParser.add_option("--url", dest="url", default="http://127.0.0.1:5000/",
+                            help="receiver url")
+    optParser.add_option("--requests", type="int", dest="requests", default=10000,
+                            help="total number of requests")
+    optParser.add_option("--concurrency", type="int", dest="concurrency", default=4,
+                            help="number of client threads")
+    optParser.add_option("--batch", type="int", dest="batch", default=1,
+                            help="number of commands per request (JSON array if more than 1)")
+    optParser.add_option("--command-id", dest="command_id", default="0x00000070",
+                            help="CommandID of the posted command")
+    optParser.add_option("--timeout", type="float", dest="timeout", default=30,
+                            help="request timeout in seconds")
+    options, args = optParser.parse_args()
+    return options
+
+
+def make_body(command_id, batch):
+    command = {
+        "CommandID": command_id,
+        "EventID": "BENCH_0",
+        "TimeStamp": "0",
+        "Value": [{"LaneType": "0", "LaneState": "0"}],
+    }
+    data = encode_command(command)
+    if batch <= 1:
+        return data
+    return pack_commands([data] * batch)
+
+
+def client_run(pool, url, body, count, latencies, errors, lock):
+    headers = {'Content-Type': 'application/json',}
+    local_latencies = []
+    local_errors = 0
+    for i in range(count):
+        start = time.perf_counter()
+        try:
+            status, data = pool.post(url, body, headers)
+            if status >= 400:
+                local_errors += 1
+        except Exception:
+            local_errors += 1
+            continue
+        local_latencies.append(time.perf_counter() - start)
+
+    with lock:
+        latencies.extend(local_latencies)
+        errors.append(local_errors)
+
+
+def main():
+    options = get_options()
+    body = make_body(options.command_id, options.batch)
+    concurrency = max(1, options.concurrency)
+    pool = HttpConnectionPool(concurrency, 30, options.timeout)
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    threads = []
+    per_thread = options.requests // concurrency
+    start = time.perf_counter()
+    for i in range(concurrency):
+        count = per_thread + (1 if i < options.requests % concurrency else 0)
+        thread = threading.Thread(target=client_run, args=(pool, options.url, body, count, latencies, errors, lock))
+        threads.append(thread)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    pool.close()
+
+    latencies.sort()
+    result = {
+        "requests": options.requests,
+        "commands_per_request": max(1, options.batch),
+        "concurrency": concurrency,
+        "errors": sum(errors),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "latency_avg_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "latency_p50_ms": round(latencies[int(len(latencies) * 0.5)] * 1000, 3) if latencies else 0.0,
+        "latency_p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3) if latencies else 0.0,
+        "connect": pool.stats()["connect"],
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
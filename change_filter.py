@@ -0,0 +1,41 @@
+# 変化時のみ送信するコマンドの既定値(CHANGE_ONLY_COMMAND_LISTが空の場合)
+#   毎ステップ同じ内容を送信し直す状態のコマンドのみ
+DEFAULT_CHANGE_ONLY_COMMAND_LIST = (
+    "0xF0010010",   # 信号認識(--new-signal-event)
+    "0xF0070000",   # 接近・離脱検知
+    "0xF0010700",   # ナンバープレート認識
+    "0xF0080000",   # ナンバープレート認識(分岐)
+)
+# 発生ごとに送信するイベントのコマンド(同じ内容が続いても別のイベントのため間引かない)
+EVENT_COMMAND_LIST = (
+    "0xF0060000",   # 侵入・離脱
+    "0xF0060100",
+)
+
+
+# ノード・コマンドIDごとに前回送信内容と比較し、変化がないコマンドを間引く
+#   EventID・TimeStampは比較対象外
+#   heartbeat_interval(ms)経過した場合は変化がなくても送信する(0の場合は変化時のみ)
+class ChangeOnlyFilter:
+
+    def __init__(self, command_list=(), heartbeat_interval=0) -> None:
+        self.command_ids = set(command_list or DEFAULT_CHANGE_ONLY_COMMAND_LIST) - set(EVENT_COMMAND_LIST)
+        self.heartbeat_interval = heartbeat_interval
+        self.last_sent = {}     # (ノードID, コマンドID) -> (EventID・TimeStamp以外の送信内容, 送信時刻(ms))
+
+    # 変化がなく送信しない場合はTrue
+    def is_unchanged(self, command_dict, now_time):
+        command_id = command_dict.get("CommandID", "")
+        if command_id not in self.command_ids:
+            return False
+
+        node_id = command_dict.get("EventID", "").split("_")[0]
+        payload = {key: value for key, value in command_dict.items() if key not in ("EventID", "TimeStamp")}
+        key = (node_id, command_id)
+        last = self.last_sent.get(key)
+        if last is not None and last[0] == payload:
+            if self.heartbeat_interval <= 0 or now_time - last[1] < self.heartbeat_interval:
+                return True
+
+        self.last_sent[key] = (payload, now_time)
+        return False
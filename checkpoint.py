@@ -0,0 +1,117 @@
+import json
+import os
+import random
+
+# チェックポイントのディレクトリ内のファイル
+CHECKPOINT_SUMO_STATE = "state.xml.gz"      # SUMOの状態(traci.simulation.saveState)
+CHECKPOINT_SIM_STATE = "sim_state.json"     # SUMO-SIM側の状態
+CHECKPOINT_VERSION = 1
+
+# 保存するSumoSimの属性(JSONに変換可能なもののみ)
+SIM_STATE_ATTRIBUTES = (
+    "vehicle_info",
+    "tls_state_list",
+    "leading_vehicle_info",
+    "residence_vehicle_number",
+    "inside_car_number",
+    "congestion_vehicle_number",
+    "go_possible_flag",
+    "go_possible_time",
+    "go_possible_sim_time",
+    "straight_vehicle_number",
+    "regulation_vehicle_number",
+    "time_out_flag",
+    "time_out_timestamp",
+    "time_out_sim_timestamp",
+    "time_out_history_flag",
+    "time_out_value",
+    "time_out_side",
+    "construction_vehicle_time",
+    "construction_vehicle",
+    "guide_traffic_light",
+    "collision_caution",
+    "time_lag",
+    "change_time",
+    "suppressed_command_number",
+)
+# 時計の時刻(ms)を保持する属性(読み込み時に現在の時計に合わせてずらす)
+SIM_STATE_CLOCK_ATTRIBUTES = (
+    "go_possible_time",
+    "time_out_timestamp",
+    "construction_vehicle_time",
+    "change_time",
+)
+
+
+def get_sumo_state_path(directory):
+    return os.path.join(directory, CHECKPOINT_SUMO_STATE)
+
+
+def get_sim_state_path(directory):
+    return os.path.join(directory, CHECKPOINT_SIM_STATE)
+
+
+def is_checkpoint(directory):
+    return os.path.isfile(get_sumo_state_path(directory)) and os.path.isfile(get_sim_state_path(directory))
+
+
+# チェックポイントの保存
+#   SUMOの状態とSUMO-SIM側の状態(認識処理の状態、タイムアウト・衝突のフラグ、カウンタ、乱数の状態)を保存する
+#   loop_state: runのループ内の状態(前回の信号状態、前回送信時刻など)
+#   遅延送信待ちのコマンドと変化時のみ送信の前回送信内容は保存しない(読み込み後に送信し直す)
+def save_checkpoint(directory, sim, traci_module, loop_state):
+    os.makedirs(directory, exist_ok=True)
+    traci_module.simulation.saveState(get_sumo_state_path(directory))
+
+    sim_state = {
+        "version": CHECKPOINT_VERSION,
+        "scenario_name": sim.scenario_name,
+        "sim_time": sim.current_sim_time,
+        "sim_time_ms": sim.current_sim_time_ms,
+        "clock_ms": sim.clock.now_ms(),
+        # シミュレーション時間の時計の開始時刻(実時間の時計の場合はNone)
+        "clock_start_ms": getattr(sim.clock, "start_ms", None),
+        "attributes": {name: getattr(sim, name, None) for name in SIM_STATE_ATTRIBUTES},
+        "loop_state": loop_state,
+        "random_state": random.getstate(),
+    }
+    # 途中で終了しても壊れたファイルが残らないように一時ファイルに書き込んでから置き換える
+    path = get_sim_state_path(directory)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(sim_state, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+# SUMOの状態の読み込み(TraCI開始直後、サブスクリプション設定前に実行)
+def load_sumo_state(directory, traci_module):
+    traci_module.simulation.loadState(get_sumo_state_path(directory))
+
+
+# SUMO-SIM側の状態の読み込み(loop_stateを返す)
+def load_sim_state(directory, sim):
+    with open(get_sim_state_path(directory), encoding="utf-8") as f:
+        sim_state = json.load(f)
+    if sim_state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError("unsupported checkpoint version: %s" % (sim_state.get("version")))
+
+    attributes = sim_state["attributes"]
+    for name in SIM_STATE_ATTRIBUTES:
+        if name in attributes:
+            setattr(sim, name, attributes[name])
+
+    # シミュレーション時間の時計は保存時の開始時刻に戻す(TimeStampなどが中断しない場合と同じになる)
+    clock_start_ms = sim_state.get("clock_start_ms")
+    if clock_start_ms is not None and hasattr(sim.clock, "rebase"):
+        sim.clock.rebase(clock_start_ms)
+
+    # 保存時の時計の時刻との差分だけずらす(経過時間の判定を保存時から継続させる、時計を戻した場合は差分なし)
+    clock_offset = sim.clock.now_ms() - sim_state["clock_ms"]
+    for name in SIM_STATE_CLOCK_ATTRIBUTES:
+        value = getattr(sim, name, None)
+        if value:
+            setattr(sim, name, value + clock_offset)
+
+    # JSONではタプルがリストになるため戻す
+    version, internal_state, gauss_next = sim_state["random_state"]
+    random.setstate((version, tuple(internal_state), gauss_next))
+    return sim_state["loop_state"]
@@ -0,0 +1,44 @@
+import json
+from collections import namedtuple
+
+# orjsonがインストールされている場合は高速なエンコーダを使用
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 送信コマンド(辞書とエンコード済みJSONの組、エンコードは1コマンドにつき1回のみ)
+#   command     : コマンドの辞書
+#   data        : コンパクトなJSON(UTF-8のbytes)
+#   node_no     : ノード番号(遅延設定ファイル用、対象外のコマンドはNone)
+#   sensor_id   : センサーID(遅延設定ファイル用、対象外のコマンドはNone)
+class OutboundCommand(namedtuple("OutboundCommand", ["command", "data", "node_no", "sensor_id"], defaults=(None, None))):
+    __slots__ = ()
+
+    # ノードID取得(EventIDの先頭部分)
+    @property
+    def node_id(self):
+        return self.command.get("EventID", "").split("_")[0]
+
+    # ログ出力時はエンコード済みJSONをそのまま使用
+    def __str__(self):
+        return self.data.decode("utf-8")
+
+
+# numpyの数値など標準のJSONで扱えない値の変換
+def encode_default(value):
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+# コマンドの辞書をコンパクトなJSON(bytes)に変換
+def encode_command(command_dict):
+    if orjson is not None:
+        return orjson.dumps(command_dict, default=encode_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(command_dict, separators=(",", ":"), ensure_ascii=False, default=encode_default).encode("utf-8")
+
+
+def make_command(command_dict, node_no=None, sensor_id=None):
+    return OutboundCommand(command_dict, encode_command(command_dict), node_no, sensor_id)
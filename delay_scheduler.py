@@ -0,0 +1,58 @@
+import heapq
+import itertools
+
+
+# 遅延送信のスケジューラ(送信時刻(シミュレーション時間)をキーにした最小ヒープ)
+#   シミュレーションのステップごとにpop_dueを呼び出し、送信時刻に達したデータを取り出す
+class DelayScheduler:
+
+    def __init__(self) -> None:
+        self.heap = []                  # (送信時刻, 追加順, データ)
+        self.counter = itertools.count()
+        self.scheduled_count = 0
+        self.released_count = 0
+        self.max_pending = 0
+        self.total_lateness = 0
+        self.max_lateness = 0
+
+    # 遅延データ追加
+    def schedule(self, send_time, data):
+        heapq.heappush(self.heap, (send_time, next(self.counter), data))
+        self.scheduled_count += 1
+        if len(self.heap) > self.max_pending:
+            self.max_pending = len(self.heap)
+
+    # 送信時刻に達したデータを送信時刻順に取り出す(同じ送信時刻の場合は追加順)
+    def pop_due(self, now_time):
+        due = []
+        heap = self.heap
+        while heap and heap[0][0] <= now_time:
+            send_time, _, data = heapq.heappop(heap)
+            # 送信時刻からの遅れ(ステップ間隔以内)
+            lateness = now_time - send_time
+            self.total_lateness += lateness
+            if lateness > self.max_lateness:
+                self.max_lateness = lateness
+            due.append(data)
+        self.released_count += len(due)
+        return due
+
+    # 未送信データ数
+    def pending(self):
+        return len(self.heap)
+
+    # 次の送信時刻(未送信データがない場合None)
+    def next_time(self):
+        if not self.heap:
+            return None
+        return self.heap[0][0]
+
+    def stats(self):
+        return {
+            "scheduled": self.scheduled_count,
+            "released": self.released_count,
+            "pending": self.pending(),
+            "max_pending": self.max_pending,
+            "lateness_avg_ms": self.total_lateness / self.released_count if self.released_count else 0.0,
+            "lateness_max_ms": self.max_lateness,
+        }
@@ -0,0 +1,117 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+
+# 1検出器分の状態(1ステップ分、読み取り専用)
+#   vehicle_ids     : 検出器上の車両ID
+#   dist_to_end     : 車両ID -> 検出器終端までの距離
+#   speed           : 車両ID -> 速度(m/s)
+#   vehicle_length  : 車両ID -> 車両の長さ
+#   position        : [離脱, 接近] 車両ID -> 車両全体を含む場合の車両位置
+#   sorted_ids      : [離脱, 接近] 工事帯に近い順の車両ID
+DetectorState = namedtuple("DetectorState", [
+    "detector_id",
+    "detector_length",
+    "vehicle_ids",
+    "dist_to_end",
+    "speed",
+    "vehicle_length",
+    "position",
+    "sorted_ids",
+])
+
+
+# 車両全体が検出器に入っているときの車両位置の倍率
+#   車両が検出器より長い(または同じ長さの)場合は車両全体が入ることはないためNone
+def get_vehicle_magnification(detector_length, vehicle_length):
+    if detector_length <= vehicle_length:
+        return None
+    return detector_length / (detector_length - vehicle_length)
+
+
+class DetectorSnapshot:
+
+    def __init__(self, sim_time_ms, detector_states) -> None:
+        self.sim_time_ms = sim_time_ms
+        self._states = MappingProxyType(dict(detector_states))
+
+    # 検出器の状態取得(スナップショットにない検出器の場合None)
+    def get(self, detector_id):
+        return self._states.get(detector_id)
+
+    def __contains__(self, detector_id):
+        return detector_id in self._states
+
+    def detector_ids(self):
+        return tuple(self._states.keys())
+
+    # 検出器上の車両ID取得
+    def get_vehicle_ids(self, detector_id):
+        state = self._states.get(detector_id)
+        if state is None:
+            return None
+        return state.vehicle_ids
+
+    # 検出器終端までの距離取得
+    def get_dist_to_end(self, detector_id, vehicle_id):
+        state = self._states.get(detector_id)
+        if state is None:
+            return None
+        return state.dist_to_end.get(vehicle_id)
+
+    # 工事帯に近い順の車両ID取得
+    def get_sorted_vehicle_ids(self, detector_id, detection):
+        state = self._states.get(detector_id)
+        if state is None:
+            return None
+        return state.sorted_ids[bool(detection)]
+
+    # 1ステップ分のスナップショット作成
+    @classmethod
+    def build(cls, sim_time_ms, detectors):
+        # detectors: (検出器ID, 検出器の長さ, [(車両ID, 検出器終端までの距離, 速度, 車両の長さ), ...]) のリスト
+        detector_states = {}
+        for detector_id, detector_length, vehicles in detectors:
+            vehicle_ids = []
+            dist_to_end = {}
+            speed = {}
+            vehicle_length = {}
+            approach_position = {}
+            breakaway_position = {}
+            magnifications = {}     # 車両の長さ -> 倍率(同じ車種の車両は1回だけ計算)
+            for vehicle_id, dist, vehicle_speed, length in vehicles:
+                vehicle_ids.append(vehicle_id)
+                dist_to_end[vehicle_id] = dist
+                speed[vehicle_id] = vehicle_speed
+                vehicle_length[vehicle_id] = length
+
+                # 車両全体が検出器に入っているときの車両位置(SumoSim.set_vehicle_positionと同じ計算)
+                if length in magnifications:
+                    vehicle_magnification = magnifications[length]
+                else:
+                    vehicle_magnification = magnifications[length] = get_vehicle_magnification(detector_length, length)
+                if vehicle_magnification is None:
+                    continue
+                position = dist * vehicle_magnification
+                if 0 <= position <= detector_length:
+                    approach_position[vehicle_id] = position
+                position = (detector_length - dist) * vehicle_magnification
+                if 0 <= position <= detector_length:
+                    breakaway_position[vehicle_id] = position
+
+            # 工事帯に近い車両順にソート(同じ位置の場合は検出器上の並び順)
+            approach_ids = tuple(sorted(approach_position, key=approach_position.get))
+            breakaway_ids = tuple(sorted(breakaway_position, key=breakaway_position.get))
+
+            detector_states[detector_id] = DetectorState(
+                detector_id,
+                detector_length,
+                tuple(vehicle_ids),
+                MappingProxyType(dist_to_end),
+                MappingProxyType(speed),
+                MappingProxyType(vehicle_length),
+                (MappingProxyType(breakaway_position), MappingProxyType(approach_position)),
+                (breakaway_ids, approach_ids),
+            )
+
+        return cls(sim_time_ms, detector_states)
@@ -0,0 +1,191 @@
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+
+# zstandardがインストールされている場合はzstdで圧縮可能
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 圧縮形式
+JOURNAL_COMPRESSION_GZIP = "gzip"
+JOURNAL_COMPRESSION_ZSTD = "zstd"
+JOURNAL_EXTENSIONS = {
+    JOURNAL_COMPRESSION_GZIP: ".ndjson.gz",
+    JOURNAL_COMPRESSION_ZSTD: ".ndjson.zst",
+}
+ZSTD_AVAILABLE = zstandard is not None
+
+# 送受信の区別
+JOURNAL_OUTBOUND = "out"
+JOURNAL_INBOUND = "in"
+
+
+def get_index_path(path):
+    return path + ".idx"
+
+
+def compress_block(data, compression):
+    if compression == JOURNAL_COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+# 圧縮ブロックの展開(複数のブロックを連結したデータの場合はすべて展開する)
+def decompress_block(data, compression):
+    if compression == JOURNAL_COMPRESSION_ZSTD:
+        # ZstdDecompressor.decompressは最初のフレームのみ展開するため、終端までフレームごとに展開する
+        decompressor = zstandard.ZstdDecompressor()
+        chunks = []
+        while data:
+            decompress_obj = decompressor.decompressobj()
+            chunks.append(decompress_obj.decompress(data))
+            if not decompress_obj.eof:
+                raise ValueError("truncated zstd frame in journal")
+            data = decompress_obj.unused_data
+        return b''.join(chunks)
+    return gzip.decompress(data)
+
+
+# 送受信コマンドのジャーナル(圧縮したNDJSON)
+#   1行1コマンド {"dir", "sim_time", "wall_time", "node", "command_id", "payload"}
+#   block_size件ごと(またはflush_interval秒ごと)に独立した圧縮ブロックとして追記し、
+#   ブロックの位置とシミュレーション時間の範囲をインデックスファイル(.idx)に出力する
+#   圧縮と書き込みはバックグラウンドのスレッドで行う
+class EventJournal:
+
+    def __init__(self, path, compression=JOURNAL_COMPRESSION_GZIP, block_size=1000, flush_interval=5.0) -> None:
+        if compression not in JOURNAL_EXTENSIONS:
+            raise ValueError("journal compression must be one of %s: %s" % (", ".join(JOURNAL_EXTENSIONS), compression))
+        if compression == JOURNAL_COMPRESSION_ZSTD and zstandard is None:
+            raise ImportError("zstandard is required for zstd journal")
+
+        self.path = path
+        self.compression = compression
+        self.block_size = max(1, int(block_size))
+        self.flush_interval = float(flush_interval)
+        self.lock = threading.Lock()
+        self.records = []
+        self.sim_time_min = None
+        self.sim_time_max = None
+        self.record_count = 0
+        self.block_count = 0
+        self.last_flush_time = time.monotonic()
+        self.closed = False
+
+        self.file = open(path, 'wb')
+        self.index_file = open(get_index_path(path), 'w')
+        self.index_file.write(json.dumps({"compression": compression}) + "\n")
+        self.blocks = queue.SimpleQueue()
+        self.writer = threading.Thread(target=self.writer_run, name="journal-writer", daemon=True)
+        self.writer.start()
+
+    # 1コマンド分を追加(payloadはエンコード済みJSONのbytes)
+    def record(self, direction, sim_time, node, command_id, payload):
+        line = b''.join((
+            b'{"dir":"', direction.encode(),
+            b'","sim_time":', str(int(sim_time)).encode(),
+            b',"wall_time":', str(int(time.time() * 1000)).encode(),
+            b',"node":', json.dumps(node).encode(),
+            b',"command_id":', json.dumps(command_id).encode(),
+            b',"payload":', payload, b'}\n',
+        ))
+        with self.lock:
+            if self.closed:
+                return
+            self.records.append(line)
+            if self.sim_time_min is None or sim_time < self.sim_time_min:
+                self.sim_time_min = sim_time
+            if self.sim_time_max is None or sim_time > self.sim_time_max:
+                self.sim_time_max = sim_time
+            if len(self.records) >= self.block_size:
+                self.flush_block()
+
+    # ブロックサイズに達していなくても経過時間を超えた場合は書き込む(ステップごとに呼び出す)
+    def flush_if_needed(self):
+        if time.monotonic() - self.last_flush_time < self.flush_interval:
+            return
+        with self.lock:
+            self.flush_block()
+
+    # 溜めているコマンドを1ブロックとして書き込みスレッドに渡す(lockを取得して呼び出す)
+    def flush_block(self):
+        self.last_flush_time = time.monotonic()
+        if not self.records:
+            return
+        self.blocks.put((self.records, self.sim_time_min, self.sim_time_max))
+        self.record_count += len(self.records)
+        self.block_count += 1
+        self.records = []
+        self.sim_time_min = None
+        self.sim_time_max = None
+
+    def writer_run(self):
+        while True:
+            block = self.blocks.get()
+            if block is None:
+                return
+            records, sim_time_min, sim_time_max = block
+            data = compress_block(b''.join(records), self.compression)
+            offset = self.file.tell()
+            self.file.write(data)
+            self.file.flush()
+            self.index_file.write(json.dumps({
+                "offset": offset,
+                "length": len(data),
+                "records": len(records),
+                "sim_time_min": sim_time_min,
+                "sim_time_max": sim_time_max,
+            }) + "\n")
+            self.index_file.flush()
+
+    def stats(self):
+        with self.lock:
+            return {"records": self.record_count + len(self.records), "blocks": self.block_count}
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.flush_block()
+            self.closed = True
+        self.blocks.put(None)
+        self.writer.join()
+        self.file.close()
+        self.index_file.close()
+
+
+# ジャーナルの読み込み(sim_time_begin~sim_time_endのコマンドのみ、インデックスで対象のブロックだけ展開する)
+def read_journal(path, sim_time_begin=None, sim_time_end=None):
+    index_path = get_index_path(path)
+    if os.path.isfile(index_path):
+        with open(index_path) as f:
+            header = json.loads(f.readline())
+            blocks = [json.loads(line) for line in f if line.strip()]
+        compression = header["compression"]
+    else:
+        # インデックスがない場合はファイル全体を1ブロックとして読み込む
+        compression = JOURNAL_COMPRESSION_ZSTD if path.endswith(".zst") else JOURNAL_COMPRESSION_GZIP
+        blocks = [{"offset": 0, "length": os.path.getsize(path), "sim_time_min": None, "sim_time_max": None}]
+
+    with open(path, 'rb') as f:
+        for block in blocks:
+            if sim_time_begin is not None and block["sim_time_max"] is not None and block["sim_time_max"] < sim_time_begin:
+                continue
+            if sim_time_end is not None and block["sim_time_min"] is not None and block["sim_time_min"] > sim_time_end:
+                continue
+            f.seek(block["offset"])
+            data = decompress_block(f.read(block["length"]), compression)
+            for line in data.splitlines():
+                if not line:
+                    continue
+                record = json.loads(line)
+                if sim_time_begin is not None and record["sim_time"] < sim_time_begin:
+                    continue
+                if sim_time_end is not None and record["sim_time"] > sim_time_end:
+                    continue
+                yield record
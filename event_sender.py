@@ -0,0 +1,170 @@
+import json
+import queue
+import threading
+import zlib
+
+# 送信キューが満杯の場合の動作
+OVERFLOW_BLOCK = "block"                # 空きができるまで待つ
+OVERFLOW_DROP_OLDEST = "drop-oldest"    # 最も古い未送信コマンドを破棄する
+OVERFLOW_SPILL = "spill"                # 溢れたコマンドを破棄し、内容をファイルに記録する(再送はしない)
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL)
+
+# まとめて送信する場合の形式
+BATCH_FORMAT_JSON = "json"      # JSON配列
+BATCH_FORMAT_NDJSON = "ndjson"  # 1行1コマンドのJSON
+BATCH_CONTENT_TYPES = {
+    BATCH_FORMAT_JSON: "application/json",
+    BATCH_FORMAT_NDJSON: "application/x-ndjson",
+}
+
+
+# 複数コマンドを1リクエストの本文にまとめる(各コマンドはエンコード済みJSONのbytes)
+def pack_commands(commands, batch_format=BATCH_FORMAT_JSON):
+    if batch_format == BATCH_FORMAT_NDJSON:
+        return b"\n".join(commands) + b"\n"
+    return b"[" + b",".join(commands) + b"]"
+
+
+# 受信したリクエスト本文をコマンドのリストに展開(単一コマンド、JSON配列、NDJSONに対応)
+def unpack_commands(body, content_type=None):
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    if content_type and content_type.split(";")[0].strip() == BATCH_CONTENT_TYPES[BATCH_FORMAT_NDJSON]:
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+
+    try:
+        data = json.loads(body)
+    except json.JSONDecodeError:
+        # Content-Typeの指定がないNDJSON
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    if isinstance(data, list):
+        return data
+    return [data]
+
+
+# 送信ワーカーによる非同期コマンド送信
+#   同じノードのコマンドは常に同じワーカーが送信するため、ノードごとの送信順は保たれる
+class EventSender:
+
+    def __init__(self, post, worker_number=1, queue_size=1000, overflow_policy=OVERFLOW_BLOCK, spill_file=None, logger=None) -> None:
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError("overflow policy must be one of %s: %s" % (", ".join(OVERFLOW_POLICIES), overflow_policy))
+
+        self.post = post
+        self.worker_number = max(1, int(worker_number))
+        self.queue_size = max(1, int(queue_size))
+        self.overflow_policy = overflow_policy
+        self.spill_file = spill_file
+        self.logger = logger
+        self.spill_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.enqueued_count = 0
+        self.sent_count = 0
+        self.error_count = 0
+        self.dropped_count = 0
+        self.spilled_count = 0
+        self.max_queue_depth = 0
+        self.closed = False
+
+        self.queues = []
+        self.workers = []
+        for i in range(self.worker_number):
+            q = queue.Queue(maxsize=self.queue_size)
+            worker = threading.Thread(target=self.worker_run, args=(q,), name="sender-%d" % (i), daemon=True)
+            self.queues.append(q)
+            self.workers.append(worker)
+            worker.start()
+
+    # 送信キューに追加(シミュレーションスレッドはキュー追加のみ行う)
+    def enqueue(self, node_id, data):
+        if self.closed:
+            return False
+
+        q = self.queues[zlib.crc32(node_id.encode()) % self.worker_number]
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            q.put(data)
+        else:
+            while True:
+                try:
+                    q.put_nowait(data)
+                    break
+                except queue.Full:
+                    if self.overflow_policy == OVERFLOW_SPILL:
+                        self.spill(data)
+                        return False
+                    # 最も古い未送信コマンドを破棄して再度追加
+                    try:
+                        q.get_nowait()
+                        q.task_done()
+                        with self.stats_lock:
+                            self.dropped_count += 1
+                    except queue.Empty:
+                        pass
+
+        with self.stats_lock:
+            self.enqueued_count += 1
+            depth = q.qsize()
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+        return True
+
+    # 溢れたコマンドをファイルに記録
+    #   記録したコマンドは再送しないため、破棄したコマンドとしても数える
+    def spill(self, data):
+        with self.stats_lock:
+            self.spilled_count += 1
+            self.dropped_count += 1
+            first_spill = self.spilled_count == 1
+        if first_spill and self.logger:
+            self.logger.warning("送信キューが満杯のため、コマンドを破棄して%sに記録します。", self.spill_file)
+        if not self.spill_file:
+            return
+        if isinstance(data, str):
+            data = data.encode()
+        with self.spill_lock:
+            with open(self.spill_file, 'ab') as f:
+                f.write(data + b"\n")
+
+    # 送信ワーカー
+    def worker_run(self, q):
+        while True:
+            data = q.get()
+            try:
+                if data is None:
+                    return
+                self.post(data)
+                with self.stats_lock:
+                    self.sent_count += 1
+            except Exception:
+                with self.stats_lock:
+                    self.error_count += 1
+                if self.logger:
+                    self.logger.exception("コマンド送信中にエラーが発生しました。")
+            finally:
+                q.task_done()
+
+    # 未送信コマンド数
+    def pending(self):
+        return sum(q.qsize() for q in self.queues)
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                "enqueued": self.enqueued_count,
+                "sent": self.sent_count,
+                "error": self.error_count,
+                "dropped": self.dropped_count,
+                "spilled": self.spilled_count,
+                "max_queue_depth": self.max_queue_depth,
+                "pending": self.pending(),
+            }
+
+    # 未送信コマンドを送信し終えてから終了
+    def close(self, timeout=None):
+        if self.closed:
+            return
+        self.closed = True
+        for q in self.queues:
+            q.put(None)
+        for worker in self.workers:
+            worker.join(timeout)
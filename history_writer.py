@@ -0,0 +1,286 @@
+import os
+import time
+
+# pyarrowがインストールされている場合は列形式(Parquet/Arrow)で出力可能
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+COLUMNAR_AVAILABLE = pa is not None
+
+# 履歴の出力形式
+HISTORY_FORMAT_TEXT = "text"        # カンマ区切りのテキスト(ヘッダは#で始まる行)
+HISTORY_FORMAT_PARQUET = "parquet"  # Parquet(ファイルごとに.parquet)
+HISTORY_FORMAT_ARROW = "arrow"      # Arrow IPC(ファイルごとに.arrow)
+HISTORY_FORMATS = (HISTORY_FORMAT_TEXT, HISTORY_FORMAT_PARQUET, HISTORY_FORMAT_ARROW)
+
+# 履歴ファイルのヘッダ(ファイル名の先頭部分 -> ヘッダ、ヘッダなしのファイルは登録しない)
+HISTORY_HEADERS = (
+    ("guideTrafficLight", "#time, sim_time, system_state"),
+    ("leadingCar_", "#time, sim_time, node_no, status, car_number, distance, speed"),
+    ("insideCar", "#time, sim_time, inside_car_count"),
+    ("stayCar_", "#time, sim_time, node_no, vehicle_count"),
+    ("nearbyTrafficLight_", "#time, sim_time, node_no, color"),
+    ("trafficJam_", "#time, sim_time, node_no, vehicle_count"),
+    ("timeout", "#start_time, start_sim_time, TimeOutSide"),
+    ("passingCar_", "#time, sim_time, node_no, vehicle_count"),
+    ("waitTime", "#start_time, end_time, start_sim_time, end_sim_time, node_no, wait_time"),
+    ("detCADanger", '#"time", "sim_time", "{unit_id, vehicle_count, head_vehicle_distance, vehicle_speed, {vehicle_id}, ... }", ...'),
+)
+
+
+def get_history_header(file_name):
+    for prefix, header in HISTORY_HEADERS:
+        if file_name.startswith(prefix):
+            return header
+    return None
+
+
+# KPI履歴の出力
+#   ファイルは開いたままにし、ヘッダは空のファイルを開いたときに1回だけ出力する
+#   履歴はメモリに溜めておき、行数(flush_size)か経過時間(flush_interval秒)を超えた場合と終了時に書き込む
+class HistoryWriter:
+
+    def __init__(self, directory, flush_size=100, flush_interval=1.0) -> None:
+        self.directory = directory
+        self.flush_size = max(1, int(flush_size))
+        self.flush_interval = float(flush_interval)
+        self.files = {}         # ファイル名 -> ファイル
+        self.buffers = {}       # ファイル名 -> 未書き込みの行
+        self.buffered_number = 0
+        self.last_flush_time = time.monotonic()
+
+    # ファイルを開く(空のファイルの場合はヘッダを出力)
+    def open(self, file_name):
+        f = self.files.get(file_name)
+        if f is not None:
+            return f
+
+        f = open(os.path.join(self.directory, file_name), 'a')
+        self.files[file_name] = f
+        self.buffers[file_name] = []
+        header = get_history_header(file_name)
+        if header is not None and f.tell() == 0:
+            self.buffers[file_name].append(header + "\n")
+            self.buffered_number += 1
+        return f
+
+    # ヘッダのみ出力(履歴がまだない場合もファイルを作成する)
+    def write_header(self, file_name):
+        self.open(file_name)
+
+    # 1行分の履歴を追加
+    def write(self, file_name, datalist):
+        if file_name not in self.files:
+            self.open(file_name)
+        if len(datalist) != 0:
+            self.buffers[file_name].append(', '.join(datalist) + "\n")
+            self.buffered_number += 1
+        self.flush_if_needed()
+
+    # 行数か経過時間を超えた場合に書き込む(履歴がない場合もステップごとに呼び出す)
+    def flush_if_needed(self):
+        if self.buffered_number == 0:
+            return
+        if self.buffered_number >= self.flush_size or time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.flush()
+
+    # 溜めている履歴をすべて書き込む
+    def flush(self):
+        for file_name, lines in self.buffers.items():
+            if not lines:
+                continue
+            f = self.files[file_name]
+            f.write("".join(lines))
+            f.flush()
+            lines.clear()
+        self.buffered_number = 0
+        self.last_flush_time = time.monotonic()
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        self.buffers = {}
+
+
+# 列形式で出力する場合の列(ファイル名の先頭部分 -> [(列名, 型), ...])
+#   型が"list"で始まる列は最後の列とし、残りの値をすべて格納する
+HISTORY_COLUMNS = (
+    ("guideTrafficLight", [("time", "int64"), ("sim_time", "int64"), ("system_state", "list<int32>")]),
+    ("leadingCar_", [("time", "int64"), ("sim_time", "int64"), ("node_no", "int32"), ("status", "int32"), ("car_number", "string"), ("distance", "float64"), ("speed", "float64")]),
+    ("insideCar", [("time", "int64"), ("sim_time", "int64"), ("inside_car_count", "int32")]),
+    ("stayCar_", [("time", "int64"), ("sim_time", "int64"), ("node_no", "int32"), ("vehicle_count", "int32")]),
+    ("nearbyTrafficLight_", [("time", "int64"), ("sim_time", "int64"), ("node_no", "int32"), ("color", "string")]),
+    ("trafficJam_", [("time", "int64"), ("sim_time", "int64"), ("node_no", "int32"), ("vehicle_count", "int32")]),
+    ("timeout", [("start_time", "int64"), ("start_sim_time", "int64"), ("TimeOutSide", "int32")]),
+    ("passingCar_", [("time", "int64"), ("sim_time", "int64"), ("node_no", "int32"), ("car_number", "string"), ("speed", "float64")]),
+    ("waitTime", [("start_time", "int64"), ("end_time", "int64"), ("start_sim_time", "int64"), ("end_sim_time", "int64"), ("node_no", "int32"), ("wait_time", "int64")]),
+    ("detCADanger", [("sim_time", "int64"), ("time", "int64"), ("units", "list<string>")]),
+    ("startTimestamp", [("time", "int64")]),
+)
+# 列が登録されていないファイルの列
+DEFAULT_COLUMNS = [("values", "list<string>")]
+
+
+def get_history_columns(file_name):
+    for prefix, columns in HISTORY_COLUMNS:
+        if file_name.startswith(prefix):
+            return columns
+    return DEFAULT_COLUMNS
+
+
+# 文字列の値を列の型に変換(変換できない場合はNone)
+def convert_value(value, column_type):
+    try:
+        if column_type.startswith("int"):
+            return int(value)
+        if column_type.startswith("float"):
+            return float(value)
+    except (TypeError, ValueError):
+        return None
+    return value
+
+
+def get_arrow_type(column_type):
+    if column_type.startswith("list<"):
+        return pa.list_(get_arrow_type(column_type[5:-1]))
+    return getattr(pa, column_type)()
+
+
+# KPI履歴の列形式(Parquet/Arrow IPC)での出力
+#   HistoryWriterと同じ呼び出し方で使用でき、ファイルごとに行数(flush_size)ごとに1つの行グループとして書き込む
+#   flush_interval秒は行数に達していない履歴を書き込むまでの上限(小さな行グループが多くならないよう長めにする)
+class ColumnarHistoryWriter:
+
+    def __init__(self, directory, output_format=HISTORY_FORMAT_PARQUET, flush_size=100, flush_interval=1.0) -> None:
+        if pa is None:
+            raise ImportError("pyarrow is required for %s history output" % (output_format))
+        if output_format not in (HISTORY_FORMAT_PARQUET, HISTORY_FORMAT_ARROW):
+            raise ValueError("columnar history format must be parquet or arrow: %s" % (output_format))
+
+        self.directory = directory
+        self.output_format = output_format
+        self.flush_size = max(1, int(flush_size))
+        self.flush_interval = float(flush_interval)
+        self.columns = {}       # ファイル名 -> [(列名, 型), ...]
+        self.schemas = {}       # ファイル名 -> スキーマ
+        self.buffers = {}       # ファイル名 -> 列ごとの未書き込みの値
+        self.writers = {}       # ファイル名 -> (出力先, writer)
+        self.buffered_number = 0
+        self.last_flush_time = time.monotonic()
+
+    def open(self, file_name):
+        if file_name in self.columns:
+            return
+        columns = get_history_columns(file_name)
+        self.columns[file_name] = columns
+        self.schemas[file_name] = pa.schema([(name, get_arrow_type(column_type)) for name, column_type in columns])
+        self.buffers[file_name] = [[] for column in columns]
+
+    # 出力ファイル名(拡張子を出力形式に合わせる)
+    def get_path(self, file_name):
+        base, ext = os.path.splitext(file_name)
+        return os.path.join(self.directory, base + "." + self.output_format)
+
+    def get_writer(self, file_name):
+        writer = self.writers.get(file_name)
+        if writer is not None:
+            return writer[1]
+
+        path = self.get_path(file_name)
+        schema = self.schemas[file_name]
+        if self.output_format == HISTORY_FORMAT_PARQUET:
+            sink = None
+            writer = pq.ParquetWriter(path, schema)
+        else:
+            sink = pa.OSFile(path, 'wb')
+            writer = pa.ipc.new_file(sink, schema)
+        self.writers[file_name] = (sink, writer)
+        return writer
+
+    # ヘッダのみ出力(履歴がない場合も終了時に空のファイルを作成する)
+    def write_header(self, file_name):
+        self.open(file_name)
+
+    # 1行分の履歴を追加
+    def write(self, file_name, datalist):
+        self.open(file_name)
+        if len(datalist) != 0:
+            columns = self.columns[file_name]
+            buffers = self.buffers[file_name]
+            last = len(columns) - 1
+            for i, (name, column_type) in enumerate(columns):
+                if i == last and column_type.startswith("list<"):
+                    value_type = column_type[5:-1]
+                    buffers[i].append([convert_value(value, value_type) for value in datalist[i:]])
+                elif i < len(datalist):
+                    buffers[i].append(convert_value(datalist[i], column_type))
+                else:
+                    buffers[i].append(None)
+            self.buffered_number += 1
+
+            # 行グループのサイズに達したファイルは書き込む
+            if len(buffers[0]) >= self.flush_size:
+                self.flush_file(file_name)
+        self.flush_if_needed()
+
+    # 行数か経過時間(上限)を超えた場合に書き込む(履歴がない場合もステップごとに呼び出す)
+    def flush_if_needed(self):
+        if self.buffered_number == 0:
+            return
+        if time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.flush()
+            return
+        if self.buffered_number >= self.flush_size:
+            # 行数に達したファイルのみ書き込む
+            for file_name, buffers in self.buffers.items():
+                if len(buffers[0]) >= self.flush_size:
+                    self.flush_file(file_name)
+
+    def flush_file(self, file_name):
+        buffers = self.buffers[file_name]
+        if not buffers[0]:
+            return
+        schema = self.schemas[file_name]
+        arrays = [pa.array(values, type=field.type) for values, field in zip(buffers, schema)]
+        batch = pa.record_batch(arrays, schema=schema)
+        writer = self.get_writer(file_name)
+        if self.output_format == HISTORY_FORMAT_PARQUET:
+            writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            writer.write_batch(batch)
+        self.buffered_number -= len(buffers[0])
+        self.buffers[file_name] = [[] for column in buffers]
+
+    # 溜めている履歴をすべて書き込む
+    def flush(self):
+        for file_name in self.buffers:
+            self.flush_file(file_name)
+        self.buffered_number = 0
+        self.last_flush_time = time.monotonic()
+
+    def close(self):
+        self.flush()
+        for file_name in self.columns:
+            # 履歴がないファイルはスキーマのみのファイルを作成
+            self.get_writer(file_name)
+        for sink, writer in self.writers.values():
+            writer.close()
+            if sink is not None:
+                sink.close()
+        self.columns = {}
+        self.schemas = {}
+        self.buffers = {}
+        self.writers = {}
+
+
+# 出力形式に合わせた履歴出力の作成
+#   columnar_flush_interval: 列形式の場合の書き込みまでの上限(秒)
+def create_history_writer(directory, output_format=HISTORY_FORMAT_TEXT, flush_size=100, flush_interval=1.0, columnar_flush_interval=60.0):
+    if output_format == HISTORY_FORMAT_TEXT:
+        return HistoryWriter(directory, flush_size, flush_interval)
+    return ColumnarHistoryWriter(directory, output_format, flush_size, columnar_flush_interval)
@@ -0,0 +1,149 @@
+import collections
+import http.client
+import select
+import threading
+import time
+from urllib.parse import urlsplit
+
+# 再利用した接続が切れていた場合に再接続して再送する例外(リクエストの送信時のみ)
+#   レスポンスの受信時(RemoteDisconnected・BadStatusLineなど)はサーバに届いている可能性があるため再送しない
+STALE_CONNECTION_ERRORS = (
+    http.client.CannotSendRequest,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+
+# 待機中の接続がサーバ側で切断されているか判定
+#   レスポンスを読み終えた接続が読み込み可能な場合は切断(EOF)されている
+def is_closed_by_server(conn):
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+# HTTP/1.1 keep-aliveの接続プール(接続先ホストごとに接続を保持)
+class HttpConnectionPool:
+
+    def __init__(self, pool_size=1, idle_timeout=30, timeout=30, latency_samples=10000) -> None:
+        self.pool_size = max(1, int(pool_size))
+        self.idle_timeout = float(idle_timeout)
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.idle_connections = {}  # (scheme, host, port) -> [(接続, 最終使用時刻), ...]
+        self.request_count = 0
+        self.reused_count = 0
+        self.connect_count = 0
+        self.reconnect_count = 0
+        self.stale_count = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.latencies = collections.deque(maxlen=latency_samples)
+
+    # POST送信(レスポンスのステータスと本文を返す)
+    def post(self, url, body, headers):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        start = time.perf_counter()
+        conn, reused = self.acquire(key)
+        try:
+            try:
+                conn.request("POST", path, body, headers)
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                if not reused:
+                    raise
+                # 待機中にサーバ側で切断された接続に送信できなかった場合、新しい接続で1回だけ送信し直す
+                with self.lock:
+                    self.reconnect_count += 1
+                conn, reused = self.new_connection(key), False
+                conn.request("POST", path, body, headers)
+            status, data = self.read_response(conn)
+        except BaseException:
+            conn.close()
+            raise
+
+        self.release(key, conn)
+        latency = time.perf_counter() - start
+        with self.lock:
+            self.request_count += 1
+            if reused:
+                self.reused_count += 1
+            self.total_latency += latency
+            if latency > self.max_latency:
+                self.max_latency = latency
+            self.latencies.append(latency)
+
+        return status, data
+
+    def read_response(self, conn):
+        res = conn.getresponse()
+        data = res.read()
+        # サーバが接続を閉じる場合は再利用しない
+        if res.will_close:
+            conn.close()
+        return res.status, data
+
+    # 待機中の接続を取得(なければ新規接続)
+    def acquire(self, key):
+        now = time.monotonic()
+        with self.lock:
+            idle = self.idle_connections.get(key, [])
+            while idle:
+                conn, last_used = idle.pop()
+                if now - last_used <= self.idle_timeout and conn.sock is not None:
+                    if not is_closed_by_server(conn):
+                        return conn, True
+                    self.stale_count += 1
+                conn.close()
+        return self.new_connection(key), False
+
+    def new_connection(self, key):
+        scheme, host, port = key
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        with self.lock:
+            self.connect_count += 1
+        return conn
+
+    # 接続を待機中に戻す(プールサイズを超える場合は切断)
+    def release(self, key, conn):
+        if conn.sock is None:
+            return
+        with self.lock:
+            idle = self.idle_connections.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            result = {
+                "request": self.request_count,
+                "connect": self.connect_count,
+                "reconnect": self.reconnect_count,
+                "stale": self.stale_count,
+                "reuse_rate": self.reused_count / self.request_count if self.request_count else 0.0,
+                "latency_avg_ms": self.total_latency / self.request_count * 1000 if self.request_count else 0.0,
+                "latency_max_ms": self.max_latency * 1000,
+            }
+        result["latency_p99_ms"] = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0
+        return result
+
+    def close(self):
+        with self.lock:
+            for idle in self.idle_connections.values():
+                for conn, last_used in idle:
+                    conn.close()
+            self.idle_connections = {}
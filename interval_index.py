@@ -0,0 +1,117 @@
+import bisect
+
+# 全センサー対象を表すセンサーID
+SENSOR_ID_ALL = 0
+
+
+# 区間の集合(重なる区間は結合済み、Begin・Endを含む)
+#   シミュレーション時間は増加のみのため、前回の検索位置から進めるだけで判定できる
+#   時間が戻った場合は二分探索で検索位置を求め直す
+class IntervalIndex:
+
+    def __init__(self, intervals=()) -> None:
+        self.begins = []
+        self.ends = []
+        for begin, end in sorted(intervals):
+            if begin > end:
+                continue
+            if self.ends and begin <= self.ends[-1]:
+                if end > self.ends[-1]:
+                    self.ends[-1] = end
+                continue
+            self.begins.append(begin)
+            self.ends.append(end)
+        self.cursor = 0
+        self.last_time = None
+
+    def __len__(self):
+        return len(self.begins)
+
+    # 指定時間がいずれかの区間内か判定
+    def contains(self, now_time):
+        ends = self.ends
+        if self.last_time is not None and now_time >= self.last_time:
+            cursor = self.cursor
+            while cursor < len(ends) and ends[cursor] < now_time:
+                cursor += 1
+        else:
+            cursor = bisect.bisect_left(ends, now_time)
+        self.cursor = cursor
+        self.last_time = now_time
+        return cursor < len(ends) and self.begins[cursor] <= now_time
+
+
+# ノード番号・センサーIDごとの区間(センサー無効ファイル用)
+#   センサーID 0 の区間はそのノードの全センサーに適用する
+class SensorIntervalIndex:
+
+    def __init__(self, rows=()) -> None:
+        # rows: (ノード番号, センサーID, Begin, End) のリスト
+        self.intervals = {}
+        for node_no, sensor_id, begin, end in rows:
+            self.intervals.setdefault((int(node_no), int(sensor_id)), []).append((begin, end))
+        self.indexes = {}
+
+    # 指定時間にセンサーが区間内か判定
+    def contains(self, node_no, sensor_id, now_time):
+        key = (node_no, sensor_id)
+        index = self.indexes.get(key)
+        if index is None:
+            # 初回検索時にセンサーID 0 の区間と結合して作成
+            intervals = self.intervals.get(key, [])
+            if sensor_id != SENSOR_ID_ALL:
+                intervals = intervals + self.intervals.get((node_no, SENSOR_ID_ALL), [])
+            index = IntervalIndex(intervals)
+            self.indexes[key] = index
+        return index.contains(now_time)
+
+
+# ノード番号・センサーIDごとのルール(遅延設定ファイル用)
+#   区間が重なる場合はファイル内で先に定義されたルールを優先する
+#   センサーID 0 のルールはそのノードの全センサーに適用する
+class SensorRuleIndex:
+
+    def __init__(self, rows=()) -> None:
+        # rows: (ノード番号, センサーID, Begin, End, ルール) のリスト
+        self.rules = {}
+        for order, (node_no, sensor_id, begin, end, rule) in enumerate(rows):
+            self.rules.setdefault((int(node_no), int(sensor_id)), []).append((begin, end, order, rule))
+        self.indexes = {}
+
+    # 初回検索時にセンサーID 0 のルールと結合し、Beginでソートして作成
+    def build_index(self, node_no, sensor_id):
+        rules = self.rules.get((node_no, sensor_id), [])
+        if sensor_id != SENSOR_ID_ALL:
+            rules = rules + self.rules.get((node_no, SENSOR_ID_ALL), [])
+        rules = sorted(rules, key=lambda rule: rule[0])
+
+        begins = []
+        max_ends = []   # 先頭から各位置までのEndの最大値
+        max_end = None
+        for begin, end, order, rule in rules:
+            begins.append(begin)
+            if max_end is None or end > max_end:
+                max_end = end
+            max_ends.append(max_end)
+        return begins, max_ends, rules
+
+    # 指定時間に該当するルール取得(該当なしの場合None)
+    def find(self, node_no, sensor_id, now_time):
+        key = (node_no, sensor_id)
+        index = self.indexes.get(key)
+        if index is None:
+            index = self.build_index(node_no, sensor_id)
+            self.indexes[key] = index
+        begins, max_ends, rules = index
+
+        found = None
+        # Begin <= 指定時間 のルールのうち、End >= 指定時間 のものを後ろから探す
+        i = bisect.bisect_right(begins, now_time) - 1
+        while i >= 0 and max_ends[i] >= now_time:
+            begin, end, order, rule = rules[i]
+            if end >= now_time and (found is None or order < found[0]):
+                found = (order, rule)
+            i -= 1
+        if found is None:
+            return None
+        return found[1]
@@ -0,0 +1,103 @@
+# シミュレーション中に変化しないネットワーク・検出器情報のキャッシュ
+class NetworkCache:
+
+    def __init__(self, traci_module) -> None:
+        self.traci = traci_module
+        self.detector_length = {}       # 検出器ID -> 検出器の長さ
+        self.detector_lane_ids = {}     # 検出器ID -> 検出範囲内すべてのレーンID
+        self.detector_end_offset = {}   # 検出器ID -> {レーンID: 検出器終端までの距離 + レーン上の位置}
+        self.lane_ids = frozenset()     # 全レーンID
+        self.lane_edge = {}             # レーンID -> エッジID(初回参照時に取得)
+        self.lane_links = {}            # レーンID -> 接続情報(traci.lane.getLinksの結果、初回参照時に取得)
+        self.tls_phase_time = {}        # 信号機ID -> (プログラムID, (青時間, 黄時間, 赤時間))
+
+    # TraCI開始直後に1回だけ実行
+    def load(self):
+        traci = self.traci
+        for detector_id in traci.lanearea.getIDList():
+            self.detector_length[detector_id] = traci.lanearea.getLength(detector_id)
+            self.detector_lane_ids[detector_id] = tuple(traci.lanearea.getLaneIDs(detector_id))
+
+        self.lane_ids = frozenset(traci.lane.getIDList())
+
+        for tls_id in traci.trafficlight.getIDList():
+            self.get_tls_phase_time(tls_id, traci.trafficlight.getProgram(tls_id))
+
+    # 検出器の長さ取得
+    def get_detector_length(self, detector_id):
+        length = self.detector_length.get(detector_id)
+        if length is None:
+            length = self.traci.lanearea.getLength(detector_id)
+            self.detector_length[detector_id] = length
+        return length
+
+    # 検出範囲内すべてのレーンID取得
+    def get_detector_lane_ids(self, detector_id):
+        lane_ids = self.detector_lane_ids.get(detector_id)
+        if lane_ids is None:
+            lane_ids = tuple(self.traci.lanearea.getLaneIDs(detector_id))
+            self.detector_lane_ids[detector_id] = lane_ids
+        return lane_ids
+
+    # 検出器終端までの距離を計算するためのレーンごとのオフセット取得(検出器ごとに初回のみTraCIに問い合わせる)
+    #   検出器終端までの距離 = オフセット[車両のレーンID] - 車両のレーン上の位置
+    def get_detector_end_offset(self, detector_id):
+        offset = self.detector_end_offset.get(detector_id)
+        if offset is not None:
+            return offset
+
+        traci = self.traci
+        lane_ids = self.get_detector_lane_ids(detector_id)
+        lane_lengths = [traci.lane.getLength(lane_id) for lane_id in lane_ids]
+        # 最後のレーン上の検出器終端の位置
+        end_pos = traci.lanearea.getPosition(detector_id) + self.get_detector_length(detector_id) - sum(lane_lengths[:-1])
+        offset = {lane_ids[-1]: end_pos}
+        distance = end_pos
+        # 手前のレーンは、そのレーンの長さと以降のレーンの長さを加算
+        for lane_id, lane_length in zip(reversed(lane_ids[:-1]), reversed(lane_lengths[:-1])):
+            distance += lane_length
+            offset[lane_id] = distance
+        self.detector_end_offset[detector_id] = offset
+        return offset
+
+    # レーンのエッジID取得
+    def get_lane_edge_id(self, lane_id):
+        edge_id = self.lane_edge.get(lane_id)
+        if edge_id is None:
+            edge_id = self.traci.lane.getEdgeID(lane_id)
+            self.lane_edge[lane_id] = edge_id
+        return edge_id
+
+    # レーンの接続情報取得
+    def get_lane_links(self, lane_id):
+        links = self.lane_links.get(lane_id)
+        if links is None:
+            links = self.traci.lane.getLinks(lane_id)
+            self.lane_links[lane_id] = links
+        return links
+
+    # 信号機のフェーズ名ごとの合計時間取得(プログラムが切り替わった場合のみ再計算)
+    def get_tls_phase_time(self, tls_id, program_id):
+        cache = self.tls_phase_time.get(tls_id)
+        if cache is not None and cache[0] == program_id:
+            return cache[1]
+
+        green_time = 0
+        yellow_time = 0
+        red_time = 0
+        for logic in self.traci.trafficlight.getAllProgramLogics(tls_id):
+            if logic.programID != program_id:
+                continue
+
+            for phase in logic.phases:
+                if phase.name == "Green":
+                    green_time += phase.duration
+                elif phase.name == "Yellow":
+                    yellow_time += phase.duration
+                if phase.name == "Red":
+                    red_time += phase.duration
+            break
+
+        phase_time = (green_time, yellow_time, red_time)
+        self.tls_phase_time[tls_id] = (program_id, phase_time)
+        return phase_time
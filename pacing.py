@@ -0,0 +1,82 @@
+import time
+
+
+# 実時間に対するシミュレーション時間の比率を一定に保つためのペース制御
+#   ステップごとに、開始時からの予定時刻までの残り時間だけ待つ
+#   予定より遅れている場合は待たずに次のステップを実行して遅れを取り戻す
+#   遅れがmax_lag_ms(0の場合は無制限)を超えた場合は取り戻さずに予定時刻を再設定する
+class PacingController:
+
+    def __init__(self, ratio=1.0, max_lag_ms=0) -> None:
+        if ratio <= 0:
+            raise ValueError("pace ratio must be greater than 0: %s" % (ratio))
+        self.ratio = float(ratio)
+        self.max_lag = max_lag_ms / 1000
+        self.start_wall = None
+        self.start_sim_ms = 0
+        self.first_wall = None
+        self.first_sim_ms = 0
+        self.last_sim_ms = 0
+        self.step_count = 0
+        self.overrun_count = 0
+        self.resync_count = 0
+        self.lag = 0.0
+        self.max_lag_seen = 0.0
+        self.sleep_time = 0.0
+
+    def start(self, sim_time_ms):
+        now = time.perf_counter()
+        self.start_wall = now
+        self.start_sim_ms = sim_time_ms
+        self.first_wall = now
+        self.first_sim_ms = sim_time_ms
+        self.last_sim_ms = sim_time_ms
+
+    # 1ステップ分の待ち(ステップの処理が終わった後に呼び出す)
+    def pace(self, sim_time_ms):
+        if self.start_wall is None:
+            self.start(sim_time_ms)
+            return
+
+        self.step_count += 1
+        self.last_sim_ms = sim_time_ms
+        target = self.start_wall + (sim_time_ms - self.start_sim_ms) / 1000 / self.ratio
+        wait = target - time.perf_counter()
+        if wait > 0:
+            self.lag = 0.0
+            time.sleep(wait)
+            self.sleep_time += wait
+            return
+
+        # ステップの処理が予定時間を超えた
+        self.overrun_count += 1
+        self.lag = -wait
+        if self.lag > self.max_lag_seen:
+            self.max_lag_seen = self.lag
+        if self.max_lag > 0 and self.lag > self.max_lag:
+            # 遅れが大きすぎる場合は現在時刻を予定時刻とする
+            self.resync_count += 1
+            self.start_wall = time.perf_counter()
+            self.start_sim_ms = sim_time_ms
+            self.lag = 0.0
+
+    # 実際の比率(シミュレーション時間/実時間)
+    def achieved_ratio(self):
+        if self.first_wall is None:
+            return 0.0
+        elapsed = time.perf_counter() - self.first_wall
+        if elapsed <= 0:
+            return 0.0
+        return (self.last_sim_ms - self.first_sim_ms) / 1000 / elapsed
+
+    def stats(self):
+        return {
+            "target_ratio": self.ratio,
+            "achieved_ratio": round(self.achieved_ratio(), 4),
+            "steps": self.step_count,
+            "overruns": self.overrun_count,
+            "resyncs": self.resync_count,
+            "lag_ms": round(self.lag * 1000, 3),
+            "max_lag_ms": round(self.max_lag_seen * 1000, 3),
+            "sleep_s": round(self.sleep_time, 3),
+        }
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# 記録した送信コマンドの再送(SUMOを起動せずに業務プロセスへ送信する)
+#   ジャーナル(eventJournal.ndjson.gz/.zst)、またはSUMO-SIMのログから送信コマンドを読み込み、
+#   記録時の間隔(--speedで倍率指定、0の場合は待たずに送信)でHTTP_SERVER_URLに送信する
+import ast
+import datetime
+import json
+import optparse
+import socket
+import http.client
+import threading
+import time
+
+from event_journal import read_journal, JOURNAL_OUTBOUND
+from event_sender import EventSender
+from http_pool import HttpConnectionPool
+
+
+def get_options():
+    optParser = optparse.OptionParser()
+    optParser.add_option("--journal", help="event journal file")
+    optParser.add_option("--log", help="SUMO-SIM log file")
+    optParser.add_option("--url", help="send url (default: HTTP_SERVER_URL in --sim-config)")
+    optParser.add_option("--sim-config", help="sumo simulation config file (Set.json)")
+    optParser.add_option("--speed", type=float, default=1.0,
+                            help="playback speed (1: original timing, N: N times faster, 0: as fast as possible)")
+    optParser.add_option("--begin", type=int, help="first sim time [ms] to replay (journal only)")
+    optParser.add_option("--end", type=int, help="last sim time [ms] to replay (journal only)")
+    optParser.add_option("--workers", type=int, default=1, help="number of sender workers")
+    optParser.add_option("--queue-size", type=int, default=1000, help="sender queue size per worker")
+    optParser.add_option("--pool-size", type=int, help="keep-alive connection pool size (default: --workers)")
+    optParser.add_option("--timeout", type=float, default=30, help="request timeout in seconds")
+    options, args = optParser.parse_args()
+    return options
+
+
+# ジャーナルから送信コマンドを読み込む((時刻[ms], ノードID, 送信データ)を返す)
+def read_journal_events(path, begin=None, end=None):
+    for record in read_journal(path, begin, end):
+        if record["dir"] != JOURNAL_OUTBOUND:
+            continue
+        yield record["sim_time"], record["node"], json.dumps(record["payload"], separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+# ログから送信コマンドを読み込む(時刻はコマンドのTimeStamp)
+#   ログ出力の形式: "日時 <INFO> : {コマンド}"
+def read_log_events(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            pos = line.find("> : {")
+            if pos < 0:
+                continue
+            message = line[pos + 4:].strip()
+            try:
+                command = json.loads(message)
+            except json.JSONDecodeError:
+                # 以前のログはPythonの辞書の形式で出力されている
+                try:
+                    command = ast.literal_eval(message)
+                except (ValueError, SyntaxError):
+                    continue
+            if not isinstance(command, dict) or "CommandID" not in command or "TimeStamp" not in command:
+                continue
+            node_id = str(command.get("EventID", "")).split("_")[0]
+            yield int(command["TimeStamp"]), node_id, json.dumps(command, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def read_url(sim_config):
+    with open(sim_config, "r") as f:
+        return json.load(f)["HTTP_SERVER_URL"]
+
+
+class Replay:
+
+    def __init__(self, url, speed=1.0, workers=1, queue_size=1000, pool_size=None, timeout=30) -> None:
+        self.url = url
+        self.speed = speed
+        self.pool = HttpConnectionPool(pool_size or workers, 30, timeout)
+        self.sender = EventSender(self.post_command, workers, queue_size)
+        self.lock = threading.Lock()
+        self.error_count = 0
+        self.status_count = {}
+        self.event_count = 0
+        self.max_lag = 0.0
+
+    # HTTP送信(送信ワーカーから呼び出し)
+    def post_command(self, data):
+        headers = {'Content-Type': 'application/json',}
+        try:
+            status, body = self.pool.post(self.url, data, headers)
+        except (socket.timeout, OSError, http.client.HTTPException):
+            with self.lock:
+                self.error_count += 1
+            return
+        with self.lock:
+            self.status_count[status] = self.status_count.get(status, 0) + 1
+
+    # 記録時の間隔に合わせて送信キューに追加
+    def run(self, events):
+        start = time.perf_counter()
+        first_time = None
+        for event_time, node_id, data in events:
+            if first_time is None:
+                first_time = event_time
+            if self.speed > 0:
+                target = start + (event_time - first_time) / 1000 / self.speed
+                wait = target - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                elif -wait > self.max_lag:
+                    self.max_lag = -wait
+            self.sender.enqueue(node_id, data)
+            self.event_count += 1
+
+        enqueue_time = time.perf_counter() - start
+        # 未送信コマンドを送信し終えてから終了
+        self.sender.close()
+        elapsed = time.perf_counter() - start
+        self.pool.close()
+        return self.report(enqueue_time, elapsed)
+
+    def report(self, enqueue_time, elapsed):
+        pool_stats = self.pool.stats()
+        return {
+            "events": self.event_count,
+            "speed": self.speed,
+            "elapsed_s": round(elapsed, 3),
+            "enqueue_s": round(enqueue_time, 3),
+            "throughput_per_s": round(self.event_count / elapsed, 1) if elapsed > 0 else 0.0,
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "errors": self.error_count,
+            "status": {str(status): count for status, count in sorted(self.status_count.items())},
+            "sender": self.sender.stats(),
+            "latency_avg_ms": round(pool_stats["latency_avg_ms"], 3),
+            "latency_p99_ms": round(pool_stats["latency_p99_ms"], 3),
+            "latency_max_ms": round(pool_stats["latency_max_ms"], 3),
+            "reuse_rate": round(pool_stats["reuse_rate"], 3),
+        }
+
+
+def main():
+    options = get_options()
+    if not options.journal and not options.log:
+        print("--journalか--logを指定してください。")
+        return
+    url = options.url
+    if not url:
+        if not options.sim_config:
+            print("--urlか--sim-configを指定してください。")
+            return
+        url = read_url(options.sim_config)
+
+    if options.journal:
+        events = read_journal_events(options.journal, options.begin, options.end)
+    else:
+        events = read_log_events(options.log)
+
+    print("replay start: %s" % (datetime.datetime.now()))
+    replay = Replay(url, options.speed, options.workers, options.queue_size, options.pool_size, options.timeout)
+    result = replay.run(events)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import time
+
+# 時計の種類
+CLOCK_WALL = "wall"     # 実時間
+CLOCK_SIM = "sim"       # シミュレーション時間
+CLOCKS = (CLOCK_WALL, CLOCK_SIM)
+
+
+# 実時間の時計(UNIX時間のミリ秒)
+class WallClock:
+
+    def now_ms(self):
+        return int(time.time() * 1000)
+
+
+# シミュレーション時間の時計
+#   シミュレーション開始時の実時間にシミュレーション時間を加算した時刻を返す
+#   (TimeStampなどの形式は実時間の時計と同じまま、時間の進み方のみシミュレーションに合わせる)
+class SimClock:
+
+    def __init__(self, get_sim_time_ms, start_ms=None) -> None:
+        self.get_sim_time_ms = get_sim_time_ms
+        self.start_ms = int(time.time() * 1000) if start_ms is None else int(start_ms)
+
+    def now_ms(self):
+        return self.start_ms + int(self.get_sim_time_ms())
+
+    # 開始時の実時間の変更(チェックポイントから再開した場合に保存時の時計に合わせる)
+    def rebase(self, start_ms):
+        self.start_ms = int(start_ms)
+
+
+# 時計の作成
+#   get_sim_time_ms: 現在のシミュレーション時間(ミリ秒)を返す関数
+def create_clock(clock_type, get_sim_time_ms):
+    if clock_type == CLOCK_SIM:
+        return SimClock(get_sim_time_ms)
+    if clock_type == CLOCK_WALL:
+        return WallClock()
+    raise ValueError("clock must be one of %s: %s" % (", ".join(CLOCKS), clock_type))
+
+
+# TIME_COMPRESSIONに合わせたステップ間の待ち時間(ミリ秒)
+#   time_compression: 0の場合は実時間、N(>0)の場合はN倍速
+def get_step_delay_ms(delay_ms, time_compression):
+    if time_compression > 0:
+        return delay_ms / time_compression
+    return delay_ms
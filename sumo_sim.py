@@ -13,13 +13,21 @@ import math
 import logging
 from concurrent.futures import ThreadPoolExecutor
 import threading
+import queue
 import urllib
 from urllib import request
 import socket
+import http.client
 import numpy as np
 import pandas as pd
 
 from flask import Flask, request, jsonify, abort, make_response
+from werkzeug.serving import WSGIRequestHandler
+# waitressがインストールされている場合は受信サーバとして使用
+try:
+    from waitress import serve
+except ImportError:
+    serve = None
 from flask_cors import CORS
 
 # Python用に用意されているTraCIのライブラリへのパスを設定する
@@ -32,24 +40,67 @@ else:
 import sumolib
 
 # TraCIの機能を使うためにインポート
-import traci
+# --libsumo指定時(もしくは環境変数LIBSUMO_AS_TRACI設定時)はlibsumoをインプロセスで使用する
+USE_LIBSUMO = "--libsumo" in sys.argv or "LIBSUMO_AS_TRACI" in os.environ
+import traci.constants as tc
+from traci.exceptions import FatalTraCIError
+if USE_LIBSUMO:
+    import libsumo as traci
+else:
+    import traci
 print(os.environ["SUMO_HOME"])
 
+from detector_snapshot import DetectorSnapshot, get_vehicle_magnification
+from network_cache import NetworkCache
+from async_log import set_queue_logging, get_log_level
+from command_codec import encode_command, make_command
+from change_filter import ChangeOnlyFilter
+from delay_scheduler import DelayScheduler
+from history_writer import create_history_writer, COLUMNAR_AVAILABLE, HISTORY_FORMATS, HISTORY_FORMAT_TEXT
+from sim_clock import create_clock, get_step_delay_ms, CLOCK_SIM, CLOCK_WALL
+from pacing import PacingController
+from checkpoint import save_checkpoint, load_sumo_state, load_sim_state, is_checkpoint
+from interval_index import SensorIntervalIndex, SensorRuleIndex
+from event_journal import EventJournal, JOURNAL_EXTENSIONS, JOURNAL_COMPRESSION_GZIP, JOURNAL_COMPRESSION_ZSTD, JOURNAL_INBOUND, JOURNAL_OUTBOUND, ZSTD_AVAILABLE
+from event_sender import EventSender, BATCH_CONTENT_TYPES, BATCH_FORMAT_JSON, pack_commands, unpack_commands
+from http_pool import HttpConnectionPool
+
 class SumoSim:
     START_GUIDE_FILE = "/home/traffic/trafficsimulator/GuideCommand/start_guide"
     sim_time = 3600
     run_flg = True
     lock = threading.Lock()
     is_traci_start = False
+    thread_sim = None
+    sim_error = None
+    # --scenario-listでbatch_runnerに渡すオプション(各シナリオにはそれ以外のオプションをそのまま渡す)
+    BATCH_RUNNER_OPTIONS = ("--scenario-list", "--scenario-root", "--sim-config", "--output-directory", "--map",
+                            "--workers", "--traci-port", "--http-port", "--time", "--seed")
+    # 実行時のディレクトリからの相対パスを指定するオプション
+    PATH_OPTIONS = ("--disable-sensor-file", "--delay-event-file", "--save-checkpoint", "--load-checkpoint")
+    # ステップごとに一括取得する車両の変数
+    VEHICLE_SUBSCRIPTION_VARS = [tc.VAR_SPEED, tc.VAR_LENGTH, tc.VAR_POSITION, tc.VAR_WAITING_TIME, tc.VAR_LANE_ID, tc.VAR_LANEPOSITION, tc.VAR_STOPSTATE]
+    # ステップごとに一括取得する検出器の変数
+    DETECTOR_SUBSCRIPTION_VARS = [tc.LAST_STEP_VEHICLE_ID_LIST, tc.LAST_STEP_VEHICLE_NUMBER]
+    # ステップごとに一括取得するシミュレーションの変数
+    SIMULATION_SUBSCRIPTION_VARS = [tc.VAR_TIME, tc.VAR_TIME_STEP, tc.VAR_DEPARTED_VEHICLES_IDS]
 
     def __init__(self):
         # 引数読み込み
         optParser = optparse.OptionParser()
         optParser.add_option("--nogui", action="store_true",
                             default=False, help="run the commandline version of sumo")
+        optParser.add_option("--libsumo", action="store_true",
+                            default=False, help="use libsumo in-process instead of TraCI (requires --nogui)")
         optParser.add_option("--map", help="map name")
         optParser.add_option("--scenario", help="scenario name")
-        optParser.add_option("--scenario-list", help="scenario name list")
+        optParser.add_option("--scenario-list", help="scenario name list (runs batch_runner.py when --scenario is not given)")
+        optParser.add_option("--scenario-root", default="/home/traffic/SUMO_SCENARIO", help="scenario root directory")
+        optParser.add_option("--workers", type=int, help="number of parallel runs for --scenario-list")
+        optParser.add_option("--reuse-sumo", action="store_true", default=False,
+                            help="run --scenario-list scenarios one after another on one SUMO connection (traci.load)")
+        optParser.add_option("--traci-port", type=int, help="TraCI port")
+        optParser.add_option("--http-port", type=int, help="receiver port (overrides HTTP_SERVER_PORT)")
         optParser.add_option("--sumo-config", default="sumo.sumocfg", help="sumo config file")
         optParser.add_option("--sim-config", default="Set.json", help="sumo simulation config file")
         optParser.add_option("--seed", type=int, help="random seed")
@@ -58,6 +109,8 @@ class SumoSim:
         optParser.add_option("--double-speed", action="store_true", default=False, help="sim speed")
         optParser.add_option("--log", action="store_true",
                             default=False, help="log flag")
+        optParser.add_option("--quiet", action="store_true",
+                            default=False, help="do not print simulation progress to stdout (warnings only)")
         optParser.add_option("--new-signal-event", type=int, default=0, help="new signal event flag")
         optParser.add_option("--auto-start", type=int, default=0, help="new signal event flag")
         optParser.add_option("--output-directory", default="result", help="output directory")
@@ -66,7 +119,19 @@ class SumoSim:
         optParser.add_option("--src", action="store_true", help="the remote directory to sync")
         optParser.add_option("--dst", action="store_true", default="states", help="the subdirectory for the synced files")
         optParser.add_option("--delay", default=1,
-                            type=float, help="the delay between simulation states")
+                            type=float, help="the delay between simulation states [s] (divided by TIME_COMPRESSION)")
+        optParser.add_option("--pace-ratio", type=float, default=0,
+                            help="target sim/real time ratio paced in the control loop (0: off, uses --delay)")
+        optParser.add_option("--pace-max-lag", type=float, default=0,
+                            help="max lag [ms] to catch up when pacing (0: unlimited)")
+        optParser.add_option("--save-checkpoint", help="directory to save SUMO and SUMO-SIM state to")
+        optParser.add_option("--checkpoint-time", type=float,
+                            help="sim time [s] to save the checkpoint at (default: end of the run)")
+        optParser.add_option("--load-checkpoint", help="directory of a checkpoint to start from")
+        optParser.add_option("--settings-override", action="append", default=[],
+                            help="override a setting as KEY=VALUE (Set.json key, or lane_settings./public_settings./signal_settings. dotted path), can be repeated")
+        optParser.add_option("--clock", choices=[CLOCK_WALL, CLOCK_SIM],
+                            help="time source for timestamps and timers (default: sim if TIME_COMPRESSION > 0, otherwise wall)")
         optParser.add_option("--iterations", type=int,
                             help="the number of iterations to run (mainly useful for testing)")
         optParser.add_option("-v", "--verbose", action="store_true",
@@ -79,15 +144,119 @@ class SumoSim:
                             default=0, help="vehicle position")
         # remaining command line options are treated as rsync args
         options, args = optParser.parse_args()
-        self.set_log_config()
 
         if not options.scenario and not options.scenario_list:
             print("シナリオを指定してください。")
-            sys.exit()
+            sys.exit(1)
+        if options.time is None:
+            print("シミュレーション時間(--time)を指定してください。")
+            sys.exit(1)
+
+        # シナリオリストのみ指定された場合は並列実行(--reuse-sumoの場合は1つのSUMOで順に実行)
+        if not options.scenario and not options.reuse_sumo:
+            import batch_runner
+            # 各シナリオはスクリプトのディレクトリで実行されるため、パスは絶対パスにしておく
+            batch_args = ["--scenario-list", options.scenario_list, "--scenario-root", os.path.abspath(options.scenario_root),
+                          "--sim-config", options.sim_config, "--output-directory", os.path.abspath(options.output_directory)]
+            if options.map:
+                batch_args += ["--map", options.map]
+            if options.workers:
+                batch_args += ["--workers", str(options.workers)]
+            if options.traci_port:
+                batch_args += ["--traci-port", str(options.traci_port)]
+            if options.http_port:
+                batch_args += ["--http-port", str(options.http_port)]
+            if options.time is not None:
+                batch_args += ["--time", str(options.time)]
+            if options.seed is not None:
+                batch_args += ["--seed", str(options.seed)]
+            # batch_runnerで処理するオプション以外はそのまま各シナリオに渡す
+            batch_args += ["--"] + self.get_forward_args(sys.argv[1:], optParser)
+            sys.exit(batch_runner.main(batch_args))
+
+        # libsumoはGUIを持たないため、--noguiとの併用のみ可能
+        if USE_LIBSUMO and not options.nogui:
+            print("libsumoを使用する場合は--noguiを指定してください。")
+            sys.exit(1)
+
+        # 実行するシナリオ(--reuse-sumoでシナリオリストのみ指定された場合は複数)
+        if options.scenario:
+            self.scenario_list = [os.path.join(options.map, options.scenario)]
+        else:
+            import batch_runner
+            self.scenario_list = [os.path.join(map_name, scenario) for map_name, scenario in batch_runner.expand_scenarios(
+                options.scenario_list, options.scenario_root, options.map, options.sim_config)]
+            if not self.scenario_list:
+                print("実行するシナリオがありません。")
+                sys.exit(1)
+        self.options = options
+        self.is_log_config = False
+        self.setup_scenario(self.scenario_list[0])
+
+        if options.nogui:
+            sumoBinary = sumolib.checkBinary('sumo')
+        else:
+            sumoBinary = sumolib.checkBinary('sumo-gui')
 
-        self.scenario_name = os.path.join(options.map, options.scenario)
+        # print(traci.getVersion())
+        # this is the normal way of using traci. sumo is started as a
+        # # subprocess and then the python script connects and runs
+        
+        self.api = Flask(__name__)
+        # 受信リクエストのサイズ上限(超えた場合は413を返す)
+        self.api.config["MAX_CONTENT_LENGTH"] = int(self.settings["HTTP_SERVER_MAX_REQUEST_SIZE"])
 
-        scenario_path = os.path.join("/home/traffic/SUMO_SCENARIO", self.scenario_name)
+        self.api.add_url_rule("/", methods=['POST'], view_func=self.post_sim_recv)
+        # sumo_args = [sumoBinary, step_length, options.seed]
+        # self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="thread")
+            
+        # with ThreadPoolExecutor(max_workers=2, thread_name_prefix="thread") as executor:
+        try:
+            self.thread_sim = threading.Thread(target=self.sumo_run_thread, args=(sumoBinary, options.seed))
+            thread_recv = threading.Thread(target=self.recv, daemon=True)
+            self.thread_sim.start()
+            thread_recv.start()
+
+            # self.sumo_thread = self.executor.submit(self.sumo_run, sumoBinary, step_length, options.seed)
+            # self.recv_thread = self.executor.submit(self.recv)
+        except KeyboardInterrupt:
+            print("シミュレーション終了")
+            sys.exit()
+        # self.run()
+            
+    # batch_runnerに渡すsumo_sim.pyのオプション
+    #   BATCH_RUNNER_OPTIONSはbatch_runnerのオプションとして渡すため除き、PATH_OPTIONSのパスは絶対パスに変換する
+    def get_forward_args(self, argv, optParser):
+        forward_args = []
+        i = 0
+        while i < len(argv):
+            arg = argv[i]
+            i += 1
+            name, sep, value = arg.partition("=")
+            option = optParser.get_option(name) if arg.startswith("-") else None
+            if option is None:
+                forward_args.append(arg)
+                continue
+            if option.takes_value() and not sep:
+                value = argv[i] if i < len(argv) else ""
+                i += 1
+            if name in self.BATCH_RUNNER_OPTIONS:
+                continue
+            if not option.takes_value():
+                forward_args.append(name)
+                continue
+            if name in self.PATH_OPTIONS and value != "":
+                value = os.path.abspath(value)
+            forward_args += [name, value]
+        return forward_args
+
+    # シナリオごとの設定読み込み・状態の初期化
+    #   --reuse-sumoで次のシナリオに切り替える場合も呼び出し、前のシナリオの状態をすべて作り直す
+    def setup_scenario(self, scenario_name):
+        options = self.options
+        self.scenario_name = scenario_name
+
+        scenario_path = os.path.join(options.scenario_root, self.scenario_name)
         self.sim_time = options.time
         
         # 設定ファイル読み込み
@@ -100,7 +269,14 @@ class SumoSim:
         self.lane_settings = self.setting_read(self.lane_settings_name)
         self.public_settings = self.setting_read(self.public_settings_name)
         self.signal_settings = self.setting_read(self.signal_settings_name)
+        self.apply_settings_override(options.settings_override)
         self.set_settings_default()
+        # ログ出力設定は最初のシナリオのみ
+        if not self.is_log_config:
+            self.set_log_config(get_log_level(self.settings["LOG_LEVEL"]), options.quiet)
+            self.is_log_config = True
+        if options.settings_override:
+            self.sumo_log.info("設定の上書き: " + str(options.settings_override))
         self.straight_green_time = ""
         self.straight_yellow_time = ""
         self.straight_red_time = ""
@@ -124,7 +300,7 @@ class SumoSim:
                 self.regulation_yellow_time = str(int(int(self.signal_settings["2"]["YellowTime"]) / 1000))
                 self.regulation_red_time = str(int(int(self.signal_settings["2"]["RedTime"]) / 1000))
         self.simulation_setting()
-        step_length = int(self.settings["FRAME_RATE"]) / 1000
+        self.step_length = int(self.settings["FRAME_RATE"]) / 1000
         self.straight_traffic_volume = ""
         self.regulation_traffic_volume = ""
         if "STRAIGHT_TRAFFIC_VOLUME" in self.settings:
@@ -214,6 +390,8 @@ class SumoSim:
         self.inside_car_number = -1
         self.congestion_vehicle_number = self.set_congestion_vehicle_number()
         self.go_possible_flag = False
+        self.go_possible_time = None
+        self.go_possible_sim_time = None
         self.straight_vehicle_number = 0
         self.regulation_vehicle_number = 0
 
@@ -234,28 +412,152 @@ class SumoSim:
         self.send_time_out = 30
         self.host = self.settings["HTTP_SERVER_HOST"]
         self.port = self.settings["HTTP_SERVER_PORT"]
+        if options.http_port:
+            self.port = options.http_port
+        self.traci_port = options.traci_port
+        # --reuse-sumoで複数シナリオを実行する場合、TraCIの接続と受信サーバは最初のシナリオのポートのまま使用する
         self.output_directory = options.output_directory
+        if len(self.scenario_list) > 1:
+            # 複数シナリオを順に実行する場合はシナリオごとに出力先を分ける
+            self.output_directory = os.path.join(options.output_directory, self.scenario_name)
+            os.makedirs(self.output_directory, exist_ok=True)
+        # 受信サーバ(waitress、またはFlaskの開発用サーバ)
+        self.http_server_backend = self.settings["HTTP_SERVER_BACKEND"]
+        if self.http_server_backend not in ("waitress", "flask"):
+            raise ValueError("HTTP_SERVER_BACKEND must be one of waitress, flask: %s" % (self.http_server_backend))
+        if self.http_server_backend == "waitress" and serve is None:
+            # waitressがない環境では従来どおりFlaskの開発用サーバで受信する
+            print("waitressがインストールされていないため、Flaskの開発用サーバで受信します。")
+            self.http_server_backend = "flask"
+        # KPI履歴の出力(ファイルを開いたままにし、まとめて書き込む)
+        history_format = self.settings["HISTORY_OUTPUT_FORMAT"]
+        if history_format not in HISTORY_FORMATS:
+            raise ValueError("HISTORY_OUTPUT_FORMAT must be one of %s: %s" % (", ".join(HISTORY_FORMATS), history_format))
+        if history_format != HISTORY_FORMAT_TEXT and not COLUMNAR_AVAILABLE:
+            print("%s形式で履歴を出力するにはpyarrowをインストールしてください。" % (history_format))
+            sys.exit(1)
+        self.history_writer = create_history_writer(
+            self.output_directory,
+            history_format,
+            int(self.settings["HISTORY_FLUSH_SIZE"]),
+            float(self.settings["HISTORY_FLUSH_INTERVAL"]),
+            float(self.settings["HISTORY_COLUMNAR_FLUSH_INTERVAL"]),
+        )
+        # 送信先へのkeep-alive接続プール
+        self.http_pool = HttpConnectionPool(
+            int(self.settings["HTTP_CONNECTION_POOL_SIZE"]),
+            float(self.settings["HTTP_CONNECTION_IDLE_TIMEOUT"]),
+            int(self.send_time_out),
+        )
+        # コマンド送信ワーカー(シミュレーションスレッドはキューへの追加のみ行う)
+        #   HTTP_SEND_OVERFLOW_POLICYがspillの場合、キューから溢れたコマンドは送信せずにspill_fileに記録する(送信結果のdroppedに含む)
+        spill_file = self.settings["HTTP_SEND_SPILL_FILE"]
+        if spill_file == "":
+            spill_file = os.path.join(self.output_directory, "spillCommand.txt")
+        self.event_sender = EventSender(
+            self.post_command,
+            int(self.settings["HTTP_SERVER_POOL_NUMBER"]),
+            int(self.settings["HTTP_SEND_QUEUE_SIZE"]),
+            self.settings["HTTP_SEND_OVERFLOW_POLICY"],
+            spill_file,
+            self.sumo_log,
+        )
+        # 送受信コマンドのジャーナル
+        self.event_journal = None
+        if self.settings["FLAG_EVENT_JOURNAL"] == "TRUE":
+            journal_compression = self.settings["EVENT_JOURNAL_COMPRESSION"]
+            if journal_compression == JOURNAL_COMPRESSION_ZSTD and not ZSTD_AVAILABLE:
+                self.sumo_log.warning("zstandardがインストールされていないため、ジャーナルをgzipで圧縮します。")
+                journal_compression = JOURNAL_COMPRESSION_GZIP
+            self.event_journal = EventJournal(
+                os.path.join(self.output_directory, "eventJournal" + JOURNAL_EXTENSIONS[journal_compression]),
+                journal_compression,
+                int(self.settings["EVENT_JOURNAL_BLOCK_SIZE"]),
+                float(self.settings["EVENT_JOURNAL_FLUSH_INTERVAL"]),
+            )
+        # まとめて送信(1ステップ分、または指定時間内のコマンドを1リクエストで送信)
+        self.send_batch_flg = self.settings["FLAG_SEND_BATCH"] == "TRUE"
+        self.send_batch_format = self.settings["SEND_BATCH_FORMAT"]
+        if self.send_batch_format not in BATCH_CONTENT_TYPES:
+            raise ValueError("SEND_BATCH_FORMAT must be one of %s: %s" % (", ".join(BATCH_CONTENT_TYPES), self.send_batch_format))
+        self.send_batch_window = int(self.settings["SEND_BATCH_WINDOW"])
+        self.send_batch = []
+        self.send_batch_start_time = 0
+        self.send_batch_lock = threading.Lock()
+        if self.send_batch_flg:
+            self.send_content_type = BATCH_CONTENT_TYPES[self.send_batch_format]
+        else:
+            self.send_content_type = BATCH_CONTENT_TYPES[BATCH_FORMAT_JSON]
+        # 変化時のみ送信(前回送信内容から変化がないコマンドは送信しない)
+        self.send_change_only_flg = self.settings["FLAG_SEND_CHANGE_ONLY"] == "TRUE"
+        # CHANGE_ONLY_COMMAND_LISTが空の場合は状態のコマンドのみ対象(侵入・離脱などのイベントは常に送信)
+        change_only_command_list = [command_id.strip() for command_id in self.settings["CHANGE_ONLY_COMMAND_LIST"].split(",") if command_id.strip() != ""]
+        self.change_only_filter = ChangeOnlyFilter(change_only_command_list, int(self.settings["SEND_HEARTBEAT_INTERVAL"]))
+        self.suppressed_command_number = 0
         # self.guide_traffic_light_sim_time = 0
         self.guide_traffic_light = ["-1", "-1"]
         self.collision_caution = False
         self.time_lag = 0
         self.change_time = 0
 
-        if options.nogui:
-            sumoBinary = sumolib.checkBinary('sumo')
-        else:
-            sumoBinary = sumolib.checkBinary('sumo-gui')
+        # 時計(TimeStamp、タイムアウト・タイムラグの経過時間に使用)
+        #   TIME_COMPRESSIONが0の場合は実時間、N倍速の場合はシミュレーション時間をデフォルトとする
+        self.time_compression = float(self.settings["TIME_COMPRESSION"])
+        clock_type = options.clock or self.settings["SIM_CLOCK"]
+        if clock_type == "":
+            clock_type = CLOCK_SIM if self.time_compression > 0 else CLOCK_WALL
+        self.clock = create_clock(clock_type, lambda: self.current_sim_time_ms)
+        self.step_delay_ms = get_step_delay_ms(options.delay * 1000, self.time_compression)
+        # 実時間に対する比率の制御(指定した場合はSUMOの--delayを使わずにステップごとに待つ)
+        self.pacing = None
+        if options.pace_ratio > 0:
+            self.pacing = PacingController(options.pace_ratio, options.pace_max_lag)
+            self.step_delay_ms = 0
+
+        # チェックポイント(保存先・保存時刻、読み込み元)
+        self.save_checkpoint_directory = options.save_checkpoint
+        self.checkpoint_time = options.checkpoint_time
+        self.load_checkpoint_directory = options.load_checkpoint
+        if self.load_checkpoint_directory and not is_checkpoint(self.load_checkpoint_directory):
+            print("チェックポイントがありません: " + self.load_checkpoint_directory)
+            sys.exit(1)
+
+        # サブスクリプション結果(ステップごとに一括取得した車両・検出器の状態)
+        self.vehicle_state = {}
+        self.detector_state = {}
+        self.induction_loop_state = {}
+        self.all_vehicle_ids = self.vehicle_state.keys()
+        self.current_sim_time = 0
+        self.current_sim_time_ms = 0
+        # 実行中に変化しないネットワーク・検出器情報(TraCI開始直後に取得)
+        self.network_cache = NetworkCache(traci)
+        # 検出器スナップショット(ステップごとに作り直し、全認識処理で共有)
+        self.detector_snapshot = DetectorSnapshot(0, {})
+        # 受信コマンド(HTTPスレッドで追加し、シミュレーションスレッドでステップ開始時に反映)
+        self.recv_inbox = queue.SimpleQueue()
 
         if os.path.isfile(options.disable_sensor_file):
             self.use_disable_sensor_file = True
             self.df_disable_sensor = pd.read_csv(options.disable_sensor_file, comment='#', skipinitialspace=True)
+            # ノード番号・センサーIDごとの無効期間(起動時に作成)
+            self.disable_sensor_index = SensorIntervalIndex(zip(
+                self.df_disable_sensor["NodeNo"],
+                self.df_disable_sensor["SensorID"],
+                self.df_disable_sensor["Begin"],
+                self.df_disable_sensor["End"],
+            ))
         else:
             self.use_disable_sensor_file = False
 
         if os.path.isfile(options.delay_event_file):
             self.use_delay_event_file = True
-            self.df_delay_data = pd.DataFrame({"send_time":[], "send_data":[]})
+            self.delay_scheduler = DelayScheduler()
             self.df_delay_event = pd.read_csv(options.delay_event_file, comment='#', skipinitialspace=True)
+            # ノード番号・センサーIDごとの遅延ルール(起動時に作成)
+            self.delay_event_index = SensorRuleIndex(
+                (rule["NodeNo"], rule["SensorID"], rule["Begin"], rule["End"], rule)
+                for rule in self.df_delay_event.to_dict("records")
+            )
         else:
             self.use_delay_event_file = False
 
@@ -263,40 +565,36 @@ class SumoSim:
         if options.double_speed:
             self.sim_speed = 2.0
 
-        # print(traci.getVersion())
-        # this is the normal way of using traci. sumo is started as a
-        # # subprocess and then the python script connects and runs
-        
-        self.api = Flask(__name__)
-
-        self.api.add_url_rule("/", methods=['POST'], view_func=self.post_sim_recv)
-        # sumo_args = [sumoBinary, step_length, options.seed]
-        # self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="thread")
-            
-        # with ThreadPoolExecutor(max_workers=2, thread_name_prefix="thread") as executor:
+    # シミュレーションのスレッド(例外は終了コードに反映するため保持してから送出する)
+    def sumo_run_thread(self, sumoBinary, seed):
         try:
-            thread_sim = threading.Thread(target=self.sumo_run, args=(sumoBinary, step_length, options.seed))
-            thread_recv = threading.Thread(target=self.recv, daemon=True)
-            thread_sim.start()
-            thread_recv.start()
+            self.sumo_run(sumoBinary, seed)
+        except BaseException as e:
+            self.sim_error = e
+            raise
 
-            if self.use_delay_event_file:
-                thread_delay_event = threading.Thread(target=self.delay_send)
-                thread_delay_event.start()
+    def sumo_run(self, sumoBinary, seed):
+        try:
+            for i, scenario_name in enumerate(self.scenario_list):
+                if i > 0:
+                    # 前のシナリオの状態をすべて作り直してから次のシナリオを実行
+                    self.setup_scenario(scenario_name)
+                self.run_scenario(sumoBinary, seed)
+        finally:
+            # シナリオの途中で例外が発生した場合もTraCIの接続を閉じる
+            if self.is_traci_start:
+                traci.close()
+                self.is_traci_start = False
+        # os.kill(os.getpid(), 9)
+        # sys.exit()
 
-            # self.sumo_thread = self.executor.submit(self.sumo_run, sumoBinary, step_length, options.seed)
-            # self.recv_thread = self.executor.submit(self.recv)
-        except KeyboardInterrupt:
-            print("シミュレーション終了")
-            sys.exit()
-        # self.run()
-            
-    def sumo_run(self, sumoBinary, step_length, seed):
+    # SUMOの起動オプション
+    def get_sumo_option(self, sumoBinary, seed):
         sumo_option = [
                 sumoBinary,
                 "-c", self.sumo_config,
-                "--step-length", str(step_length),
-                "--delay", "1000",
+                "--step-length", str(self.step_length),
+                "--delay", str(int(self.step_delay_ms)),
                 "--seed", str(seed),
                 "--ignore-junction-blocker", str(60),
                 "--time-to-teleport", "-1",
@@ -319,32 +617,94 @@ class SumoSim:
             ]
         if not self.auto_start == "":
             sumo_option.append(self.auto_start)
+        return sumo_option
 
-        traci.start(sumo_option)
-        self.is_traci_start = True
-        self.run()
-        traci.close()
-        # os.kill(os.getpid(), 9)
-        # sys.exit()
-
+    # 1シナリオ分の実行
+    #   2つ目以降のシナリオはSUMOを起動したままtraci.loadでネットワーク・設定を読み込み直す
+    def run_scenario(self, sumoBinary, seed):
+        sumo_option = self.get_sumo_option(sumoBinary, seed)
+        start = time.perf_counter()
+        try:
+            if self.is_traci_start:
+                traci.load(sumo_option[1:])
+            elif self.traci_port and not USE_LIBSUMO:
+                traci.start(sumo_option, port=self.traci_port)
+            else:
+                traci.start(sumo_option)
+            self.is_traci_start = True
+            self.network_cache.load()
+            if self.load_checkpoint_directory:
+                # 車両はすべて作り直されるため、状態を読み込んでからサブスクライブする
+                load_sumo_state(self.load_checkpoint_directory, traci)
+                self.sumo_log.info("チェックポイント読み込み: %s (%s s)", self.load_checkpoint_directory, traci.simulation.getTime())
+            self.set_subscription()
+            self.sumo_log.info("シナリオ開始: %s (起動 %.3f s)", self.scenario_name, time.perf_counter() - start)
+            self.run()
+            # 未送信コマンドを送信し終えてから終了
+            self.flush_send_batch(True)
+        finally:
+            self.close_scenario()
+
+    # シナリオ終了時の後処理(例外で中断した場合も履歴・送信・ジャーナルを閉じる)
+    def close_scenario(self):
+        try:
+            # 溜めている履歴を書き込んでから終了
+            self.history_writer.close()
+        finally:
+            try:
+                self.event_sender.close()
+                if self.use_delay_event_file:
+                    self.sumo_log.info("遅延送信: " + str(self.delay_scheduler.stats()))
+                self.sumo_log.info("送信結果: " + str(self.event_sender.stats()))
+                if self.send_change_only_flg:
+                    self.sumo_log.info("変化なしのため送信しなかったコマンド数: " + str(self.suppressed_command_number))
+                self.sumo_log.info("接続プール: " + str(self.http_pool.stats()))
+                self.http_pool.close()
+            finally:
+                if self.event_journal is not None:
+                    self.event_journal.close()
+                    self.sumo_log.info("ジャーナル: " + str(self.event_journal.stats()))
+        if self.pacing is not None:
+            self.sumo_log.info("ペース制御: " + str(self.pacing.stats()))
+
+
+    # チェックポイント保存(runのループ内の状態も合わせて保存)
+    def save_checkpoint(self, step, count, straight_old_tlsState, regulation_old_tlsState, t_old, t_old_branch):
+        loop_state = {
+            "step": step,
+            "count": count,
+            "straight_old_tlsState": straight_old_tlsState,
+            "regulation_old_tlsState": regulation_old_tlsState,
+            "t_old": t_old,
+            "t_old_branch": t_old_branch,
+        }
+        save_checkpoint(self.save_checkpoint_directory, self, traci, loop_state)
+        self.sumo_log.info("チェックポイント保存: %s (%s s)", self.save_checkpoint_directory, self.current_sim_time)
 
     # ログ出力設定
-    def set_log_config(self):        
+    #   ファイル・標準出力への出力はバックグラウンドのスレッドで行う
+    #   log_level: Set.jsonのLOG_LEVEL(0:ERROR 1:WARNING 2:INFO 3:DEBUG)
+    #   quiet: 標準出力には警告以上のみ出力
+    def set_log_config(self, log_level=logging.INFO, quiet=False):
         # SUMO-SIM LOG
         self.sumo_log = logging.getLogger('SUMO')
         formatter = logging.Formatter('%(asctime)s <%(levelname)s> : %(message)s')
         fileHandler = logging.FileHandler('./log/' + str(datetime.datetime.today()) + '-sumo.log', mode='a')
         fileHandler.setFormatter(formatter)
-        self.sumo_log.setLevel(logging.INFO)
-        self.sumo_log.addHandler(fileHandler)
+        set_queue_logging(self.sumo_log, [fileHandler], log_level)
  
         # SUMO-SERVER LOG
         self.server_log = logging.getLogger('SERVER')
         formatter = logging.Formatter('%(asctime)s <%(levelname)s> : %(message)s')
         fileHandler = logging.FileHandler('./log/server.log', mode='a')
         fileHandler.setFormatter(formatter)
-        self.server_log.setLevel(logging.INFO)
-        self.server_log.addHandler(fileHandler)
+        set_queue_logging(self.server_log, [fileHandler], log_level)
+
+        # 標準出力(シミュレーション中の経過表示)
+        self.console_log = logging.getLogger('CONSOLE')
+        streamHandler = logging.StreamHandler(sys.stdout)
+        streamHandler.setFormatter(logging.Formatter('%(message)s'))
+        set_queue_logging(self.console_log, [streamHandler], logging.WARNING if quiet else logging.DEBUG if log_level == logging.DEBUG else logging.INFO)
 
     def run(self):
         """execute the TraCI control loop"""
@@ -364,8 +724,15 @@ class SumoSim:
                 tls_key = "node" + str(i + 1)
                 self.tls_state_list[tls_key] = self.set_traffic_state_signal(node_traffic_guide_id)
                 self.tls_state_list[tls_key]["id"] = node_traffic_guide_id
-        print("tls_state_list: ")
-        print(self.tls_state_list)
+        if self.load_checkpoint_directory:
+            # チェックポイント保存時の状態から再開
+            loop_state = load_sim_state(self.load_checkpoint_directory, self)
+            step = loop_state["step"]
+            count = loop_state["count"]
+            straight_old_tlsState = loop_state["straight_old_tlsState"]
+            regulation_old_tlsState = loop_state["regulation_old_tlsState"]
+        # 整形は出力スレッドで行われるため、変更される辞書は文字列にしてから渡す
+        self.console_log.info("tls_state_list: " + str(self.tls_state_list))
 
         if not self.auto_start == "":
             # 自動開始モードの場合、交通誘導開始してからSUMOを起動
@@ -398,26 +765,42 @@ class SumoSim:
 
         t_old = -1
         t_old_branch = -60
+        if self.load_checkpoint_directory:
+            t_old = loop_state["t_old"]
+            t_old_branch = loop_state["t_old_branch"]
+        checkpoint_saved = False
+
+        while self.current_sim_time <= self.sim_time:
+            # 受信コマンドの反映(TraCIの操作はシミュレーションスレッドのみで行う)
+            self.apply_recv_commands()
 
-        while traci.simulation.getTime() <= self.sim_time:
             traci.simulationStep()
 
+            # サブスクリプション結果を一括取得(以降の処理はこの結果のみ参照)
+            self.update_subscription()
+
             # 全車両の検出フラグやナンバー割り当て
             self.set_vehicle_info()
             
             # マップ内から消えた車両IDの情報をnumber_dictから消去
-            allVehicleIDs = traci.vehicle.getIDList()
+            allVehicleIDs = self.all_vehicle_ids
             for vehicleId in self.vehicle_info:
                 if vehicleId not in allVehicleIDs:
                     self.vehicle_info.pop(str(vehicleId)) 
                 break
 
+            # 検出器スナップショット作成
+            self.detector_snapshot = self.build_detector_snapshot()
+
             # シミュレーション時間の取得
-            t_now = traci.simulation.getTime()
+            t_now = self.current_sim_time
             # t_old = datetime.datetime.now()
             # print(self.get_sim_time())
 
-            t_now_ms = traci.simulation.getCurrentTime()
+            t_now_ms = self.current_sim_time_ms
+
+            # 遅延データの送信
+            self.delay_send(t_now_ms)
 
             # 誘導隊員との連携現場の処理
             self.auto_traffic_state_judge()
@@ -440,16 +823,14 @@ class SumoSim:
                             f001_0000 = self.traffic_light_recognition(self.settings["STRAIGHT_TRAFFIC_LIGHT"], self.main_node_id)
                             if not self.is_disable_sensor(1, 10, t_now_ms):
                                 # print(f001_0000)
-                                self.sumo_log.info(f001_0000)
-                                self.send(self.set_command(f001_0000))
+                                self.send_command(f001_0000, 10)
                     
                     # 新規信号機認識
                     if self.new_signal_event_flg:
                         f001_0000 = self.new_traffic_light_recognition(self.settings["STRAIGHT_TRAFFIC_LIGHT"], self.main_node_id)
                         if not self.is_disable_sensor(1, 10, t_now_ms):
                             # print(f001_0000)
-                            self.sumo_log.info(f001_0000)
-                            self.send(self.set_command(f001_0000))
+                            self.send_command(f001_0000, 10)
             
                 # 規制側信号機
                 if self.settings["REGULATION_TRAFFIC_LIGHT"] != "":
@@ -465,24 +846,22 @@ class SumoSim:
                             f001_0000 = self.traffic_light_recognition(self.settings["REGULATION_TRAFFIC_LIGHT"], self.sub_node_id)
                             if not self.is_disable_sensor(2, 10, t_now_ms):
                                 # print(f001_0000)
-                                self.sumo_log.info(f001_0000)
-                                self.send(self.set_command(f001_0000))
+                                self.send_command(f001_0000, 10)
                     
                     # 新規信号機認識
                     if self.new_signal_event_flg:
                         f001_0000 = self.new_traffic_light_recognition(self.settings["REGULATION_TRAFFIC_LIGHT"], self.sub_node_id)
                         if not self.is_disable_sensor(2, 10, t_now_ms):
                             # print(f001_0000)
-                            self.sumo_log.info(f001_0000)
-                            self.send(self.set_command(f001_0000))
+                            self.send_command(f001_0000, 10)
             
             # メインPC(ストレート側処理)
-            self.sumo_log.info("-----------------------------メインPC-----------------------------")
+            self.sumo_log.debug("-----------------------------メインPC-----------------------------")
 
             # 滞留なしかどうか判定
             if self.straight_lane_info_use_flg == "0":
                 # 滞留なしの場合各イベントの通知をしない
-                self.sumo_log.info("滞留なし車線のため、各イベントの通知なし")
+                self.sumo_log.debug("滞留なし車線のため、各イベントの通知なし")
             
             else:
                 # 車列検出（離脱
@@ -490,65 +869,58 @@ class SumoSim:
                     f001_0300 = self.breakaway_vehicle_detection(self.settings["STRAIGHT_SECESSION_DETECTOR"], self.main_node_id)
                     if not self.is_disable_sensor(1, 13, t_now_ms):
                         # print(f001_0300)
-                        self.sumo_log.info(f001_0300)
-                        self.send(self.set_command(f001_0300))
+                        self.send_command(f001_0300, 13)
 
                 # 車列検出（接近
                 if self.settings["FLAG_APPROACH_VEHICLE_DETECTION"] == "TRUE":
                     f001_0400 = self.approaching_vehicle_detection(self.settings["STRAIGHT_APPROACH_DETECTOR"], self.main_node_id)
                     if not self.is_disable_sensor(1, 14, t_now_ms):
                         # print(f001_0400)
-                        self.sumo_log.info(f001_0400)
-                        self.send(self.set_command(f001_0400))
+                        self.send_command(f001_0400, 14)
 
                 # ナンバープレート認識
                 if self.settings["FLAG_LICENSE_PLATE_RECOGNITION"] == "TRUE":
                     f001_0700 = self.license_plate_recognition(self.main_node_id)
                     if not self.is_disable_sensor(1, 17, t_now_ms):
                         # print(f001_0700)
-                        self.sumo_log.info(f001_0700)
-                        self.send(self.set_command(f001_0700))
+                        self.send_command(f001_0700, 17)
 
                 # 車両認識（渋滞カメラ
                 if self.settings["FLAG_VEHICLE_RECOGNITION_TJ"] == "TRUE":
                     f001_0800 = self.vehicle_recognition_TJ(self.main_node_id)
                     if not self.is_disable_sensor(1, 18, t_now_ms):
                         # print(f001_0800)
-                        self.sumo_log.info(f001_0800)
-                        self.send(self.set_command(f001_0800))
+                        self.send_command(f001_0800, 18)
 
                 # 車両認識（ナンバープレート）
                 if self.settings["FLAG_VEHICLE_RECOGNITION_NP"] == "TRUE":
                     f001_0900 = self.vehicle_recognition_NP(self.main_node_id)
                     if not self.is_disable_sensor(1, 19, t_now_ms):
                         # print(f001_0900)
-                        self.sumo_log.info(f001_0900)
-                        self.send(self.set_command(f001_0900))
+                        self.send_command(f001_0900, 19)
 
                 # 接近・離脱検出
                 if self.settings["FLAG_APPROACH_BREAKAWAY_DETECTION"] == "TRUE":
                     f007_0000 = self.approach_breakaway_detection(self.main_node_id)
                     # if not self.is_disable_sensor(1, 19, t_now_ms):
                         # print(f007_0000)
-                    self.sumo_log.info(f007_0000)
-                    self.send(self.set_command(f007_0000))
+                    self.send_command(f007_0000, 70)
 
                 # 車速・距離検出
                 if self.settings["FLAG_SPEED_DISTANCE_RECOGNITION"] == "TRUE":
                     f002_0000 = self.speed_and_distance_recognition(self.settings["STRAIGHT_APPROACH_DETECTOR"], self.main_node_id)
                     if not self.is_disable_sensor(1, 20, t_now_ms):
                         # print(f002_0000)
-                        self.sumo_log.info(f002_0000)
-                        self.send(self.set_command(f002_0000))
+                        self.send_command(f002_0000, 20)
                         #speed_and_distance_recognition(self.settings["STRAIGHT_SECESSION_DETECTOR"])
 
             # サブPC(規制側処理)
-            self.sumo_log.info("-----------------------------サブPC-----------------------------")
+            self.sumo_log.debug("-----------------------------サブPC-----------------------------")
 
             # 滞留なしかどうか判定
             if self.regulation_lane_info_use_flg == "1":
                 # 滞留なしの場合各イベントの通知をしない
-                self.sumo_log.info("滞留なし車線のため、各イベントの通知なし")
+                self.sumo_log.debug("滞留なし車線のため、各イベントの通知なし")
             
             else:
                 # 車列検出（離脱
@@ -556,60 +928,53 @@ class SumoSim:
                     f001_0300 = self.breakaway_vehicle_detection(self.settings["REGULATION_SECESSION_DETECTOR"], self.sub_node_id)
                     if not self.is_disable_sensor(2, 13, t_now_ms):
                         # print(f001_0300)
-                        self.sumo_log.info(f001_0300)
-                        self.send(self.set_command(f001_0300))
+                        self.send_command(f001_0300, 13)
 
                 # 車列検出（接近
                 if self.settings["FLAG_APPROACH_VEHICLE_DETECTION"] == "TRUE":
                     f001_0400 = self.approaching_vehicle_detection(self.settings["REGULATION_APPROACH_DETECTOR"], self.sub_node_id)
                     if not self.is_disable_sensor(2, 14, t_now_ms):
                         # print(f001_0400)
-                        self.sumo_log.info(f001_0400)
-                        self.send(self.set_command(f001_0400))
+                        self.send_command(f001_0400, 14)
 
                 # ナンバープレート認識
                 if self.settings["FLAG_LICENSE_PLATE_RECOGNITION"] == "TRUE":
                     f001_0700 = self.license_plate_recognition(self.sub_node_id)
                     if not self.is_disable_sensor(2, 17, t_now_ms):
                         # print(f001_0700)
-                        self.sumo_log.info(f001_0700)
-                        self.send(self.set_command(f001_0700))
+                        self.send_command(f001_0700, 17)
 
                 # 車両認識（渋滞カメラ
                 if self.settings["FLAG_VEHICLE_RECOGNITION_TJ"] == "TRUE":
                     f001_0800 = self.vehicle_recognition_TJ(self.sub_node_id)
                     if not self.is_disable_sensor(2, 18, t_now_ms):
                         # print(f001_0800)
-                        self.sumo_log.info(f001_0800)
-                        self.send(self.set_command(f001_0800))
+                        self.send_command(f001_0800, 18)
 
                 # 車両認識（ナンバープレート）
                 if self.settings["FLAG_VEHICLE_RECOGNITION_NP"] == "TRUE":
                     f001_0900 = self.vehicle_recognition_NP(self.sub_node_id)
                     if not self.is_disable_sensor(2, 19, t_now_ms):
                         # print(f001_0900)
-                        self.sumo_log.info(f001_0900)
-                        self.send(self.set_command(f001_0900))
+                        self.send_command(f001_0900, 19)
 
                 # 接近・離脱検出
                 if self.settings["FLAG_APPROACH_BREAKAWAY_DETECTION"] == "TRUE":
                     f007_0000 = self.approach_breakaway_detection(self.sub_node_id)
                     # if not self.is_disable_sensor(1, 19, t_now_ms):
                         # print(f007_0000)
-                    self.sumo_log.info(f007_0000)
-                    self.send(self.set_command(f007_0000))
+                    self.send_command(f007_0000, 70)
 
                 # 車速・距離検出
                 if self.settings["FLAG_SPEED_DISTANCE_RECOGNITION"] == "TRUE":
                     f002_0000 = self.speed_and_distance_recognition(self.settings["REGULATION_APPROACH_DETECTOR"], self.sub_node_id)
                     if not self.is_disable_sensor(2, 20, t_now_ms):
                         # print(f002_0000)
-                        self.sumo_log.info(f002_0000)
-                        self.send(self.set_command(f002_0000))
+                        self.send_command(f002_0000, 20)
                         #speed_and_distance_recognition(self.settings["STRAIGHT_SECESSION_DETECTOR"])
 
             # 枝道処理
-            self.sumo_log.info("-----------------------------枝道-----------------------------")
+            self.sumo_log.debug("-----------------------------枝道-----------------------------")
             
             # 枝道の数分ループ
             # print(self.branch_info)
@@ -655,38 +1020,36 @@ class SumoSim:
 
 
             # 工事帯進入・離脱
-            self.sumo_log.info("-----------------------------工事帯進入・離脱検出-----------------------------")
+            self.sumo_log.debug("-----------------------------工事帯進入・離脱検出-----------------------------")
             if self.settings["FLAG_PENETRATION_BREAKAWAY"] == "TRUE":
-                # if traci.inductionloop.getLastStepVehicleNumber("straightIn"):
-                self.sumo_log.info("-----------------------------ストレート側-----------------------------")
+                # if self.get_induction_loop_vehicle_number("straightIn"):
+                self.sumo_log.debug("-----------------------------ストレート側-----------------------------")
                 
                 # 滞留なしかどうか判定
                 if self.straight_lane_info_use_flg == "0":
                     # 滞留なしの場合各イベントの通知をしない
-                    self.sumo_log.info("滞留なし車線のため、各イベントの通知なし")
+                    self.sumo_log.debug("滞留なし車線のため、各イベントの通知なし")
                 
                 else:
                     f006_0000 = self.penetration_breakaway(self.main_node_id)
                     # print(f006_0000)   # 工事帯進入・離脱検出
                     if f006_0000:
                         if not self.is_disable_sensor(1, 60, t_now_ms):
-                            self.sumo_log.info(f006_0000)   # 工事帯進入・離脱検出
-                            self.send(self.set_command(f006_0000))
+                            self.send_command(f006_0000, 60)   # 工事帯進入・離脱検出
 
-                self.sumo_log.info("-----------------------------規制側-----------------------------")
+                self.sumo_log.debug("-----------------------------規制側-----------------------------")
                 
                 # 滞留なしかどうか判定
                 if self.regulation_lane_info_use_flg == "1":
                     # 滞留なしの場合各イベントの通知をしない
-                    self.sumo_log.info("滞留なし車線のため、各イベントの通知なし")
+                    self.sumo_log.debug("滞留なし車線のため、各イベントの通知なし")
                 
                 else:
                     f006_0000 = self.penetration_breakaway(self.sub_node_id)
                     if f006_0000:
                         if not self.is_disable_sensor(2, 60, t_now_ms):
                             # print(f006_0000)   # 工事帯進入・離脱検出
-                            self.sumo_log.info(f006_0000)   # 工事帯進入・離脱検出
-                            self.send(self.set_command(f006_0000))
+                            self.send_command(f006_0000, 60)   # 工事帯進入・離脱検出
 
 
             # １秒ごとに送信するロジック
@@ -694,35 +1057,33 @@ class SumoSim:
                 t_delta = t_now - t_old
                 if t_delta >= 1:
                     if self.settings["FLAG_VEHICLE_DETECTION_FRONT_SENSOR"] == "TRUE":
-                        self.sumo_log.info("-----------------------------工事帯センサ前車両検出-----------------------------")
+                        self.sumo_log.debug("-----------------------------工事帯センサ前車両検出-----------------------------")
                         
-                        self.sumo_log.info("-----------------------------ストレート側-----------------------------")
+                        self.sumo_log.debug("-----------------------------ストレート側-----------------------------")
                         
                         # 滞留なしかどうか判定
                         if self.straight_lane_info_use_flg == "0":
                             # 滞留なしの場合各イベントの通知をしない
-                            self.sumo_log.info("滞留なし車線のため、各イベントの通知なし")
+                            self.sumo_log.debug("滞留なし車線のため、各イベントの通知なし")
                         
                         else:
                             f006_0100 = self.vehicle_detection_front_sensor(self.main_node_id)
                             # print(f006_0100)   # 工事帯センサ前車両検出
                             if not self.is_disable_sensor(1, 61, t_now_ms):
-                                self.sumo_log.info(f006_0100)   # 工事帯センサ前車両検出
-                                self.send(self.set_command(f006_0100))
+                                self.send_command(f006_0100, 61)   # 工事帯センサ前車両検出
 
-                        self.sumo_log.info("-----------------------------規制側-----------------------------")
+                        self.sumo_log.debug("-----------------------------規制側-----------------------------")
                         
                         # 滞留なしかどうか判定
                         if self.regulation_lane_info_use_flg == "1":
                             # 滞留なしの場合各イベントの通知をしない
-                            self.sumo_log.info("滞留なし車線のため、各イベントの通知なし")
+                            self.sumo_log.debug("滞留なし車線のため、各イベントの通知なし")
                         
                         else:
                             f006_0100 = self.vehicle_detection_front_sensor(self.sub_node_id)
                             # print(f006_0100)   # 工事帯センサ前車両検出
                             if not self.is_disable_sensor(2, 61, t_now_ms):
-                                self.sumo_log.info(f006_0100)   # 工事帯センサ前車両検出
-                                self.send(self.set_command(f006_0100))
+                                self.send_command(f006_0100, 61)   # 工事帯センサ前車両検出
                     t_old = t_now
 
             # １分ごとに送信するロジック
@@ -738,9 +1099,9 @@ class SumoSim:
                         if True:
                             f008_0000 = self.license_plate_recognition_branch(node_id)
                             if not self.is_disable_sensor(3 + branch_idx, 17, t_now_ms):
-                                print(f008_0000)
-                                self.sumo_log.info(f008_0000)
-                                self.send(self.set_command(f008_0000))
+                                if self.console_log.isEnabledFor(logging.DEBUG):
+                                    self.console_log.debug(str(f008_0000))
+                                self.send_command(f008_0000, 80)
                         branch_idx += 1
 
                     t_old_branch = t_now
@@ -761,18 +1122,37 @@ class SumoSim:
             # print("----------衝突検知----------")
             self.collision_judge()
 
+            # まとめて送信する場合、ステップ内(または指定時間内)のコマンドを送信
+            self.flush_send_batch()
+            # 履歴の書き込み(行数か経過時間を超えた場合)
+            self.history_writer.flush_if_needed()
+            if self.event_journal is not None:
+                self.event_journal.flush_if_needed()
+            # 指定した比率になるまで待つ(遅れている場合は待たずに次のステップへ)
+            if self.pacing is not None:
+                self.pacing.pace(self.current_sim_time_ms)
+
             step += 1
             count +=1
 
+            # チェックポイント保存(指定したシミュレーション時間に達した場合)
+            if self.save_checkpoint_directory and not checkpoint_saved and self.checkpoint_time is not None and t_now >= self.checkpoint_time:
+                self.save_checkpoint(step, count, straight_old_tlsState, regulation_old_tlsState, t_old, t_old_branch)
+                checkpoint_saved = True
+
+        # 保存時刻を指定しない場合は終了時に保存
+        if self.save_checkpoint_directory and not checkpoint_saved:
+            self.save_checkpoint(step, count, straight_old_tlsState, regulation_old_tlsState, t_old, t_old_branch)
+
         self.sumo_log.info("---straightNumber: " + str(self.straight_vehicle_number))
         self.sumo_log.info("---regulationNumber: " + str(self.regulation_vehicle_number))
-        print("---straightNumber: " + str(self.straight_vehicle_number))
-        print("---regulationNumber: " + str(self.regulation_vehicle_number))
+        self.console_log.info("---straightNumber: %s", self.straight_vehicle_number)
+        self.console_log.info("---regulationNumber: %s", self.regulation_vehicle_number)
         self.sim_start_end_time()
         return
 
     def is_disable_sensor(self, node_no, sensor_id, now_time):
-        return self.use_disable_sensor_file and len(self.df_disable_sensor.query(f"NodeNo=={node_no} and (SensorID == 0 or SensorID == {sensor_id}) and Begin <= {now_time} and End >= {now_time}")) > 0
+        return self.use_disable_sensor_file and self.disable_sensor_index.contains(node_no, sensor_id, now_time)
 
     def get_options(self):
         optParser = optparse.OptionParser()
@@ -782,12 +1162,10 @@ class SumoSim:
         return options
 
     def get_time(self):
-        now = datetime.datetime.now()
-        timeStamp = (int(time.mktime(now.timetuple()) * 1000)) + int(now.microsecond / 1000)
-        return timeStamp
+        return self.clock.now_ms()
 
     def get_sim_time(self):
-        sim_time = traci.simulation.getCurrentTime()
+        sim_time = self.current_sim_time_ms
         sim_time = str(sim_time).zfill(9)
         return sim_time
         
@@ -814,20 +1192,26 @@ class SumoSim:
 
     # 
     def collision_judge_calc(self, s_vehicle_id, r_vehicle_id):
-        sPosition = traci.vehicle.getPosition(s_vehicle_id)
-        rPosition = traci.vehicle.getPosition(r_vehicle_id)
+        sPosition = self.get_vehicle_position(s_vehicle_id)
+        rPosition = self.get_vehicle_position(r_vehicle_id)
         s = np.array(list(sPosition))
         r = np.array(list(rPosition))
         distance = np.linalg.norm(s-r)
         if abs(distance) < 2.0:
-            print("衝突を検知しました")
+            self.console_log.warning("衝突を検知しました")
             self.sumo_log.info("-----衝突を検知しました-----")
-            traci.gui.setStaticInfo("collisionTime", "")
+            self.set_gui_static_info("collisionTime", "")
             self.collision_history_output(s_vehicle_id, r_vehicle_id)
             return True
 
         return False
     
+    # GUIへの情報表示(libsumo使用時はGUIがないため何もしない)
+    def set_gui_static_info(self, key, value):
+        if USE_LIBSUMO:
+            return
+        traci.gui.setStaticInfo(key, value)
+
     # 誘導隊員との連携現場の処理
     def auto_traffic_state_judge(self):
         if self.person_guide_lane == "":
@@ -848,8 +1232,7 @@ class SumoSim:
                 # 業務プロセスの制御車線の誘導指示を取得
                 traffic_guide_state = value["system_state"]
 
-        print(traffic_guide_state)
-        print(person_guide_state)
+        self.console_log.debug("%s %s", traffic_guide_state, person_guide_state)
 
         # 制御車線の誘導指示によって処理を変える
         # 業務プロセス制御車線が「すすめ」 かつ 誘導隊員制御車線が「すすめ」 の場合
@@ -873,23 +1256,8 @@ class SumoSim:
         programId = traci.trafficlight.getProgram(tlsID)
         timeStamp = self.get_time()
         state = traci.trafficlight.getPhaseName(tlsID)
-        greenTime = 0
-        yellowTime = 0
-        redTime = 0
-        for logic in traci.trafficlight.getAllProgramLogics(tlsID):
-            # print(logic)
-            # print(programId)
-            if logic.programID != programId:
-                continue
-
-            for phase in logic.phases:
-                if phase.name == "Green":
-                    greenTime += phase.duration
-                elif phase.name == "Yellow":
-                    yellowTime += phase.duration
-                if phase.name == "Red":
-                    redTime += phase.duration
-            break
+        # プログラムごとのフェーズ時間はキャッシュから取得
+        greenTime, yellowTime, redTime = self.network_cache.get_tls_phase_time(tlsID, programId)
         if state == "Red":
             color = 2
         elif state == "Yellow":
@@ -925,23 +1293,8 @@ class SumoSim:
         programId = traci.trafficlight.getProgram(tlsID)
         timeStamp = self.get_time()
         state = traci.trafficlight.getPhaseName(tlsID)
-        greenTime = 0
-        yellowTime = 0
-        redTime = 0
-        for logic in traci.trafficlight.getAllProgramLogics(tlsID):
-            # print(logic)
-            # print(programId)
-            if logic.programID != programId:
-                continue
-
-            for phase in logic.phases:
-                if phase.name == "Green":
-                    greenTime += phase.duration
-                elif phase.name == "Yellow":
-                    yellowTime += phase.duration
-                if phase.name == "Red":
-                    redTime += phase.duration
-            break
+        # プログラムごとのフェーズ時間はキャッシュから取得
+        greenTime, yellowTime, redTime = self.network_cache.get_tls_phase_time(tlsID, programId)
         if state == "Red":
             color = 2
         elif state == "Yellow":
@@ -1004,7 +1357,7 @@ class SumoSim:
                     vehicle_count += 1
                     if leading_vehicle_position == None:
                         leading_vehicle_position = vehicle_position
-                    last_vehicle_position = vehicle_position + traci.vehicle.getLength(vehicle)
+                    last_vehicle_position = vehicle_position + self.get_vehicle_length(vehicle)
                     stopTime = self.get_vehicle_stop_time(vehicle)
                     vehicleTime.append(str(stopTime))
             
@@ -1073,7 +1426,7 @@ class SumoSim:
                 vehicle_count += 1
                 if leading_vehicle_position == None:
                     leading_vehicle_position = vehicle_position
-                last_vehicle_position = vehicle_position + traci.vehicle.getLength(vehicle)
+                last_vehicle_position = vehicle_position + self.get_vehicle_length(vehicle)
                 stopTime = self.get_vehicle_stop_time(vehicle)
                 vehicleTime.append(str(stopTime))
                 #print(stopTime)
@@ -1123,7 +1476,7 @@ class SumoSim:
         # 10/27 和泉修正(駐車車両処理)
         vehicleIDs = self.get_vehicle_ids_on_detector(approach_detector_id)
         # 10/27 和泉修正(駐車車両処理)
-        laneareaLength = traci.lanearea.getLength(approach_detector_id)
+        laneareaLength = self.network_cache.get_detector_length(approach_detector_id)
         for id in vehicleIDs:
             vehicleState = 0
             value = {}
@@ -1157,7 +1510,7 @@ class SumoSim:
         # 10/27 和泉修正(駐車車両処理)
         vehicleIDs = self.get_vehicle_ids_on_detector(secession_detector_id)
         # 10/27 和泉修正(駐車車両処理)
-        laneareaLength = traci.lanearea.getLength(secession_detector_id)
+        laneareaLength = self.network_cache.get_detector_length(secession_detector_id)
         for id in reversed(vehicleIDs):
             vehicleState = 1
             value = {}
@@ -1224,14 +1577,14 @@ class SumoSim:
             detection_range = 0
             detection_range_min = 0
 
-        self.sumo_log.info("-----検出範囲-----")
-        self.sumo_log.info(detection_range_min)
-        self.sumo_log.info(detection_range_max)
+        self.sumo_log.debug("-----検出範囲-----")
+        self.sumo_log.debug(detection_range_min)
+        self.sumo_log.debug(detection_range_max)
         detection_range_min = detection_range_min + detection_range
         detection_range_max = detection_range_max + detection_range
-        self.sumo_log.info(detection_range_min)
-        self.sumo_log.info(detection_range_max)
-        self.sumo_log.info("-----検出範囲-----")
+        self.sumo_log.debug(detection_range_min)
+        self.sumo_log.debug(detection_range_max)
+        self.sumo_log.debug("-----検出範囲-----")
 
         # 信号ありの車線の場合、信号までの距離を範囲とする
         if nodeID == self.main_node_id and self.straight_detection_range != None:
@@ -1247,12 +1600,12 @@ class SumoSim:
         # 10/27 和泉修正(駐車車両処理)
         vehicleIDs = self.get_vehicle_ids_on_detector(approach_detector_id)
         # 10/27 和泉修正(駐車車両処理)
-        laneareaLength = traci.lanearea.getLength(approach_detector_id)
+        laneareaLength = self.network_cache.get_detector_length(approach_detector_id)
         sort_vehicle_ids = self.sort_vehicle_id(True, approach_detector_id, vehicleIDs)
         i = 0
         for id in sort_vehicle_ids:
             # 停止車両の場合次の車両へ(時速5km以下の場合停止車両とする)
-            speed = (traci.vehicle.getSpeed(id) * 3600 / 1000)
+            speed = (self.get_vehicle_speed(id) * 3600 / 1000)
             speed = math.floor(speed * 10 ** 1) / (10 ** 1)
             if speed <= 5:
                 continue
@@ -1281,8 +1634,8 @@ class SumoSim:
             approach_flag = "1"
             distance = math.floor(vehicle_position * 10 ** 1) / (10 ** 1)
             approach_speed = speed
-            self.sumo_log.info("vehiclePosition: " + str(vehicle_position))
-            self.sumo_log.info("vehicleSpeed: " + str(speed))
+            self.sumo_log.debug("vehiclePosition: %s", vehicle_position)
+            self.sumo_log.debug("vehicleSpeed: %s", speed)
             break
             #print(valuelist)
             
@@ -1295,12 +1648,12 @@ class SumoSim:
             vehicleIDs = self.get_vehicle_ids_on_detector(detector_id)
             # 10/27 和泉修正(駐車車両処理)
             secession_vehicle_ids += vehicleIDs
-            # laneareaLength = traci.lanearea.getLength(detector_id)
+            # laneareaLength = self.network_cache.get_detector_length(detector_id)
 
         sort_vehicle_ids = self.sort_vehicle_id(False, detector_id, secession_vehicle_ids)
         for id in sort_vehicle_ids:
             # 停止車両の場合次の車両へ
-            speed = (traci.vehicle.getSpeed(id) * 3600 / 1000)
+            speed = (self.get_vehicle_speed(id) * 3600 / 1000)
             speed = math.floor(speed * 10 ** 1) / (10 ** 1)
             if speed <= 5:
                 continue
@@ -1330,8 +1683,8 @@ class SumoSim:
                 continue
 
             breakaway_flag = "1"
-            self.sumo_log.info("vehiclePosition: " + str(vehicle_position))
-            self.sumo_log.info("vehicleSpeed: " + str(speed))
+            self.sumo_log.debug("vehiclePosition: %s", vehicle_position)
+            self.sumo_log.debug("vehicleSpeed: %s", speed)
             break
 
         # 検出された車両すべてが誤検出の場合
@@ -1348,7 +1701,8 @@ class SumoSim:
         
         command['Value'] = value
 
-        print(command)
+        if self.console_log.isEnabledFor(logging.DEBUG):
+            self.console_log.debug(str(command))
         return command
 
     # ナンバープレート認識
@@ -1383,14 +1737,14 @@ class SumoSim:
             detection_range = 0
             detection_range_min = 0
 
-        self.sumo_log.info("-----検出範囲-----")
-        self.sumo_log.info(detection_range_min)
-        self.sumo_log.info(detection_range_max)
+        self.sumo_log.debug("-----検出範囲-----")
+        self.sumo_log.debug(detection_range_min)
+        self.sumo_log.debug(detection_range_max)
         detection_range_min = detection_range_min + detection_range
         detection_range_max = detection_range_max + detection_range
-        self.sumo_log.info(detection_range_min)
-        self.sumo_log.info(detection_range_max)
-        self.sumo_log.info("-----検出範囲-----")
+        self.sumo_log.debug(detection_range_min)
+        self.sumo_log.debug(detection_range_max)
+        self.sumo_log.debug("-----検出範囲-----")
 
         command['CommandID'] = "0xF0010700"
         command['EventID'] = "_".join([nodeID, str(timeStamp)])
@@ -1400,7 +1754,7 @@ class SumoSim:
         # 10/27 和泉修正(駐車車両処理)
         vehicleIDs = self.get_vehicle_ids_on_detector(approach_detector_id)
         # 10/27 和泉修正(駐車車両処理)
-        laneareaLength = traci.lanearea.getLength(approach_detector_id)
+        laneareaLength = self.network_cache.get_detector_length(approach_detector_id)
         pos_score = "100"
         number_score = "100"
         sort_vehicle_ids = self.sort_vehicle_id(True, approach_detector_id, vehicleIDs)
@@ -1438,7 +1792,7 @@ class SumoSim:
             if self.straight_island_flg or nodeID == self.sub_node_id:
                 if vehicle_position <= 10:
                     vehicleState = 1
-                    self.sumo_log.info(nodeID + ": 進入車線にて工事帯から10m以内のため反対車線で検出")
+                    self.sumo_log.debug("%s: 進入車線にて工事帯から10m以内のため反対車線で検出", nodeID)
 
             # バウンディングボックス処理
             vehicleBoundingBox = self.bounding_box(True, laneareaLength, vehicle_position)[1]
@@ -1479,7 +1833,7 @@ class SumoSim:
             vehicleIDs = self.get_vehicle_ids_on_detector(detector_id)
             # 10/27 和泉修正(駐車車両処理)
             secession_vehicle_ids += vehicleIDs
-            # laneareaLength = traci.lanearea.getLength(detector_id)
+            # laneareaLength = self.network_cache.get_detector_length(detector_id)
 
         pos_score = "100"
         number_score = "100"
@@ -1520,7 +1874,7 @@ class SumoSim:
             if not self.straight_island_flg and nodeID == self.main_node_id:
                 if vehicle_position <= 10:
                     vehicleState = 0
-                    self.sumo_log.info(nodeID + ": 離脱車線にて工事帯から10m以内のため反対車線で検出")
+                    self.sumo_log.debug("%s: 離脱車線にて工事帯から10m以内のため反対車線で検出", nodeID)
 
             # バウンディングボックス処理
             vehicleBoundingBox = self.bounding_box(False, laneareaLength, vehicle_position)[1]
@@ -1613,14 +1967,14 @@ class SumoSim:
             detection_range = 0
             detection_range_min = 0
 
-        self.sumo_log.info("-----検出範囲-----")
-        self.sumo_log.info(detection_range_min)
-        self.sumo_log.info(detection_range_max)
+        self.sumo_log.debug("-----検出範囲-----")
+        self.sumo_log.debug(detection_range_min)
+        self.sumo_log.debug(detection_range_max)
         detection_range_min = detection_range_min + detection_range
         detection_range_max = detection_range_max + detection_range
-        self.sumo_log.info(detection_range_min)
-        self.sumo_log.info(detection_range_max)
-        self.sumo_log.info("-----検出範囲-----")
+        self.sumo_log.debug(detection_range_min)
+        self.sumo_log.debug(detection_range_max)
+        self.sumo_log.debug("-----検出範囲-----")
 
         command['CommandID'] = "0xF0080000"
         command['EventID'] = "_".join([nodeID, str(timeStamp)])
@@ -1630,7 +1984,7 @@ class SumoSim:
         # 10/27 和泉修正(駐車車両処理)
         vehicleIDs = self.get_vehicle_ids_on_detector(approach_detector_id)
         # 10/27 和泉修正(駐車車両処理)
-        laneareaLength = traci.lanearea.getLength(approach_detector_id)
+        laneareaLength = self.network_cache.get_detector_length(approach_detector_id)
         pos_score = "100"
         number_score = "100"
         sort_vehicle_ids = self.sort_vehicle_id(True, approach_detector_id, vehicleIDs)
@@ -1668,7 +2022,7 @@ class SumoSim:
             if self.straight_island_flg or nodeID == self.sub_node_id:
                 if vehicle_position <= 10:
                     vehicleState = 1
-                    self.sumo_log.info(nodeID + ": 進入車線にて工事帯から10m以内のため反対車線で検出")
+                    self.sumo_log.debug("%s: 進入車線にて工事帯から10m以内のため反対車線で検出", nodeID)
 
             # バウンディングボックス処理
             vehicleBoundingBox = self.bounding_box(True, laneareaLength, vehicle_position)[1]
@@ -1709,7 +2063,7 @@ class SumoSim:
             vehicleIDs = self.get_vehicle_ids_on_detector(detector_id)
             # 10/27 和泉修正(駐車車両処理)
             secession_vehicle_ids += vehicleIDs
-            # laneareaLength = traci.lanearea.getLength(detector_id)
+            # laneareaLength = self.network_cache.get_detector_length(detector_id)
 
         pos_score = "100"
         number_score = "100"
@@ -1750,7 +2104,7 @@ class SumoSim:
             if not self.straight_island_flg and nodeID == self.main_node_id:
                 if vehicle_position <= 10:
                     vehicleState = 0
-                    self.sumo_log.info(nodeID + ": 離脱車線にて工事帯から10m以内のため反対車線で検出")
+                    self.sumo_log.debug("%s: 離脱車線にて工事帯から10m以内のため反対車線で検出", nodeID)
 
             # バウンディングボックス処理
             vehicleBoundingBox = self.bounding_box(False, laneareaLength, vehicle_position)[1]
@@ -1843,7 +2197,7 @@ class SumoSim:
         # 10/27 和泉修正(駐車車両処理)
         vehicleIDs = self.get_vehicle_ids_on_detector(approach_detector_id)
         # 10/27 和泉修正(駐車車両処理)
-        laneareaLength = traci.lanearea.getLength(approach_detector_id)
+        laneareaLength = self.network_cache.get_detector_length(approach_detector_id)
         for id in vehicleIDs:
             vehicleState = 0
             value = {}
@@ -1875,7 +2229,7 @@ class SumoSim:
             if self.straight_island_flg or nodeID == self.sub_node_id:
                 if vehicle_position <= 10:
                     vehicleState = 1
-                    self.sumo_log.info(nodeID + ": 進入車線にて工事帯から10m以内のため反対車線で検出")
+                    self.sumo_log.debug("%s: 進入車線にて工事帯から10m以内のため反対車線で検出", nodeID)
 
             # バウンディングボックス処理
             vehicleBoundingBox = self.bounding_box(True, laneareaLength, vehicle_position)[0]
@@ -1894,7 +2248,7 @@ class SumoSim:
             # 10/27 和泉修正(駐車車両処理)
             vehicleIDs = self.get_vehicle_ids_on_detector(detector_id)
             # 10/27 和泉修正(駐車車両処理)
-            laneareaLength = traci.lanearea.getLength(detector_id)
+            laneareaLength = self.network_cache.get_detector_length(detector_id)
             for id in reversed(vehicleIDs):
                 vehicleState = 1
                 value = {}
@@ -1926,7 +2280,7 @@ class SumoSim:
                 if not self.straight_island_flg and nodeID == self.main_node_id:
                     if vehicle_position <= 10:
                         vehicleState = 0
-                        self.sumo_log.info(nodeID + ": 離脱車線にて工事帯から10m以内のため反対車線で検出")
+                        self.sumo_log.debug("%s: 離脱車線にて工事帯から10m以内のため反対車線で検出", nodeID)
 
                 # バウンディングボックス処理
                 vehicleBoundingBox = self.bounding_box(False, laneareaLength, vehicle_position)[0]
@@ -1987,7 +2341,7 @@ class SumoSim:
         # 10/27 和泉修正(駐車車両処理)
         vehicleIDs = self.get_vehicle_ids_on_detector(approach_detector_id)
         # 10/27 和泉修正(駐車車両処理)
-        laneareaLength = traci.lanearea.getLength(approach_detector_id)
+        laneareaLength = self.network_cache.get_detector_length(approach_detector_id)
         for id in vehicleIDs:
             vehicleState = 0
             value = {}
@@ -2019,7 +2373,7 @@ class SumoSim:
             if self.straight_island_flg or nodeID == self.sub_node_id:
                 if vehicle_position <= 10:
                     vehicleState = 1
-                    self.sumo_log.info(nodeID + ": 進入車線にて工事帯から10m以内のため反対車線で検出")
+                    self.sumo_log.debug("%s: 進入車線にて工事帯から10m以内のため反対車線で検出", nodeID)
 
             # バウンディングボックス処理
             vehicleBoundingBox = self.bounding_box(True, laneareaLength, vehicle_position)[0]
@@ -2038,7 +2392,7 @@ class SumoSim:
             # 10/27 和泉修正(駐車車両処理)
             vehicleIDs = self.get_vehicle_ids_on_detector(detector_id)
             # 10/27 和泉修正(駐車車両処理)
-            laneareaLength = traci.lanearea.getLength(detector_id)
+            laneareaLength = self.network_cache.get_detector_length(detector_id)
             for id in reversed(vehicleIDs):
                 vehicleState = 1
                 value = {}
@@ -2070,7 +2424,7 @@ class SumoSim:
                 if not self.straight_island_flg and nodeID == self.main_node_id:
                     if vehicle_position <= 10:
                         vehicleState = 0
-                        self.sumo_log.info(nodeID + ": 離脱車線にて工事帯から10m以内のため反対車線で検出")
+                        self.sumo_log.debug("%s: 離脱車線にて工事帯から10m以内のため反対車線で検出", nodeID)
 
                 # バウンディングボックス処理
                 vehicleBoundingBox = self.bounding_box(False, laneareaLength, vehicle_position)[0]
@@ -2123,7 +2477,7 @@ class SumoSim:
         # 10/27 和泉修正(駐車車両処理)
         for id in vehicleIDs:
             # 検出率計算し、誤検出の場合次の車両へ
-            speed = (traci.vehicle.getSpeed(id) * 3600 / 1000)
+            speed = (self.get_vehicle_speed(id) * 3600 / 1000)
             speed = math.floor(speed * 10 ** 1) / (10 ** 1)
             if not self.vehicle_info[str(id)]["SpeedDistanceFlag"] or speed == 0.0:
                 continue
@@ -2150,9 +2504,9 @@ class SumoSim:
             # 10/27 和泉修正(駐車車両処理)
             vehicleIDs = self.get_vehicle_ids_on_detector(detector_id)
             # 10/27 和泉修正(駐車車両処理)
-            laneareaLength = traci.lanearea.getLength(detector_id)
+            laneareaLength = self.network_cache.get_detector_length(detector_id)
             for id in reversed(vehicleIDs):
-                speed = (traci.vehicle.getSpeed(id) * 3600 / 1000)
+                speed = (self.get_vehicle_speed(id) * 3600 / 1000)
                 speed = math.floor(speed * 10 ** 1) / (10 ** 1)
                 if not self.vehicle_info[str(id)]["SpeedDistanceFlag"] or speed == 0.0:
                     continue
@@ -2210,7 +2564,7 @@ class SumoSim:
             lane_kind = 2
 
         # 接近車両
-        vehicleIDs = traci.inductionloop.getLastStepVehicleIDs(approach_detector_id)
+        vehicleIDs = self.get_induction_loop_vehicle_ids(approach_detector_id)
         for id in vehicleIDs:
             if str(id) not in self.vehicle_info.keys():
                 continue
@@ -2224,7 +2578,7 @@ class SumoSim:
                 # direction = 0
 
         # 離脱車両
-        vehicleIDs = traci.inductionloop.getLastStepVehicleIDs(secession_detector_id)
+        vehicleIDs = self.get_induction_loop_vehicle_ids(secession_detector_id)
         for id in vehicleIDs:
             if str(id) not in self.vehicle_info.keys():
                 continue
@@ -2259,8 +2613,8 @@ class SumoSim:
             approach_detector_id = "regulationIn"
             secession_detector_id = "regulationOut"
 
-        # if traci.inductionloop.getLastStepVehicleNumber(approach_detector_id) > 0 or traci.inductionloop.getLastStepVehicleNumber(secession_detector_id):
-        if traci.inductionloop.getLastStepVehicleNumber(secession_detector_id):
+        # if self.get_induction_loop_vehicle_number(approach_detector_id) > 0 or self.get_induction_loop_vehicle_number(secession_detector_id):
+        if self.get_induction_loop_vehicle_number(secession_detector_id):
             vehicleflag = 1
         else:
             vehicleflag = 0
@@ -2327,6 +2681,33 @@ class SumoSim:
 
         return settings
 
+    # 設定の上書き(KEY=VALUE)
+    #   KEYがlane_settings./public_settings./signal_settings.で始まる場合は各設定ファイルの値(.区切りのパス)、それ以外はSet.jsonの値
+    def apply_settings_override(self, overrides):
+        settings_files = {
+            "lane_settings": self.lane_settings,
+            "public_settings": self.public_settings,
+            "signal_settings": self.signal_settings,
+        }
+        for override in overrides:
+            key, sep, value = override.partition("=")
+            if sep == "" or key.strip() == "":
+                print("設定の上書きはKEY=VALUEの形式で指定してください: " + override)
+                sys.exit(1)
+            path = key.strip().split(".")
+            if len(path) > 1 and path[0] in settings_files:
+                target = settings_files[path[0]]
+                path = path[1:]
+            else:
+                target = self.settings
+                path = [key.strip()]
+            for name in path[:-1]:
+                if not isinstance(target.get(name), dict):
+                    print("上書きする設定がありません: " + key)
+                    sys.exit(1)
+                target = target[name]
+            target[path[-1]] = value
+
     # デフォルト設定
     def set_settings_default(self):
         if "APPROACH_BREAKAWAY_DETECTION_DISTANCE_MIN" not in self.settings:
@@ -2337,6 +2718,60 @@ class SumoSim:
             self.settings["APPROACH_BREAKAWAY_DETECTION_RATE"] = "100"
         if "FLAG_APPROACH_BREAKAWAY_DETECTION" not in self.settings:
             self.settings["FLAG_APPROACH_BREAKAWAY_DETECTION"] = "TRUE"
+        if "HTTP_SERVER_POOL_NUMBER" not in self.settings or self.settings["HTTP_SERVER_POOL_NUMBER"] == "":
+            self.settings["HTTP_SERVER_POOL_NUMBER"] = "1"
+        if "HTTP_CONNECTION_POOL_SIZE" not in self.settings or self.settings["HTTP_CONNECTION_POOL_SIZE"] == "":
+            self.settings["HTTP_CONNECTION_POOL_SIZE"] = self.settings["HTTP_SERVER_POOL_NUMBER"]
+        if "HTTP_CONNECTION_IDLE_TIMEOUT" not in self.settings:
+            self.settings["HTTP_CONNECTION_IDLE_TIMEOUT"] = "30"
+        if "HTTP_SEND_QUEUE_SIZE" not in self.settings:
+            self.settings["HTTP_SEND_QUEUE_SIZE"] = "1000"
+        if "HTTP_SEND_OVERFLOW_POLICY" not in self.settings:
+            self.settings["HTTP_SEND_OVERFLOW_POLICY"] = "block"
+        if "HTTP_SEND_SPILL_FILE" not in self.settings:
+            self.settings["HTTP_SEND_SPILL_FILE"] = ""
+        if "FLAG_SEND_BATCH" not in self.settings:
+            self.settings["FLAG_SEND_BATCH"] = "FALSE"
+        if "SEND_BATCH_FORMAT" not in self.settings or self.settings["SEND_BATCH_FORMAT"] == "":
+            self.settings["SEND_BATCH_FORMAT"] = "json"
+        if "SEND_BATCH_WINDOW" not in self.settings or self.settings["SEND_BATCH_WINDOW"] == "":
+            self.settings["SEND_BATCH_WINDOW"] = "0"
+        if "HTTP_SERVER_BACKEND" not in self.settings or self.settings["HTTP_SERVER_BACKEND"] == "":
+            self.settings["HTTP_SERVER_BACKEND"] = "waitress"
+        if "HTTP_SERVER_THREADS" not in self.settings or self.settings["HTTP_SERVER_THREADS"] == "":
+            self.settings["HTTP_SERVER_THREADS"] = "4"
+        if "HTTP_SERVER_MAX_REQUEST_SIZE" not in self.settings or self.settings["HTTP_SERVER_MAX_REQUEST_SIZE"] == "":
+            self.settings["HTTP_SERVER_MAX_REQUEST_SIZE"] = "1048576"
+        if "HTTP_SERVER_KEEPALIVE_TIMEOUT" not in self.settings or self.settings["HTTP_SERVER_KEEPALIVE_TIMEOUT"] == "":
+            self.settings["HTTP_SERVER_KEEPALIVE_TIMEOUT"] = "120"
+        if "TIME_COMPRESSION" not in self.settings or self.settings["TIME_COMPRESSION"] == "":
+            self.settings["TIME_COMPRESSION"] = "0"
+        if "SIM_CLOCK" not in self.settings:
+            self.settings["SIM_CLOCK"] = ""
+        if "LOG_LEVEL" not in self.settings or self.settings["LOG_LEVEL"] == "":
+            self.settings["LOG_LEVEL"] = "2"
+        if "FLAG_EVENT_JOURNAL" not in self.settings:
+            self.settings["FLAG_EVENT_JOURNAL"] = "FALSE"
+        if "EVENT_JOURNAL_COMPRESSION" not in self.settings or self.settings["EVENT_JOURNAL_COMPRESSION"] == "":
+            self.settings["EVENT_JOURNAL_COMPRESSION"] = "gzip"
+        if "EVENT_JOURNAL_BLOCK_SIZE" not in self.settings or self.settings["EVENT_JOURNAL_BLOCK_SIZE"] == "":
+            self.settings["EVENT_JOURNAL_BLOCK_SIZE"] = "1000"
+        if "EVENT_JOURNAL_FLUSH_INTERVAL" not in self.settings or self.settings["EVENT_JOURNAL_FLUSH_INTERVAL"] == "":
+            self.settings["EVENT_JOURNAL_FLUSH_INTERVAL"] = "5"
+        if "HISTORY_OUTPUT_FORMAT" not in self.settings or self.settings["HISTORY_OUTPUT_FORMAT"] == "":
+            self.settings["HISTORY_OUTPUT_FORMAT"] = "text"
+        if "HISTORY_FLUSH_SIZE" not in self.settings or self.settings["HISTORY_FLUSH_SIZE"] == "":
+            self.settings["HISTORY_FLUSH_SIZE"] = "100"
+        if "HISTORY_FLUSH_INTERVAL" not in self.settings or self.settings["HISTORY_FLUSH_INTERVAL"] == "":
+            self.settings["HISTORY_FLUSH_INTERVAL"] = "1"
+        if "HISTORY_COLUMNAR_FLUSH_INTERVAL" not in self.settings or self.settings["HISTORY_COLUMNAR_FLUSH_INTERVAL"] == "":
+            self.settings["HISTORY_COLUMNAR_FLUSH_INTERVAL"] = "60"
+        if "FLAG_SEND_CHANGE_ONLY" not in self.settings:
+            self.settings["FLAG_SEND_CHANGE_ONLY"] = "FALSE"
+        if "CHANGE_ONLY_COMMAND_LIST" not in self.settings:
+            self.settings["CHANGE_ONLY_COMMAND_LIST"] = ""
+        if "SEND_HEARTBEAT_INTERVAL" not in self.settings or self.settings["SEND_HEARTBEAT_INTERVAL"] == "":
+            self.settings["SEND_HEARTBEAT_INTERVAL"] = "1000"
         # if "" in self.settings:
         #     self.settings[""] = ""
         # if "" in self.settings:
@@ -2443,9 +2878,31 @@ class SumoSim:
 
     # 車両位置計算
     def set_vehicle_position(self, detection, detector_id, vehicle_id, vehicle_target_flag = True):
-        detector_length = traci.lanearea.getLength(detector_id) # 検出器の長さ
-        vehicle_length = traci.vehicle.getLength(vehicle_id) # 車両の長さ
-        dist_to_detector_end = traci.lanearea.getVehicleDistToDetectorEnd(detector_id, vehicle_id) # 検出器上の車両の位置
+        state = self.detector_snapshot.get(detector_id)
+        # スナップショットにない場合はTraCIに問い合わせて計算
+        if state is None or vehicle_id not in state.dist_to_end:
+            return self.calc_vehicle_position(detection, detector_id, vehicle_id, vehicle_target_flag)
+
+        # 対象車両が車両全体を含む場合、スナップショット作成時に計算済み
+        if vehicle_target_flag:
+            return state.position[bool(detection)].get(vehicle_id)
+
+        dist_to_detector_end = state.dist_to_end[vehicle_id]
+        if detection:
+            vehicle_position = dist_to_detector_end
+        else:
+            vehicle_position = state.detector_length - dist_to_detector_end
+
+        if vehicle_position > state.detector_length or vehicle_position < 0:
+            return None
+
+        return vehicle_position
+
+    # 車両位置計算(TraCI問い合わせ)
+    def calc_vehicle_position(self, detection, detector_id, vehicle_id, vehicle_target_flag = True):
+        detector_length = self.network_cache.get_detector_length(detector_id) # 検出器の長さ
+        vehicle_length = self.get_vehicle_length(vehicle_id) # 車両の長さ
+        dist_to_detector_end = self.get_dist_to_detector_end(detector_id, vehicle_id) # 検出器上の車両の位置
         # 10/27 和泉修正(駐車車両処理)
         # 駐車車両ありシナリオの場合
         if self.flag_parking_vehicle == True:
@@ -2457,7 +2914,10 @@ class SumoSim:
 
         # 対象車両が車両全体を含むかどうか
         if vehicle_target_flag:
-            vehicle_magnification = detector_length / (detector_length - vehicle_length)
+            vehicle_magnification = get_vehicle_magnification(detector_length, vehicle_length)
+            # 車両が検出器より長い場合、車両全体が検出器に入ることはない
+            if vehicle_magnification is None:
+                return None
         else:
             vehicle_magnification = 1
 
@@ -2477,6 +2937,11 @@ class SumoSim:
     def sort_vehicle_id(self, detection, detector_id, vehicle_ids):
         results = []
         result = []
+        # 検出器上の全車両の場合、スナップショットのソート済み結果を返す
+        state = self.detector_snapshot.get(detector_id)
+        if state is not None and (vehicle_ids is state.vehicle_ids or tuple(vehicle_ids) == state.vehicle_ids):
+            return list(state.sorted_ids[bool(detection)])
+
         for vehicle_id in vehicle_ids:
             vehilce_position = self.set_vehicle_position(detection, detector_id, vehicle_id)
             if vehilce_position == None:
@@ -2500,27 +2965,27 @@ class SumoSim:
     # 接続レーン取得
     def get_next_lane(self, lane_id):
         # next_lane_data = []
-        lane_links = traci.lane.getLinks(lane_id)
+        lane_links = self.network_cache.get_lane_links(lane_id)
         for lane in lane_links[0]:
             # lane_data = []
-            # if lane not in traci.lane.getIDList() or lane in next_lane_data[0]:
-            if lane not in traci.lane.getIDList():
+            # if lane not in self.network_cache.lane_ids or lane in next_lane_data[0]:
+            if lane not in self.network_cache.lane_ids:
                 continue
             # print(lane)
             # print(traci.lane.getLength(lane))
-            # print(traci.lane.getEdgeID(lane))
-            # print(traci.lane.getLinks(lane))
+            # print(self.network_cache.get_lane_edge_id(lane))
+            # print(self.network_cache.get_lane_links(lane))
         # return next_lane_data
 
     def get_lane_list(self, lane_id):
         next_lane_id = lane_id
         lane_list = []
         while next_lane_id != "":
-            lane_links = traci.lane.getLinks(next_lane_id)
+            lane_links = self.network_cache.get_lane_links(next_lane_id)
             if lane_links == []:
                 break
             for lane in lane_links[0]:
-                if lane not in traci.lane.getIDList():
+                if lane not in self.network_cache.lane_ids:
                     continue
                 next_lane_id = lane
 
@@ -2534,15 +2999,15 @@ class SumoSim:
         if tls_id == "":
             return True
 
-        detection_lane_ids = list(traci.lanearea.getLaneIDs(detector_id)) # 検出範囲内すべてのレーンID
+        detection_lane_ids = list(self.network_cache.get_detector_lane_ids(detector_id)) # 検出範囲内すべてのレーンID
         if detection:
             detection_lane_ids.reverse()
         # print(detection_lane_ids)
         # print(vehicle_id)
-        vehicle_lane_id = traci.vehicle.getLaneID(vehicle_id)
+        vehicle_lane_id = self.get_vehicle_lane_id(vehicle_id)
 
         for lane in detection_lane_ids:
-            edge_id = traci.lane.getEdgeID(lane)
+            edge_id = self.network_cache.get_lane_edge_id(lane)
             # print(edge_id, tls_id)
             if tls_id in edge_id:
                 return False
@@ -2593,7 +3058,7 @@ class SumoSim:
                 
     # 車両情報割り当て
     def set_vehicle_info(self):
-        vehicleIDs = traci.vehicle.getIDList()
+        vehicleIDs = self.all_vehicle_ids
         for id in vehicleIDs:
             # test_number = traci.vehicle.getPersonIDList(id)
             # print("number:" + str(test_number))
@@ -2625,8 +3090,8 @@ class SumoSim:
             # 駐車車両ありシナリオの場合
             if self.flag_parking_vehicle == True:
                 # 車両がいずれかのレーンにいる場合レーンIDを格納、駐車車両ではないと判断
-                if not traci.vehicle.isStoppedParking(id):
-                    self.vehicle_info[str(id)]["LastLaneID"] =  traci.vehicle.getLaneID(id)
+                if not self.is_vehicle_stopped_parking(id):
+                    self.vehicle_info[str(id)]["LastLaneID"] =  self.get_vehicle_lane_id(id)
                     self.vehicle_info[str(id)]["FlagParking"] = "False"
                     self.vehicle_info[str(id)]["StopTime"] = 0
                 # 車両がどのレーンにもいない場合、駐車車両と判断
@@ -2634,16 +3099,138 @@ class SumoSim:
                     self.vehicle_info[str(id)]["FlagParking"] = "True"
                     self.vehicle_info[str(id)]["StopTime"] = self.vehicle_info[str(id)]["StopTime"] + 0.2
 
-            
-    # 検出器上の車両取得
+
+    # サブスクリプション設定(TraCI開始直後に1回だけ実行)
+    def set_subscription(self):
+        for detector_id in traci.lanearea.getIDList():
+            traci.lanearea.subscribe(detector_id, self.DETECTOR_SUBSCRIPTION_VARS)
+        for loop_id in traci.inductionloop.getIDList():
+            traci.inductionloop.subscribe(loop_id, self.DETECTOR_SUBSCRIPTION_VARS)
+        traci.simulation.subscribe(self.SIMULATION_SUBSCRIPTION_VARS)
+        # 開始時点ですでに存在する車両
+        for vehicle_id in traci.vehicle.getIDList():
+            traci.vehicle.subscribe(vehicle_id, self.VEHICLE_SUBSCRIPTION_VARS)
+        self.update_subscription_results()
+
+    # サブスクリプション更新(simulationStep直後に1回だけ実行)
+    def update_subscription(self):
+        # 新たに出発した車両をサブスクライブ(車両ごとに1回のみ)
+        simulation_state = traci.simulation.getSubscriptionResults()
+        for vehicle_id in simulation_state.get(tc.VAR_DEPARTED_VEHICLES_IDS, ()):
+            traci.vehicle.subscribe(vehicle_id, self.VEHICLE_SUBSCRIPTION_VARS)
+        self.update_subscription_results()
+
+    # サブスクリプション結果の一括取得
+    def update_subscription_results(self):
+        simulation_state = traci.simulation.getSubscriptionResults()
+        # TraCIの結果は次のステップでクリアされるため、コピーを保持する
+        vehicle_state = dict(traci.vehicle.getAllSubscriptionResults())
+        self.detector_state = dict(traci.lanearea.getAllSubscriptionResults())
+        self.induction_loop_state = dict(traci.inductionloop.getAllSubscriptionResults())
+        self.vehicle_state = vehicle_state
+        self.all_vehicle_ids = vehicle_state.keys()
+        self.current_sim_time = simulation_state[tc.VAR_TIME]
+        self.current_sim_time_ms = simulation_state[tc.VAR_TIME_STEP]
+
+    # 車両状態取得(サブスクリプション結果がない場合はTraCIに問い合わせる)
+    def get_vehicle_value(self, vehicle_id, var_id, getter):
+        state = self.vehicle_state.get(vehicle_id)
+        if state is not None and var_id in state:
+            return state[var_id]
+        return getter(vehicle_id)
+
+    def get_vehicle_speed(self, vehicle_id):
+        return self.get_vehicle_value(vehicle_id, tc.VAR_SPEED, traci.vehicle.getSpeed)
+
+    def get_vehicle_length(self, vehicle_id):
+        return self.get_vehicle_value(vehicle_id, tc.VAR_LENGTH, traci.vehicle.getLength)
+
+    def get_vehicle_position(self, vehicle_id):
+        return self.get_vehicle_value(vehicle_id, tc.VAR_POSITION, traci.vehicle.getPosition)
+
+    def get_vehicle_waiting_time(self, vehicle_id):
+        return self.get_vehicle_value(vehicle_id, tc.VAR_WAITING_TIME, traci.vehicle.getWaitingTime)
+
+    def get_vehicle_lane_id(self, vehicle_id):
+        return self.get_vehicle_value(vehicle_id, tc.VAR_LANE_ID, traci.vehicle.getLaneID)
+
+    def get_vehicle_lane_position(self, vehicle_id):
+        return self.get_vehicle_value(vehicle_id, tc.VAR_LANEPOSITION, traci.vehicle.getLanePosition)
+
+    # 検出器終端までの距離(車両のレーン上の位置とキャッシュした検出器終端の位置から計算)
+    #   検出器のレーン上にいない場合(交差点内など)はTraCIに問い合わせる
+    def get_dist_to_detector_end(self, detector_id, vehicle_id):
+        offset = self.network_cache.get_detector_end_offset(detector_id).get(self.get_vehicle_lane_id(vehicle_id))
+        if offset is None:
+            return traci.lanearea.getVehicleDistToDetectorEnd(detector_id, vehicle_id)
+        return offset - self.get_vehicle_lane_position(vehicle_id)
+
+    def is_vehicle_stopped_parking(self, vehicle_id):
+        stop_state = self.get_vehicle_value(vehicle_id, tc.VAR_STOPSTATE, traci.vehicle.getStopState)
+        return (stop_state & 2) == 2
+
+    # 検出器状態取得(サブスクリプション結果がない場合はTraCIに問い合わせる)
+    def get_detector_vehicle_ids(self, detector_id):
+        state = self.detector_state.get(detector_id)
+        if state is None:
+            return traci.lanearea.getLastStepVehicleIDs(detector_id)
+        return state[tc.LAST_STEP_VEHICLE_ID_LIST]
+
+    def get_detector_vehicle_number(self, detector_id):
+        state = self.detector_state.get(detector_id)
+        if state is None:
+            return traci.lanearea.getLastStepVehicleNumber(detector_id)
+        return state[tc.LAST_STEP_VEHICLE_NUMBER]
+
+    def get_induction_loop_vehicle_ids(self, loop_id):
+        state = self.induction_loop_state.get(loop_id)
+        if state is None:
+            return traci.inductionloop.getLastStepVehicleIDs(loop_id)
+        return state[tc.LAST_STEP_VEHICLE_ID_LIST]
+
+    def get_induction_loop_vehicle_number(self, loop_id):
+        state = self.induction_loop_state.get(loop_id)
+        if state is None:
+            return traci.inductionloop.getLastStepVehicleNumber(loop_id)
+        return state[tc.LAST_STEP_VEHICLE_NUMBER]
+
+    # 検出器スナップショット作成(simulationStep直後に1回だけ実行)
+    def build_detector_snapshot(self):
+        detectors = []
+        for detector_id in self.detector_state:
+            detector_length = self.network_cache.get_detector_length(detector_id)
+            vehicles = []
+            for vehicle_id in self.collect_vehicle_ids_on_detector(detector_id):
+                # 10/27 和泉修正(駐車車両処理)
+                # 駐車車両の場合、駐車前最後の検出器上の車両位置をセット
+                if self.flag_parking_vehicle == True and self.vehicle_info[str(vehicle_id)]["FlagParking"] == "True":
+                    dist_to_detector_end = self.vehicle_info[str(vehicle_id)]["DistToDetectorEnd"]
+                else:
+                    dist_to_detector_end = self.get_dist_to_detector_end(detector_id, vehicle_id)
+                if self.flag_parking_vehicle == True:
+                    self.vehicle_info[str(vehicle_id)]["DistToDetectorEnd"] = dist_to_detector_end
+                # 10/27 和泉修正(駐車車両処理)
+                vehicles.append((vehicle_id, dist_to_detector_end, self.get_vehicle_speed(vehicle_id), self.get_vehicle_length(vehicle_id)))
+            detectors.append((detector_id, detector_length, vehicles))
+
+        return DetectorSnapshot.build(self.current_sim_time_ms, detectors)
+
+    # 検出器上の車両取得(スナップショットから参照)
     def get_vehicle_ids_on_detector(self, detector_id):
+        vehicle_ids = self.detector_snapshot.get_vehicle_ids(detector_id)
+        if vehicle_ids is not None:
+            return vehicle_ids
+        return self.collect_vehicle_ids_on_detector(detector_id)
+
+    # 検出器上の車両取得(TraCI問い合わせ)
+    def collect_vehicle_ids_on_detector(self, detector_id):
         # 駐車車両なしシナリオの場合、SUMO標準の検出器上の車両取得結果を返す
         if self.flag_parking_vehicle == False:
-            return traci.lanearea.getLastStepVehicleIDs(detector_id)
+            return self.get_detector_vehicle_ids(detector_id)
 
         vehicle_ids = [] # 検出器上の車両リスト
-        detection_lane_ids = list(traci.lanearea.getLaneIDs(detector_id)) # 検出範囲内すべてのレーンID
-        allVehicleIDs = traci.vehicle.getIDList()
+        detection_lane_ids = list(self.network_cache.get_detector_lane_ids(detector_id)) # 検出範囲内すべてのレーンID
+        allVehicleIDs = self.all_vehicle_ids
 
         for key, value in self.vehicle_info.items():
             if key not in allVehicleIDs:
@@ -2660,10 +3247,10 @@ class SumoSim:
     def get_vehicle_stop_time(self, vehicle_id):
         stop_time = 0
         # 駐車車両の場合、駐車車両用の停止時間をセット
-        if traci.vehicle.isStoppedParking(vehicle_id):
+        if self.is_vehicle_stopped_parking(vehicle_id):
             stop_time = self.vehicle_info[str(vehicle_id)]["StopTime"]
         else:
-            stop_time = traci.vehicle.getWaitingTime(vehicle_id)
+            stop_time = self.get_vehicle_waiting_time(vehicle_id)
         # print(math.floor(stop_time))
 
         return math.floor(stop_time)
@@ -2672,10 +3259,41 @@ class SumoSim:
     def set_image_size(self):
         return str(self.image_size[0]) + "x" + str(self.image_size[1])
 
-    def set_command(self, command_dict):
-        command_str = str(command_dict)
-        command_str = command_str.replace('\'', '"')
-        return command_str.replace(' ', '')
+    #   コマンドの辞書とエンコード済みJSONをまとめて返す(送信・遅延判定・ログ出力で共有)
+    #   node_no, sensor_id: 遅延設定ファイルのノード番号・センサーID
+    def set_command(self, command_dict, node_no=None, sensor_id=None):
+        if command_dict is None:
+            return None
+        return make_command(command_dict, node_no, sensor_id)
+
+    # 検出イベント送信(変化時のみ送信する場合、前回と同じ内容のコマンドはログ出力・送信しない)
+    #   sensor_id: 遅延設定ファイルのセンサーID(ノード番号はEventIDのノードIDから取得)
+    def send_command(self, command_dict, sensor_id=None):
+        if command_dict is None:
+            return
+        node_no = self.get_node_no(command_dict) if sensor_id is not None else None
+        if self.is_unchanged_command(command_dict):
+            self.suppressed_command_number += 1
+            return
+
+        command = self.set_command(command_dict, node_no, sensor_id)
+        self.sumo_log.info("%s", command)
+        self.send(command)
+
+    # ノード番号取得(EventIDの先頭のノードID"NODEPCnn"の番号)
+    #   --system-vehicle-positionでメイン・サブのノードを入れ替えた場合も実際に送信するノードの番号になる
+    def get_node_no(self, command_dict):
+        try:
+            return int(command_dict["EventID"][6:8])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    # 前回送信内容との比較(EventID・TimeStampは比較対象外)
+    #   SEND_HEARTBEAT_INTERVAL(ms)経過した場合は変化がなくても送信する(0の場合は変化時のみ)
+    def is_unchanged_command(self, command_dict):
+        if not self.send_change_only_flg:
+            return False
+        return self.change_only_filter.is_unchanged(command_dict, self.current_sim_time_ms)
 
     # 工事帯初期誘導状態セット
     def set_traffic_state_signal(self, traffic_guide_id):
@@ -2772,20 +3390,20 @@ class SumoSim:
 
         # 工事帯内車両なしとなった時間が格納済みか判定
         if self.construction_vehicle_time == None:
-            self.construction_vehicle_time = datetime.datetime.now()
+            self.construction_vehicle_time = self.clock.now_ms()
         
         # 工事帯内車両なしとなってから5秒経過しているか判定
-        passed_time = datetime.datetime.now() - self.construction_vehicle_time
-        if passed_time.seconds >= 5:
+        passed_time = self.clock.now_ms() - self.construction_vehicle_time
+        if passed_time >= 5000:
             # 工事帯内車両なし操作
             # print("タイムアウト解除")
             if self.collision_caution:
-                result = self.collision_caution_release_operation("Tablet01")
-                self.send(self.set_command(result))
+                result = self.set_command(self.collision_caution_release_operation("Tablet01"))
+                self.send(result)
                 self.sumo_log.info("-----------------------------緊急停止解除-----------------------------")
-                self.sumo_log.info(result)
+                self.sumo_log.info("%s", result)
                 self.collision_caution = False
-            result = self.construction_vehicle_none_operation("Tablet01")
+            result = self.set_command(self.construction_vehicle_none_operation("Tablet01"))
 
             # タイムアウト発生履歴
             # print("----------タイムアウト発生履歴----------")
@@ -2795,10 +3413,10 @@ class SumoSim:
             # 最終車両のナンバープレート認識などで、業務プロセスが自動でタイムアウト解除した場合は
             # タイムアウト解除コマンドは送らない
             if self.time_out_value == "1":
-                self.send(self.set_command(result))
+                self.send(result)
 
             self.sumo_log.info("-----------------------------タイムアウト解除-----------------------------")
-            self.sumo_log.info(result)
+            self.sumo_log.info("%s", result)
             self.construction_vehicle_time = None
             self.time_out_flag = False
         # self.sumo_log.info(result)
@@ -2819,10 +3437,10 @@ class SumoSim:
         
         if change_state == "1" and self.time_lag == 0:
             self.time_lag = self.time_lag_calc(change_lane)
-            self.change_time = datetime.datetime.now()
+            self.change_time = self.clock.now_ms()
 
-        passed_time = datetime.datetime.now() - self.change_time
-        if passed_time.seconds < self.time_lag:
+        passed_time = self.clock.now_ms() - self.change_time
+        if passed_time < self.time_lag * 1000:
             return
         
         if change_traffic_state or not system:
@@ -2841,7 +3459,7 @@ class SumoSim:
             self.time_out_timestamp = self.get_time()
             self.time_out_sim_timestamp = self.get_sim_time()
             self.sumo_log.info("-----------------------------タイムアウト発生-----------------------------")
-            traci.gui.setStaticInfo("timeOutTime", "")
+            self.set_gui_static_info("timeOutTime", "")
             # self.sumo_log.info(result)
         elif value["TimeOutFlg"] == "0" and self.time_out_flag:
             self.time_out_value = "0"
@@ -2893,7 +3511,7 @@ class SumoSim:
         
         for detector_id in secession_detector_id:
             vehicleIDs = self.get_vehicle_ids_on_detector(detector_id)
-            laneareaLength = traci.lanearea.getLength(detector_id)
+            laneareaLength = self.network_cache.get_detector_length(detector_id)
             for id in reversed(vehicleIDs):
 
                 # 車両位置取得
@@ -2943,9 +3561,8 @@ class SumoSim:
         if self.guide_traffic_light == output_data_:
             return
         self.guide_traffic_light = output_data_
-        print(file_name)
-        print(output_data)
-        self.GuideTrafficLight(file_name, output_data)
+        self.console_log.info("%s %s", file_name, tuple(output_data))
+        self.history_writer.write(file_name, output_data)
 
     # 先頭車両接近・停止履歴出力
     def output_leading_vehicle_state_history(self):
@@ -2974,7 +3591,7 @@ class SumoSim:
                 continue
 
             leading_vehicle_position = self.set_vehicle_position(True, detector_id, leading_vehicle_id, False)
-            leading_vehicle_speed = traci.vehicle.getSpeed(leading_vehicle_id) * 3600 / 1000
+            leading_vehicle_speed = self.get_vehicle_speed(leading_vehicle_id) * 3600 / 1000
             leading_vehicle_state = self.leading_vehicle_jugde(leading_vehicle_speed)
             number = self.vehicle_info[leading_vehicle_id]["Number"]
 
@@ -3002,9 +3619,8 @@ class SumoSim:
             time_stamp = self.get_time()
             sim_time_stamp = self.get_sim_time()
             output_data = [str(time_stamp), sim_time_stamp, str(lane_kind), str(leading_vehicle_state), number, str(leading_vehicle_position), str(leading_vehicle_speed)]
-            print(file_name)
-            print(output_data)
-            self.LeadingCar_LaneNumber(file_name, output_data)
+            self.console_log.info("%s %s", file_name, tuple(output_data))
+            self.history_writer.write(file_name, output_data)
 
     # 先頭車両状態判断
     def leading_vehicle_jugde(self, vehicle_speed):
@@ -3053,7 +3669,7 @@ class SumoSim:
         if straight_detector == "" or regulation_detector == "":
             return None
 
-        inside_car_number = traci.lanearea.getLastStepVehicleNumber(straight_detector) + traci.lanearea.getLastStepVehicleNumber(regulation_detector)
+        inside_car_number = self.get_detector_vehicle_number(straight_detector) + self.get_detector_vehicle_number(regulation_detector)
         # print(inside_car_number)
 
         return inside_car_number
@@ -3071,9 +3687,8 @@ class SumoSim:
         sim_time_stamp = self.get_sim_time()
         output_data = [str(time_stamp), sim_time_stamp, str(inside_car_number)]
         self.inside_car_number = inside_car_number
-        print(file_name)
-        print(output_data)
-        self.InsideCar(file_name, output_data)
+        self.console_log.info("%s %s", file_name, tuple(output_data))
+        self.history_writer.write(file_name, output_data)
         return True
 
     # 滞留発生履歴
@@ -3090,7 +3705,7 @@ class SumoSim:
             output_data = [str(time_stamp), str(sim_time_stamp), str(lane_kind), str(residence_vehicle_number)]
             # print(file_name)
             # print(output_data)
-            self.StayCar_LaneNumber(file_name, output_data)
+            self.history_writer.write(file_name, output_data)
 
         # 規制側
         tls_id = self.settings["REGULATION_TRAFFIC_LIGHT"]
@@ -3104,7 +3719,7 @@ class SumoSim:
             output_data = [str(time_stamp), str(sim_time_stamp), str(lane_kind), str(residence_vehicle_number)]
             # print(file_name)
             # print(output_data)
-            self.StayCar_LaneNumber(file_name, output_data)
+            self.history_writer.write(file_name, output_data)
 
 
     # 滞留発生
@@ -3124,7 +3739,7 @@ class SumoSim:
                 if not self.detection_lane_judge(detector_id, tls_id, vehicle_id, False):
                     continue
 
-                vehicle_speed = traci.vehicle.getSpeed(vehicle_id) * 3600 / 1000
+                vehicle_speed = self.get_vehicle_speed(vehicle_id) * 3600 / 1000
                 # 停止中か判断
                 if vehicle_speed > 0:
                     continue
@@ -3151,9 +3766,8 @@ class SumoSim:
         time_stamp = self.get_time()
         sim_time_stamp = self.get_sim_time()
         output_data = [str(time_stamp), str(sim_time_stamp), str(lane_kind), str(color)]
-        print(file_name)
-        print(output_data)
-        self.NearbyTrafficLight_LaneNumber(file_name, output_data)
+        self.console_log.info("%s %s", file_name, tuple(output_data))
+        self.history_writer.write(file_name, output_data)
 
     # 渋滞発生履歴出力
     def congestion_history(self):
@@ -3187,7 +3801,7 @@ class SumoSim:
                 if not vehicle_position:
                     continue
 
-                vehicle_speed = traci.vehicle.getSpeed(vehicle_id) * 3600 / 1000
+                vehicle_speed = self.get_vehicle_speed(vehicle_id) * 3600 / 1000
                 # 範囲内かつ速度が5km以下か判定
                 if vehicle_position <= detection_range and vehicle_speed <= 5:
                     congestion_vehicle_number += 1
@@ -3203,18 +3817,16 @@ class SumoSim:
             time_stamp = self.get_time()
             sim_time_stamp = self.get_sim_time()
             output_data = [str(time_stamp), sim_time_stamp, str(lane_kind), str(congestion_vehicle_number)]
-            print(file_name)
-            print(output_data)
-            self.TrafficJam_LaneNumber(file_name, output_data)
+            self.console_log.info("%s %s", file_name, tuple(output_data))
+            self.history_writer.write(file_name, output_data)
 
     # シミュレーション開始・終了時刻出力
     def sim_start_end_time(self):
         file_name = "startTimestamp.txt"
         time_stamp = self.get_time()
         output_data = [str(time_stamp)]
-        print(file_name)
-        print(output_data)
-        self.startTimestamp(file_name, output_data)
+        self.console_log.info("%s %s", file_name, tuple(output_data))
+        self.history_writer.write(file_name, output_data)
 
 
     # タイムアウト発生履歴出力
@@ -3231,10 +3843,9 @@ class SumoSim:
 
         lane_kind = self.time_out_side
         output_data = [str(self.time_out_timestamp), str(self.time_out_sim_timestamp), str(lane_kind)]
-        print(file_name)
-        print(output_data)
+        self.console_log.info("%s %s", file_name, tuple(output_data))
         self.time_out_history_flag = True
-        self.timeout(file_name, output_data)
+        self.history_writer.write(file_name, output_data)
 
     # 工事帯通過車両履歴出力
     def passing_vehicle_history(self, lane_kind, vehicle_id):
@@ -3242,11 +3853,10 @@ class SumoSim:
         time_stamp = self.get_time()
         sim_time_stamp = self.get_sim_time()
         number = self.vehicle_info[str(vehicle_id)]["Number"]
-        speed = traci.vehicle.getSpeed(vehicle_id) * 3600 / 1000
+        speed = self.get_vehicle_speed(vehicle_id) * 3600 / 1000
         output_data = [str(time_stamp), str(sim_time_stamp), str(lane_kind), number, str(speed)]
-        print(file_name)
-        print(output_data)
-        self.passingCar_LaneNumber(file_name, output_data)
+        self.console_log.info("%s %s", file_name, tuple(output_data))
+        self.history_writer.write(file_name, output_data)
 
     # すすめ可能からの待ち時間履歴出力
     def waiting_time_history(self):
@@ -3286,9 +3896,8 @@ class SumoSim:
         sim_time_stamp = self.go_possible_sim_time
         wait_time = int(go_change_sim_time) - int(sim_time_stamp)
         output_data = [str(time_stamp), str(go_change_time), str(sim_time_stamp), str(go_change_sim_time), str(lane_kind), str(wait_time)]
-        print(file_name)
-        print(output_data)
-        self.waitTime(file_name, output_data)
+        self.console_log.info("%s %s", file_name, tuple(output_data))
+        self.history_writer.write(file_name, output_data)
 
 
     # すすめ可能か判断
@@ -3325,7 +3934,7 @@ class SumoSim:
                 vehicle_position = self.set_vehicle_position(True, detector_id, vehicle_id, False)
                 if not vehicle_position:
                     continue
-                vehicle_speed = traci.vehicle.getSpeed(vehicle_id) * 3600 / 1000
+                vehicle_speed = self.get_vehicle_speed(vehicle_id) * 3600 / 1000
                 
                 # 範囲内かつ速度が5km以下か判定
                 if vehicle_position <= detection_range and vehicle_speed <= 5:
@@ -3349,9 +3958,8 @@ class SumoSim:
         output_data = [str(sim_time_stamp), str(time_stamp), straight_data, regulation_data]
         # 枝道分のデータ格納
         # output_data.append("branch")
-        print(file_name)
-        print(output_data)
-        self.detCADanger(file_name, output_data)
+        self.console_log.info("%s %s", file_name, tuple(output_data))
+        self.history_writer.write(file_name, output_data)
 
     # 衝突情報取得
     def collision_history_detection_data(self, detector_id, lane_kind, vehicle_id):
@@ -3370,96 +3978,17 @@ class SumoSim:
         construction_vehicle_number = str(len(vehicle_ids))
         # leading_vehicle_id = self.get_leading_vehicle(detector_id, detection)
         # print(leading_vehicle_id)
-        leading_vehicle_distance = str(traci.lanearea.getVehicleDistToDetectorEnd(detector_id, vehicle_id))
-        leading_vehicle_speed = str(traci.vehicle.getSpeed(vehicle_id) * 3600 / 1000)
+        leading_vehicle_distance = self.detector_snapshot.get_dist_to_end(detector_id, vehicle_id)
+        if leading_vehicle_distance is None:
+            leading_vehicle_distance = self.get_dist_to_detector_end(detector_id, vehicle_id)
+        leading_vehicle_distance = str(leading_vehicle_distance)
+        leading_vehicle_speed = str(self.get_vehicle_speed(vehicle_id) * 3600 / 1000)
         construction_vehicle_id = "{" + ",".join(vehicle_ids) + "}"
         result = "{%s, %s, %s, %s, %s}" % (det_id, construction_vehicle_number, leading_vehicle_distance, leading_vehicle_speed, construction_vehicle_id)
         return result
 
-    def GuideTrafficLight(self, fileName, datalist):
-        with open(os.path.join(self.output_directory, fileName), 'a') as f:
-            if os.path.getsize(os.path.join(self.output_directory, fileName)) == 0:
-                f.write("#time, sim_time, system_state" + "\n")
-            if len(datalist) != 0:
-                f.write(', '.join(datalist) + "\n")
-
-    def LeadingCar_LaneNumber(self, fileName, datalist):
-        with open(os.path.join(self.output_directory, fileName), 'a') as f:
-            if os.path.getsize(os.path.join(self.output_directory, fileName)) == 0:
-                f.write("#time, sim_time, node_no, status, car_number, distance, speed" + "\n")
-            if len(datalist) != 0:
-                f.write(', '.join(datalist) + "\n")
-
-    def InsideCar(self, fileName, datalist):
-        with open(os.path.join(self.output_directory, fileName), 'a') as f:
-            if os.path.getsize(os.path.join(self.output_directory, fileName)) == 0:
-                f.write("#time, sim_time, inside_car_count" + "\n")  
-            if len(datalist) != 0:
-                f.write(', '.join(datalist) + "\n")
-
-    def StayCar_LaneNumber(self, fileName, datalist):
-        with open(os.path.join(self.output_directory, fileName), 'a') as f:
-            if os.path.getsize(os.path.join(self.output_directory, fileName)) == 0:
-                f.write("#time, sim_time, node_no, vehicle_count" + "\n")  
-            if len(datalist) != 0:
-                f.write(', '.join(datalist) + "\n")
-
-    def NearbyTrafficLight_LaneNumber(self, fileName, datalist):
-        with open(os.path.join(self.output_directory, fileName), 'a') as f:
-            if os.path.getsize(os.path.join(self.output_directory, fileName)) == 0:
-                f.write("#time, sim_time, node_no, color" + "\n")  
-            if len(datalist) != 0:
-                f.write(', '.join(datalist) + "\n")
-
-    def TrafficJam_LaneNumber(self, fileName, datalist):
-        with open(os.path.join(self.output_directory, fileName), 'a') as f:
-            if os.path.getsize(os.path.join(self.output_directory, fileName)) == 0:
-                f.write("#time, sim_time, node_no, vehicle_count" + "\n")
-            if len(datalist) != 0:
-                f.write(', '.join(datalist) + "\n")
-
-    def startTimestamp(self, fileName, datalist):
-        with open(os.path.join(self.output_directory, fileName), 'a') as f:
-            # if os.path.getsize(os.path.join(self.output_directory, fileName)) == 0:
-                # f.write("#time, sim_time, node_no, vehicle_count" + "\n")  
-            if len(datalist) != 0:
-                f.write(', '.join(datalist) + "\n")
-
-    def timeout(self, fileName, datalist):
-        with open(os.path.join(self.output_directory, fileName), 'a') as f:
-            if os.path.getsize(os.path.join(self.output_directory, fileName)) == 0:
-                f.write("#start_time, start_sim_time, TimeOutSide" + "\n")  
-            if len(datalist) != 0:
-                f.write(', '.join(datalist) + "\n")
-
-    def passingCar_LaneNumber(self, fileName, datalist):
-        with open(os.path.join(self.output_directory, fileName), 'a') as f:
-            if os.path.getsize(os.path.join(self.output_directory, fileName)) == 0:
-                f.write("#time, sim_time, node_no, vehicle_count" + "\n")  
-            if len(datalist) != 0:
-                f.write(', '.join(datalist) + "\n")
-
-    def waitTime(self, fileName, datalist):
-        with open(os.path.join(self.output_directory, fileName), 'a') as f:
-            if os.path.getsize(os.path.join(self.output_directory, fileName)) == 0:
-                f.write("#start_time, end_time, start_sim_time, end_sim_time, node_no, wait_time" + "\n")  
-            if len(datalist) != 0:
-                f.write(', '.join(datalist) + "\n")
-
-    def detCADanger(self, fileName, datalist):
-        with open(os.path.join(self.output_directory, fileName), 'a') as f:
-            if os.path.getsize(os.path.join(self.output_directory, fileName)) == 0:
-                f.write('#"time", "sim_time", "{unit_id, vehicle_count, head_vehicle_distance, vehicle_speed, {vehicle_id}, ... }", ...' + "\n")
-            if len(datalist) != 0:
-                f.write(', '.join(datalist) + "\n")
-
-    def write(self, fileName, datalist):
-        with open(os.path.join(self.output_directory, fileName), 'a') as f:
-            f.write(', '.join(datalist) + "\n")
-
     def output_header(self):
-        datalist = []
-        self.GuideTrafficLight("guideTrafficLight.txt", "")
+        self.history_writer.write_header("guideTrafficLight.txt")
         # print(self.leading_vehicle_info)
         for key, value in self.leading_vehicle_info.items():
             if key == "straight":
@@ -3472,19 +4001,20 @@ class SumoSim:
                 lane_kind = node_num + 2
 
             # file_name = "leadingCar_%s.txt" % (str(lane_kind))
-            self.LeadingCar_LaneNumber("leadingCar_%s.txt" % (str(lane_kind)), datalist)
-            self.TrafficJam_LaneNumber("trafficJam_%s.txt" % (str(lane_kind)), datalist)
-        self.InsideCar("insideCar.txt", datalist)
-        self.StayCar_LaneNumber("stayCar_%s.txt" % ("1"), datalist)
-        self.StayCar_LaneNumber("stayCar_%s.txt" % ("2"), datalist)
-        self.NearbyTrafficLight_LaneNumber("nearbyTrafficLight_%s.txt" % ("1"), datalist)
-        self.NearbyTrafficLight_LaneNumber("nearbyTrafficLight_%s.txt" % ("2"), datalist)
-        self.timeout("timeout.txt", datalist)
-        self.timeout("timeout_auto.txt", datalist)
-        self.passingCar_LaneNumber("passingCar_%s.txt" % ("1"), datalist)
-        self.passingCar_LaneNumber("passingCar_%s.txt" % ("2"), datalist)
-        self.waitTime("waitTime.txt", datalist)
-        self.detCADanger("detCADanger.txt", datalist)
+            self.history_writer.write_header("leadingCar_%s.txt" % (str(lane_kind)))
+            self.history_writer.write_header("trafficJam_%s.txt" % (str(lane_kind)))
+        self.history_writer.write_header("insideCar.txt")
+        self.history_writer.write_header("stayCar_%s.txt" % ("1"))
+        self.history_writer.write_header("stayCar_%s.txt" % ("2"))
+        self.history_writer.write_header("nearbyTrafficLight_%s.txt" % ("1"))
+        self.history_writer.write_header("nearbyTrafficLight_%s.txt" % ("2"))
+        self.history_writer.write_header("timeout.txt")
+        self.history_writer.write_header("timeout_auto.txt")
+        self.history_writer.write_header("passingCar_%s.txt" % ("1"))
+        self.history_writer.write_header("passingCar_%s.txt" % ("2"))
+        self.history_writer.write_header("waitTime.txt")
+        self.history_writer.write_header("detCADanger.txt")
+        self.history_writer.flush()
 
 
 
@@ -3493,75 +4023,105 @@ class SumoSim:
         # print("test")
 
     # HTTP送信
-    def send(self, js, delay_flg=True):
-        if js == "None":
+    def send(self, command, delay_flg=True):
+        if command is None:
             return
 
-        if self.use_delay_event_file and delay_flg:
-            send_json = json.loads(js)
-            # 検出イベントの遅延判定
-            if send_json["CommandID"].startswith("0xF"):
-                # コマンドIDを遅延設定ファイルのセンサーIDに変換
-                sensor_id = send_json["CommandID"][5] + send_json["CommandID"][7]
-                node_no = int(send_json["EventID"][6:8])
-                now_time = traci.simulation.getCurrentTime()
-
-                delay_info = self.df_delay_event.query(f"NodeNo=={node_no} and (SensorID == 0 or SensorID == {sensor_id}) and Begin <= {now_time} and End >= {now_time}")
-                if len(delay_info):
-                    # 設定された遅延発生確率で遅延を発生させる
-                    delay_random_num = random.randint(1, 100)
-                    delay_probability = delay_info["Probability"][0]
-
-                    # 対象車線、コマンドが遅延期間内の場合、遅延データに追加
-                    if delay_random_num <= delay_probability:
-                        # 現在から何ミリ秒後に送信するのかをランダムで設定するかどうか
-                        delay_random_flg = delay_info["RandomFlg"][0]
-                        
-                        if delay_random_flg:
-                            # ランダムで遅延ミリ秒数を設定する場合は、現時刻にDelayTime~DelayTimeMaxの間のランダムな整数を加算した時刻に送信
-                            send_time = now_time + random.randint(delay_info["DelayTime"][0], delay_info["DelayTimeMax"][0])
-                            print("*********************************")
-                            print(f"---------------------send time: {send_time - now_time} ---------------------")
-                            print("*********************************")
-                        else:
-                            # 固定で遅延ミリ秒数を設定する場合は、現時刻にDelayTimeを加算した時刻に送信
-                            send_time = now_time + delay_info["DelayTime"][0]
+        # 検出イベントの遅延判定(ノード番号・センサーIDが指定されたコマンドのみ)
+        if self.use_delay_event_file and delay_flg and command.sensor_id is not None:
+            now_time = self.current_sim_time_ms
+            delay_info = self.delay_event_index.find(command.node_no, command.sensor_id, now_time)
+            if delay_info is not None:
+                # 設定された遅延発生確率で遅延を発生させる
+                delay_random_num = random.randint(1, 100)
+                delay_probability = delay_info["Probability"]
+
+                # 対象車線、コマンドが遅延期間内の場合、遅延データに追加
+                if delay_random_num <= delay_probability:
+                    # 現在から何ミリ秒後に送信するのかをランダムで設定するかどうか
+                    delay_random_flg = delay_info["RandomFlg"]
+
+                    if delay_random_flg:
+                        # ランダムで遅延ミリ秒数を設定する場合は、現時刻にDelayTime~DelayTimeMaxの間のランダムな整数を加算した時刻に送信
+                        send_time = now_time + random.randint(int(delay_info["DelayTime"]), int(delay_info["DelayTimeMax"]))
+                        self.console_log.info("---------------------send time: %s ---------------------", send_time - now_time)
+                    else:
+                        # 固定で遅延ミリ秒数を設定する場合は、現時刻にDelayTimeを加算した時刻に送信
+                        send_time = now_time + delay_info["DelayTime"]
+
+                    self.delay_scheduler.schedule(int(send_time), command)
+
+                    return
+
+        # ジャーナルに記録(遅延送信の場合は送信時に記録)
+        if self.event_journal is not None:
+            self.event_journal.record(JOURNAL_OUTBOUND, self.current_sim_time_ms, command.node_id, command.command.get("CommandID", ""), command.data)
+
+        if self.send_batch_flg:
+            # まとめて送信する場合は送信待ちに追加(flush_send_batchで送信)
+            with self.send_batch_lock:
+                if not self.send_batch:
+                    self.send_batch_start_time = self.current_sim_time_ms
+                self.send_batch.append(command.data)
+            return
 
-                        df_new_delay_data = pd.DataFrame({"send_time":[send_time], "send_data":[js]})
-                        with self.lock:
-                            self.df_delay_data = pd.concat([self.df_delay_data, df_new_delay_data])
+        # 送信キューに追加(送信は送信ワーカーで行う)
+        self.event_sender.enqueue(command.node_id, command.data)
 
-                        return
+    # 送信待ちのコマンドを1リクエストにまとめて送信キューに追加
+    #   SEND_BATCH_WINDOWが0の場合はステップごと、それ以外は最初のコマンドから指定ミリ秒経過後に送信
+    #   ノードをまたいで送信順を保つため、まとめたコマンドは常に同じ送信ワーカーで送信する
+    def flush_send_batch(self, force=False):
+        if not self.send_batch_flg:
+            return
 
-        headers = {'Content-Type': 'application/json',}
-        req = urllib.request.Request(self.url,js.encode(),headers)
-        try:
-            self.sumo_log.info("SendTime: " + str(datetime.datetime.now()))
-            with urllib.request.urlopen(req,timeout=int(self.send_time_out)) as res:
-                body = res.read().decode("utf-8")
-        except urllib.error.URLError:
-            self.sumo_log.info("エラー：設定されているURLへの接続に失敗しました。")
-        except socket.timeout:
-            self.sumo_log.info("エラー：コマンド送信中にタイムアウトしました。")
+        with self.send_batch_lock:
+            if not self.send_batch:
+                return
+            if not force and self.current_sim_time_ms - self.send_batch_start_time < self.send_batch_window:
+                return
+            commands = self.send_batch
+            self.send_batch = []
 
-    # 定期的に遅延データを監視して送信
-    def delay_send(self):
-        while True:
-            if self.is_traci_start:
-                now_time = traci.simulation.getCurrentTime()
-                query = f"send_time<={now_time}"
-                for index, row in self.df_delay_data.query(query).iterrows():
-                    self.send(row.send_data, False)
+        self.event_sender.enqueue("BATCH", pack_commands(commands, self.send_batch_format))
 
-                # 送信済データは遅延データから削除
-                with self.lock:
-                    self.df_delay_data = self.df_delay_data.query("~(" + query + ")")
+    # HTTP送信(送信ワーカーから呼び出し)
+    def post_command(self, data):
+        headers = {'Content-Type': self.send_content_type,}
+        try:
+            self.sumo_log.debug("SendTime: %s", datetime.datetime.now())
+            # keep-alive接続を再利用して送信
+            status, body = self.http_pool.post(self.url, data, headers)
+        except socket.timeout:
+            self.sumo_log.error("エラー：コマンド送信中にタイムアウトしました。")
+        except (OSError, http.client.HTTPException):
+            self.sumo_log.error("エラー：設定されているURLへの接続に失敗しました。")
 
-            time.sleep(0.2)
+    # 送信時刻に達した遅延データを送信(シミュレーションのステップごとに実行)
+    def delay_send(self, now_time):
+        if not self.use_delay_event_file:
+            return
+        for command in self.delay_scheduler.pop_due(now_time):
+            self.send(command, False)
 
-    # 
+    # 受信サーバ起動
+    #   HTTP_SERVER_BACKENDがwaitressの場合はwaitress、flaskの場合はFlaskの開発用サーバで受信
     def api_run(self):
-        return self.api.run(host=self.host, port=self.port, debug=False)
+        threads = int(self.settings["HTTP_SERVER_THREADS"])
+        if self.http_server_backend == "waitress":
+            return serve(
+                self.api,
+                host=self.host,
+                port=self.port,
+                threads=threads,
+                max_request_body_size=int(self.settings["HTTP_SERVER_MAX_REQUEST_SIZE"]),
+                channel_timeout=int(self.settings["HTTP_SERVER_KEEPALIVE_TIMEOUT"]),
+            )
+
+        self.sumo_log.warning("Flaskの開発用サーバで受信します。")
+        # keep-aliveを有効にするためHTTP/1.1で応答
+        WSGIRequestHandler.protocol_version = "HTTP/1.1"
+        return self.api.run(host=self.host, port=self.port, debug=False, threaded=threads > 1)
 
     # POSTリクエストの処理
     # @self.api.route('/', methods=['POST'])
@@ -3573,7 +4133,20 @@ class SumoSim:
         # print("RowData: {}\n".format(request.data.decode()))
         # print(data)
 
-        data = json.loads(request.data.decode())
+        # まとめて送信されたコマンド(JSON配列、NDJSON)は1件ずつ処理
+        result = ''
+        for data in unpack_commands(request.data, request.content_type):
+            # ジャーナルに記録
+            if self.event_journal is not None and isinstance(data, dict):
+                self.event_journal.record(JOURNAL_INBOUND, self.current_sim_time_ms, data.get("EventID", "").split("_")[0], data.get("CommandID", ""), encode_command(data))
+            if self.recv_command(data) == 0:
+                result = jsonify({"Message": "Reception success"})
+
+        res = make_response(result)
+        return res
+
+    # 受信コマンド1件分の処理(コマンド種別を返す)
+    def recv_command(self, data):
         command_type = 0
         command_id = ""
 
@@ -3599,30 +4172,36 @@ class SumoSim:
                         # print("{: <20}: {}".format(value_key, value[value_key]))
         # print("\n==========================================================\n")
 
-        if command_type == 0:
-            result = jsonify({"Message": "Reception success"})
-        else:
-            result = ''
-        
         # コマンドID判定
         # if command_id == "0x00000070":
             # 車線状態更新要求を受信した際の処理
 
-        if command_id == "0x00000080":
-            # 工事帯通過状態更新要求を受信した際の処理
-            self.construction_passing_state_update(values[0])
+        # シミュレーションに反映するコマンドは受信キューに追加のみ行う
+        if command_id in ("0x00000080", "0x00000060", "traci_tls_change"):
+            self.recv_inbox.put((command_id, values))
 
-        if command_id == "0x00000060":
-            # システム判断状態更新要求を受信した際の処理
-            self.lane_state_update(values)
-            self.check_collision_caution(values)
+        return command_type
 
-        if command_id == "traci_tls_change":
-            # 工事帯信号変更コマンド受信
-            self.lane_state_update(values, 0)
+    # 受信キューのコマンドをすべて反映(シミュレーションのステップ開始時に実行)
+    def apply_recv_commands(self):
+        while True:
+            try:
+                command_id, values = self.recv_inbox.get_nowait()
+            except queue.Empty:
+                return
 
-        res = make_response(result)
-        return res
+            if command_id == "0x00000080":
+                # 工事帯通過状態更新要求を受信した際の処理
+                self.construction_passing_state_update(values[0])
+
+            if command_id == "0x00000060":
+                # システム判断状態更新要求を受信した際の処理
+                self.lane_state_update(values)
+                self.check_collision_caution(values)
+
+            if command_id == "traci_tls_change":
+                # 工事帯信号変更コマンド受信
+                self.lane_state_update(values, 0)
 
 
     # @self.api.errorhandler(404)
@@ -3637,9 +4216,17 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("シミュレーション終了")
         sys.exit() 
-    except traci.exceptions.FatalTraCIError:
+    except FatalTraCIError:
+        print("シミュレーション終了")
+        sys.exit()
+    # シミュレーションが例外で終了した場合は失敗の終了コードを返す(batch_runnerの集計用)
+    try:
+        sumoSim.thread_sim.join()
+    except KeyboardInterrupt:
         print("シミュレーション終了")
         sys.exit()
+    if sumoSim.sim_error is not None:
+        sys.exit(1)
     # options = sumoSim.get_options()
 
     # this script has been called from the command line. It will start sumo as a
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# 同じ交通状態からの設定比較(スイープ)
+#   シナリオの共通部分(ウォームアップ)を1回だけ実行してチェックポイントを保存し、
+#   設定を上書きした各バリエーションをチェックポイントから別プロセスで並列実行する
+#   各バリエーションの実行結果とKPI履歴の集計はcomparison.csvに出力する
+#
+# スイープファイル(JSON)の形式:
+#   {
+#     "warmup_time": 600,
+#     "variants": {
+#       "base": {},
+#       "distance_30": {"APPROACH_BREAKAWAY_DETECTION_DISTANCE_MAX": "30"},
+#       "green_40": {"signal_settings.1.GreenTime": "40000"}
+#     }
+#   }
+import concurrent.futures
+import copy
+import csv
+import glob
+import json
+import optparse
+import os
+import sys
+import time
+
+import batch_runner
+from checkpoint import is_checkpoint
+from history_writer import COLUMNAR_AVAILABLE, pa, pq
+
+CHECKPOINT_DIRECTORY = "checkpoint"
+HISTORY_EXTENSIONS = (".txt", ".parquet", ".arrow")
+COMPARISON_COLUMNS = ["variant", "overrides", "return_code", "elapsed_s",
+                      "passing_car", "timeout", "collision_danger", "wait_time_count", "wait_time_avg", "wait_time_max",
+                      "output_directory"]
+
+
+def get_options(args=None):
+    optParser = optparse.OptionParser(usage="%prog [options] [-- sumo_sim.py options]")
+    optParser.add_option("--map", help="map name")
+    optParser.add_option("--scenario", help="scenario name")
+    optParser.add_option("--sweep-file", help="sweep definition file (JSON)")
+    optParser.add_option("--scenario-root", default=batch_runner.SCENARIO_ROOT, help="scenario root directory")
+    optParser.add_option("--sim-config", default="Set.json", help="sumo simulation config file")
+    optParser.add_option("--warmup-time", type=int, help="sim time [s] of the shared warm-up (default: warmup_time in --sweep-file)")
+    optParser.add_option("--workers", type=int, default=os.cpu_count() or 1, help="number of parallel variant runs")
+    optParser.add_option("--traci-port", type=int, default=8813, help="first TraCI port (incremented per run)")
+    optParser.add_option("--http-port", type=int, default=5100, help="first receiver port (incremented per run)")
+    optParser.add_option("--output-directory", default="sweep", help="output root directory")
+    optParser.add_option("--time", type=int, help="sim time of each variant (required, must exceed the warm-up time)")
+    optParser.add_option("--seed", type=int, help="random seed")
+    optParser.add_option("--reuse-checkpoint", action="store_true", default=False,
+                            help="skip the warm-up if the checkpoint already exists")
+    options, args = optParser.parse_args(args)
+    return options, args
+
+
+def read_sweep_file(path):
+    with open(path, "r") as f:
+        sweep = json.load(f)
+    variants = sweep.get("variants", {})
+    if not isinstance(variants, dict) or not variants:
+        raise ValueError("sweep file has no variants: %s" % (path))
+    return sweep.get("warmup_time"), variants
+
+
+# 上書き設定をsumo_sim.pyの引数に変換
+def get_override_args(overrides):
+    args = []
+    for key, value in overrides.items():
+        args += ["--settings-override", "%s=%s" % (key, value)]
+    return args
+
+
+# 履歴ファイルの一覧(ファイル名の先頭部分が一致するもの、テキスト・Parquet・Arrowのいずれか)
+def find_history_files(directory, prefix):
+    paths = []
+    for ext in HISTORY_EXTENSIONS:
+        paths += glob.glob(os.path.join(directory, prefix + "*" + ext))
+    return sorted(paths)
+
+
+# 履歴ファイルの読み込み(各行の値のリスト、列形式の場合はpyarrowが必要)
+def read_history_rows(path):
+    if path.endswith(".txt"):
+        rows = []
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip() and not line.startswith("#"):
+                    rows.append([value.strip() for value in line.split(",")])
+        return rows
+
+    if not COLUMNAR_AVAILABLE:
+        raise ImportError("pyarrow is required to summarize %s" % (path))
+    if path.endswith(".parquet"):
+        table = pq.read_table(path)
+    else:
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+    columns = [table.column(i).to_pylist() for i in range(table.num_columns)]
+    return [list(row) for row in zip(*columns)]
+
+
+def count_history_rows(directory, prefix):
+    return sum(len(read_history_rows(path)) for path in find_history_files(directory, prefix))
+
+
+# KPI履歴の集計(比較表の列)
+def summarize_history(directory):
+    summary = {
+        "passing_car": count_history_rows(directory, "passingCar_"),
+        "timeout": count_history_rows(directory, "timeout"),
+        "collision_danger": count_history_rows(directory, "detCADanger"),
+        "wait_time_count": 0,
+        "wait_time_avg": "",
+        "wait_time_max": "",
+    }
+
+    wait_times = []
+    for path in find_history_files(directory, "waitTime"):
+        for row in read_history_rows(path):
+            # 最後の列が待ち時間
+            try:
+                wait_times.append(float(row[-1]))
+            except (TypeError, ValueError):
+                continue
+    if wait_times:
+        summary["wait_time_count"] = len(wait_times)
+        summary["wait_time_avg"] = round(sum(wait_times) / len(wait_times), 3)
+        summary["wait_time_max"] = max(wait_times)
+    return summary
+
+
+# ウォームアップの実行(終了時にチェックポイントを保存)
+def run_warmup(options, checkpoint_directory, warmup_time, extra_args):
+    warmup_options = copy.copy(options)
+    warmup_options.output_directory = os.path.join(options.output_directory, "warmup")
+    warmup_options.time = warmup_time
+    args = ["--save-checkpoint", checkpoint_directory] + extra_args
+    return batch_runner.run_scenario(options.map, options.scenario, options.traci_port, options.http_port, warmup_options, args)
+
+
+# 1バリエーション分の実行(チェックポイントから再開)
+def run_variant(name, overrides, checkpoint_directory, traci_port, http_port, options, extra_args):
+    variant_options = copy.copy(options)
+    variant_options.output_directory = os.path.join(options.output_directory, name)
+    args = ["--load-checkpoint", checkpoint_directory] + get_override_args(overrides) + extra_args
+    result = batch_runner.run_scenario(options.map, options.scenario, traci_port, http_port, variant_options, args)
+
+    row = {
+        "variant": name,
+        "overrides": json.dumps(overrides, ensure_ascii=False),
+        "return_code": result["return_code"],
+        "elapsed_s": result["elapsed_s"],
+        "output_directory": result["output_directory"],
+    }
+    row.update(summarize_history(result["output_directory"]))
+    return row
+
+
+# ウォームアップ後、すべてのバリエーションを並列実行してcomparison.csvを出力(失敗したバリエーション数を返す)
+def run_sweep(options, extra_args):
+    warmup_time, variants = read_sweep_file(options.sweep_file)
+    if options.warmup_time is not None:
+        warmup_time = options.warmup_time
+    if warmup_time is None:
+        print("ウォームアップ時間を指定してください。")
+        return 1
+    if options.time <= warmup_time:
+        print("シミュレーション時間(--time)はウォームアップ時間より長く指定してください。")
+        return 1
+
+    # sumo_sim.pyはスクリプトのディレクトリで実行するため絶対パスにしておく
+    options.output_directory = os.path.abspath(options.output_directory)
+    options.scenario_root = os.path.abspath(options.scenario_root)
+    os.makedirs(options.output_directory, exist_ok=True)
+    checkpoint_directory = os.path.join(options.output_directory, CHECKPOINT_DIRECTORY)
+
+    start = time.perf_counter()
+    if options.reuse_checkpoint and is_checkpoint(checkpoint_directory):
+        print("warmup: reuse %s" % (checkpoint_directory))
+    else:
+        result = run_warmup(options, checkpoint_directory, warmup_time, extra_args)
+        print("warmup: return code %d (%.1f s)" % (result["return_code"], result["elapsed_s"]))
+        if result["return_code"] != 0:
+            return 1
+        # 終了コードが0でもチェックポイントが保存されていなければバリエーションは実行しない
+        if not is_checkpoint(checkpoint_directory):
+            print("warmup: no checkpoint in %s" % (checkpoint_directory))
+            return 1
+    warmup_elapsed = time.perf_counter() - start
+
+    workers = max(1, options.workers)
+    print("%d variants, %d workers" % (len(variants), workers))
+    rows = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        # ウォームアップで使用したポートの次から割り当てる
+        for i, (name, overrides) in enumerate(variants.items()):
+            futures.append(executor.submit(
+                run_variant, name, overrides, checkpoint_directory,
+                options.traci_port + 1 + i, options.http_port + 1 + i, options, extra_args))
+        for future in concurrent.futures.as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            print("%s: return code %d (%.1f s)" % (row["variant"], row["return_code"], row["elapsed_s"]))
+
+    names = list(variants)
+    rows.sort(key=lambda row: names.index(row["variant"]))
+    comparison_file = os.path.join(options.output_directory, "comparison.csv")
+    with open(comparison_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COMPARISON_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    failed = sum(1 for row in rows if row["return_code"] != 0)
+    print("finished: %d variants, %d failed, warmup %.1f s, total %.1f s -> %s" % (
+        len(rows), failed, warmup_elapsed, time.perf_counter() - start, comparison_file))
+    return failed
+
+
+def main(args=None):
+    options, extra_args = get_options(args)
+    if not options.map or not options.scenario or not options.sweep_file:
+        print("--map、--scenario、--sweep-fileを指定してください。")
+        return 1
+    if options.time is None:
+        print("シミュレーション時間(--time)を指定してください。")
+        return 1
+    return 1 if run_sweep(options, extra_args) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
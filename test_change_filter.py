@@ -0,0 +1,47 @@
+from change_filter import ChangeOnlyFilter
+
+
+def make(command_id, node_id, time_stamp, value):
+    return {"CommandID": command_id, "EventID": "%s_%d" % (node_id, time_stamp), "TimeStamp": str(time_stamp), "Value": value}
+
+
+def test_repeated_state_command_is_suppressed_until_heartbeat():
+    change_filter = ChangeOnlyFilter(heartbeat_interval=1000)
+    value = {"Color": "0"}
+    assert not change_filter.is_unchanged(make("0xF0010010", "NODEPC01", 0, value), 0)
+    assert change_filter.is_unchanged(make("0xF0010010", "NODEPC01", 200, value), 200)
+    assert not change_filter.is_unchanged(make("0xF0010010", "NODEPC01", 1000, value), 1000)
+    # 内容が変わった場合はすぐに送信
+    assert not change_filter.is_unchanged(make("0xF0010010", "NODEPC01", 1200, {"Color": "2"}), 1200)
+
+
+def test_nodes_are_compared_separately():
+    change_filter = ChangeOnlyFilter()
+    value = {"Color": "0"}
+    assert not change_filter.is_unchanged(make("0xF0010010", "NODEPC01", 0, value), 0)
+    assert not change_filter.is_unchanged(make("0xF0010010", "NODEPC02", 0, value), 0)
+    assert change_filter.is_unchanged(make("0xF0010010", "NODEPC02", 200, value), 200)
+
+
+def test_identical_breakaway_events_are_all_sent():
+    # 同じ内容でも車両ごとの別のイベント(ハートビートなしでも間引かない)
+    change_filter = ChangeOnlyFilter(heartbeat_interval=0)
+    value = {"Direction": "-1"}
+    assert not change_filter.is_unchanged(make("0xF0060000", "NODEPC01", 0, value), 0)
+    assert not change_filter.is_unchanged(make("0xF0060000", "NODEPC01", 200, value), 200)
+
+
+def test_event_commands_are_excluded_from_explicit_list():
+    change_filter = ChangeOnlyFilter(["0xF0060000", "0xF0020000"])
+    value = {"Direction": "-1"}
+    assert not change_filter.is_unchanged(make("0xF0060000", "NODEPC01", 0, value), 0)
+    assert not change_filter.is_unchanged(make("0xF0060000", "NODEPC01", 200, value), 200)
+    assert not change_filter.is_unchanged(make("0xF0020000", "NODEPC01", 0, value), 0)
+    assert change_filter.is_unchanged(make("0xF0020000", "NODEPC01", 200, value), 200)
+
+
+def test_default_list_ignores_other_commands():
+    change_filter = ChangeOnlyFilter()
+    value = {"Value": "1"}
+    assert not change_filter.is_unchanged(make("0xF0020000", "NODEPC01", 0, value), 0)
+    assert not change_filter.is_unchanged(make("0xF0020000", "NODEPC01", 200, value), 200)
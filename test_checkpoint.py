@@ -0,0 +1,66 @@
+import random
+from types import SimpleNamespace
+
+from checkpoint import save_checkpoint, load_sim_state, is_checkpoint
+from sim_clock import SimClock, WallClock
+
+
+# traci.simulationの代わり(状態ファイルを作成するのみ)
+class FakeSimulation:
+
+    def saveState(self, path):
+        with open(path, "w") as f:
+            f.write("state")
+
+
+FAKE_TRACI = SimpleNamespace(simulation=FakeSimulation())
+
+
+def make_sim(clock, sim_time_ms):
+    sim = SimpleNamespace(scenario_name="map/scenario", current_sim_time=sim_time_ms / 1000, current_sim_time_ms=sim_time_ms)
+    sim.clock = clock
+    return sim
+
+
+def test_sim_clock_is_rebased_to_the_saved_start(tmp_path):
+    sim_time = {"ms": 600000}
+    saved = make_sim(SimClock(lambda: sim_time["ms"], start_ms=1000000), 600000)
+    saved.go_possible_time = 1000000 + 590000
+    save_checkpoint(str(tmp_path), saved, FAKE_TRACI, {"step": 3000})
+    assert is_checkpoint(str(tmp_path))
+
+    # 別のプロセスで開始時刻が異なる時計から再開
+    loaded = make_sim(SimClock(lambda: sim_time["ms"], start_ms=5000000), 600000)
+    loop_state = load_sim_state(str(tmp_path), loaded)
+
+    assert loop_state == {"step": 3000}
+    assert loaded.clock.start_ms == 1000000
+    assert loaded.clock.now_ms() == 1600000
+    # 時計を戻したため時刻の属性はそのまま
+    assert loaded.go_possible_time == 1590000
+
+
+def test_wall_clock_attributes_are_shifted_by_the_elapsed_time(tmp_path, monkeypatch):
+    monkeypatch.setattr("sim_clock.time.time", lambda: 1000.0)
+    saved = make_sim(WallClock(), 600000)
+    saved.go_possible_time = 995000
+    saved.change_time = 0
+    save_checkpoint(str(tmp_path), saved, FAKE_TRACI, {})
+
+    monkeypatch.setattr("sim_clock.time.time", lambda: 2000.0)
+    loaded = make_sim(WallClock(), 600000)
+    load_sim_state(str(tmp_path), loaded)
+
+    assert loaded.go_possible_time == 995000 + 1000000
+    # 0(未設定)はずらさない
+    assert loaded.change_time == 0
+
+
+def test_random_state_is_restored(tmp_path):
+    random.seed(1)
+    save_checkpoint(str(tmp_path), make_sim(WallClock(), 0), FAKE_TRACI, {})
+    expected = [random.random() for _ in range(3)]
+
+    random.seed(2)
+    load_sim_state(str(tmp_path), make_sim(WallClock(), 0))
+    assert [random.random() for _ in range(3)] == expected
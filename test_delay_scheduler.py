@@ -0,0 +1,38 @@
+from delay_scheduler import DelayScheduler
+
+
+def test_pop_due_returns_commands_in_send_time_order():
+    scheduler = DelayScheduler()
+    scheduler.schedule(600, "c")
+    scheduler.schedule(200, "a")
+    scheduler.schedule(400, "b")
+    assert scheduler.next_time() == 200
+
+    assert scheduler.pop_due(100) == []
+    assert scheduler.pop_due(400) == ["a", "b"]
+    assert scheduler.pending() == 1
+    assert scheduler.pop_due(800) == ["c"]
+    assert scheduler.next_time() is None
+
+
+def test_same_send_time_keeps_schedule_order():
+    scheduler = DelayScheduler()
+    for data in ("a", "b", "c", "d"):
+        scheduler.schedule(1000, data)
+    assert scheduler.pop_due(1000) == ["a", "b", "c", "d"]
+
+
+def test_stats_track_lateness_and_pending():
+    scheduler = DelayScheduler()
+    scheduler.schedule(100, "a")
+    scheduler.schedule(150, "b")
+    scheduler.schedule(500, "c")
+    scheduler.pop_due(200)
+
+    stats = scheduler.stats()
+    assert stats["scheduled"] == 3
+    assert stats["released"] == 2
+    assert stats["pending"] == 1
+    assert stats["max_pending"] == 3
+    assert stats["lateness_avg_ms"] == 75
+    assert stats["lateness_max_ms"] == 100
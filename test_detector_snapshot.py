@@ -0,0 +1,43 @@
+import pytest
+
+from detector_snapshot import DetectorSnapshot, get_vehicle_magnification
+
+
+def test_positions_and_order():
+    # 検出器の長さ30m、車両の長さ5m(倍率1.2)
+    snapshot = DetectorSnapshot.build(1000, [
+        ("SI", 30.0, [("a", 20.0, 5.0, 5.0), ("b", 5.0, 3.0, 5.0), ("c", 28.0, 1.0, 5.0)]),
+    ])
+    state = snapshot.get("SI")
+    assert state.vehicle_ids == ("a", "b", "c")
+    assert state.position[True]["b"] == pytest.approx(6.0)
+    assert state.position[True]["a"] == pytest.approx(24.0)
+    # 接近側で検出器を超える車両は対象外
+    assert "c" not in state.position[True]
+    assert snapshot.get_sorted_vehicle_ids("SI", True) == ("b", "a")
+    assert snapshot.get_sorted_vehicle_ids("SI", False) == ("c", "a", "b")
+    assert snapshot.get_dist_to_end("SI", "a") == 20.0
+
+
+def test_vehicle_as_long_as_the_detector_has_no_position():
+    snapshot = DetectorSnapshot.build(1000, [
+        ("SI", 10.0, [("truck", 4.0, 5.0, 10.0), ("bus", 4.0, 5.0, 12.0), ("car", 5.0, 5.0, 5.0)]),
+    ])
+    state = snapshot.get("SI")
+    assert state.vehicle_ids == ("truck", "bus", "car")
+    assert state.speed["truck"] == 5.0
+    assert snapshot.get_sorted_vehicle_ids("SI", True) == ("car",)
+    assert snapshot.get_sorted_vehicle_ids("SI", False) == ("car",)
+
+
+def test_get_vehicle_magnification():
+    assert get_vehicle_magnification(30.0, 5.0) == pytest.approx(1.2)
+    assert get_vehicle_magnification(10.0, 10.0) is None
+    assert get_vehicle_magnification(10.0, 12.0) is None
+
+
+def test_unknown_detector():
+    snapshot = DetectorSnapshot.build(0, [])
+    assert snapshot.get("SI") is None
+    assert snapshot.get_vehicle_ids("SI") is None
+    assert "SI" not in snapshot
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from event_journal import EventJournal, read_journal, get_index_path, JOURNAL_COMPRESSION_GZIP, JOURNAL_COMPRESSION_ZSTD, JOURNAL_OUTBOUND
+
+
+def write_journal(path, compression, sim_times, block_size=2):
+    journal = EventJournal(path, compression, block_size=block_size)
+    for sim_time in sim_times:
+        journal.record(JOURNAL_OUTBOUND, sim_time, "NODEPC01", "0xF0010010", b'{"t":%d}' % (sim_time))
+    journal.close()
+    return journal
+
+
+def test_read_all_records(tmp_path):
+    path = str(tmp_path / "journal.ndjson.gz")
+    journal = write_journal(path, JOURNAL_COMPRESSION_GZIP, [0, 200, 400, 600, 800])
+    assert journal.stats() == {"records": 5, "blocks": 3}
+
+    records = list(read_journal(path))
+    assert [record["sim_time"] for record in records] == [0, 200, 400, 600, 800]
+    assert records[0]["node"] == "NODEPC01"
+    assert records[0]["payload"] == {"t": 0}
+
+
+def test_range_read_returns_only_records_in_range(tmp_path):
+    path = str(tmp_path / "journal.ndjson.gz")
+    write_journal(path, JOURNAL_COMPRESSION_GZIP, range(0, 2000, 100))
+    assert [record["sim_time"] for record in read_journal(path, 450, 800)] == [500, 600, 700, 800]
+    assert [record["sim_time"] for record in read_journal(path, sim_time_begin=1700)] == [1700, 1800, 1900]
+    assert [record["sim_time"] for record in read_journal(path, sim_time_end=100)] == [0, 100]
+
+
+@pytest.mark.parametrize("compression", [JOURNAL_COMPRESSION_GZIP, JOURNAL_COMPRESSION_ZSTD])
+def test_read_without_index_reads_every_block(tmp_path, compression):
+    if compression == JOURNAL_COMPRESSION_ZSTD:
+        pytest.importorskip("zstandard")
+    path = str(tmp_path / ("journal.ndjson" + (".zst" if compression == JOURNAL_COMPRESSION_ZSTD else ".gz")))
+    write_journal(path, compression, [0, 200, 400, 600, 800])
+    os.remove(get_index_path(path))
+
+    assert [record["sim_time"] for record in read_journal(path)] == [0, 200, 400, 600, 800]
+    assert [record["sim_time"] for record in read_journal(path, 300, 700)] == [400, 600]
+
+
+def test_records_after_close_are_ignored(tmp_path):
+    path = str(tmp_path / "journal.ndjson.gz")
+    journal = write_journal(path, JOURNAL_COMPRESSION_GZIP, [0])
+    journal.record(JOURNAL_OUTBOUND, 200, "NODEPC01", "0xF0010010", b'{}')
+    assert [record["sim_time"] for record in read_journal(path)] == [0]
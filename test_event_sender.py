@@ -0,0 +1,131 @@
+import threading
+
+import pytest
+
+from event_sender import EventSender, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL, BATCH_CONTENT_TYPES, BATCH_FORMAT_JSON, BATCH_FORMAT_NDJSON, pack_commands, unpack_commands
+
+
+# 最初のコマンドの送信中にワーカーを止めておく送信関数
+class BlockingPost:
+
+    def __init__(self) -> None:
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.sent = []
+
+    def __call__(self, data):
+        self.started.set()
+        self.release.wait(5)
+        self.sent.append(data)
+
+
+def test_commands_of_one_node_are_sent_in_order():
+    sent = {}
+    lock = threading.Lock()
+
+    def post(data):
+        node_id, number = data.split(":")
+        with lock:
+            sent.setdefault(node_id, []).append(int(number))
+
+    sender = EventSender(post, worker_number=4)
+    for number in range(200):
+        for node_id in ("NODEPC01", "NODEPC02", "NODEPC03"):
+            sender.enqueue(node_id, "%s:%d" % (node_id, number))
+    sender.close()
+
+    assert sorted(sent) == ["NODEPC01", "NODEPC02", "NODEPC03"]
+    for numbers in sent.values():
+        assert numbers == list(range(200))
+    assert sender.stats()["sent"] == 600
+
+
+def test_drop_oldest_discards_the_oldest_pending_command():
+    post = BlockingPost()
+    sender = EventSender(post, queue_size=1, overflow_policy=OVERFLOW_DROP_OLDEST)
+    assert sender.enqueue("NODEPC01", "a")
+    assert post.started.wait(5)
+    assert sender.enqueue("NODEPC01", "b")
+    assert sender.enqueue("NODEPC01", "c")
+    post.release.set()
+    sender.close()
+
+    assert post.sent == ["a", "c"]
+    stats = sender.stats()
+    assert stats["enqueued"] == 3
+    assert stats["dropped"] == 1
+    assert stats["sent"] == 2
+
+
+def test_spill_records_and_counts_the_overflowing_command(tmp_path):
+    spill_file = tmp_path / "spill.ndjson"
+    post = BlockingPost()
+    sender = EventSender(post, queue_size=1, overflow_policy=OVERFLOW_SPILL, spill_file=str(spill_file))
+    assert sender.enqueue("NODEPC01", b'{"n":1}')
+    assert post.started.wait(5)
+    assert sender.enqueue("NODEPC01", b'{"n":2}')
+    # 溢れたコマンドは送信せずに記録のみ
+    assert not sender.enqueue("NODEPC01", b'{"n":3}')
+    post.release.set()
+    sender.close()
+
+    assert post.sent == [b'{"n":1}', b'{"n":2}']
+    assert spill_file.read_bytes() == b'{"n":3}\n'
+    stats = sender.stats()
+    assert stats["spilled"] == 1
+    assert stats["dropped"] == 1
+    assert stats["sent"] == 2
+
+
+def test_post_errors_are_counted_and_do_not_stop_the_worker():
+    sent = []
+
+    def post(data):
+        if data == "bad":
+            raise OSError("connection refused")
+        sent.append(data)
+
+    sender = EventSender(post)
+    for data in ("a", "bad", "b"):
+        sender.enqueue("NODEPC01", data)
+    sender.close()
+
+    assert sent == ["a", "b"]
+    assert sender.stats()["error"] == 1
+
+
+def test_closed_sender_rejects_commands():
+    sender = EventSender(lambda data: None)
+    sender.close()
+    assert not sender.enqueue("NODEPC01", "a")
+
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        EventSender(lambda data: None, overflow_policy="retry")
+
+
+COMMANDS = [b'{"CommandID":"0xF0010010","Value":{"Color":"0"}}', b'{"CommandID":"0xF0060000","Value":{"Direction":"-1"}}']
+
+
+def test_unpack_single_command():
+    assert unpack_commands(COMMANDS[0]) == [{"CommandID": "0xF0010010", "Value": {"Color": "0"}}]
+
+
+def test_unpack_json_batch():
+    body = pack_commands(COMMANDS, BATCH_FORMAT_JSON)
+    assert unpack_commands(body, BATCH_CONTENT_TYPES[BATCH_FORMAT_JSON]) == [
+        {"CommandID": "0xF0010010", "Value": {"Color": "0"}},
+        {"CommandID": "0xF0060000", "Value": {"Direction": "-1"}},
+    ]
+
+
+def test_unpack_ndjson_batch_with_and_without_content_type():
+    body = pack_commands(COMMANDS, BATCH_FORMAT_NDJSON)
+    expected = [
+        {"CommandID": "0xF0010010", "Value": {"Color": "0"}},
+        {"CommandID": "0xF0060000", "Value": {"Direction": "-1"}},
+    ]
+    assert unpack_commands(body, "application/x-ndjson; charset=utf-8") == expected
+    assert unpack_commands(body) == expected
+    assert unpack_commands(body.decode("utf-8").replace("\n", "\r\n")) == expected
@@ -0,0 +1,45 @@
+from history_writer import HistoryWriter, create_history_writer, HISTORY_FORMAT_TEXT
+
+
+def test_header_is_written_once_when_the_file_is_reopened(tmp_path):
+    writer = HistoryWriter(str(tmp_path))
+    writer.write("insideCar.txt", ["1000", "0", "3"])
+    writer.close()
+
+    # 2回目の実行(追記)ではヘッダを出力しない
+    writer = HistoryWriter(str(tmp_path))
+    writer.write("insideCar.txt", ["1200", "200", "4"])
+    writer.close()
+
+    assert (tmp_path / "insideCar.txt").read_text() == "#time, sim_time, inside_car_count\n1000, 0, 3\n1200, 200, 4\n"
+
+
+def test_write_header_creates_an_empty_history(tmp_path):
+    writer = HistoryWriter(str(tmp_path))
+    writer.write_header("timeout.txt")
+    writer.write("timeout.txt", [])
+    writer.close()
+    assert (tmp_path / "timeout.txt").read_text() == "#start_time, start_sim_time, TimeOutSide\n"
+
+
+def test_files_without_header(tmp_path):
+    writer = HistoryWriter(str(tmp_path))
+    writer.write("other.txt", ["a", "b"])
+    writer.close()
+    assert (tmp_path / "other.txt").read_text() == "a, b\n"
+
+
+def test_lines_are_buffered_until_flush_size(tmp_path):
+    writer = HistoryWriter(str(tmp_path), flush_size=3, flush_interval=3600)
+    writer.write("other.txt", ["1"])
+    writer.write("other.txt", ["2"])
+    assert (tmp_path / "other.txt").read_text() == ""
+    writer.write("other.txt", ["3"])
+    assert (tmp_path / "other.txt").read_text() == "1\n2\n3\n"
+    writer.close()
+
+
+def test_create_text_writer(tmp_path):
+    writer = create_history_writer(str(tmp_path), HISTORY_FORMAT_TEXT, 10, 1.0)
+    assert isinstance(writer, HistoryWriter)
+    writer.close()
@@ -0,0 +1,82 @@
+import http.client
+import http.server
+import threading
+import time
+
+import pytest
+
+from http_pool import HttpConnectionPool
+
+
+# keep-aliveの受信サーバ(受信した本文を記録する)
+#   本文が"drop"の場合はレスポンスを返さずに切断する
+#   本文が"close"の場合はkeep-aliveのレスポンスを返した後に切断する(待機中の切断)
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append(body)
+        if body == b"drop":
+            self.close_connection = True
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+        if body == b"close":
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.received = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get_url(server):
+    return "http://127.0.0.1:%d/" % (server.server_address[1])
+
+
+def test_connection_is_reused(server):
+    pool = HttpConnectionPool()
+    for i in range(3):
+        assert pool.post(get_url(server), b"%d" % (i), {}) == (200, b"ok")
+    stats = pool.stats()
+    assert stats["request"] == 3
+    assert stats["connect"] == 1
+    assert stats["reuse_rate"] == pytest.approx(2 / 3)
+    pool.close()
+
+
+def test_connection_closed_while_idle_is_not_reused(server):
+    pool = HttpConnectionPool()
+    url = get_url(server)
+    pool.post(url, b"close", {})
+    time.sleep(0.1)
+
+    assert pool.post(url, b"2", {}) == (200, b"ok")
+    assert server.received == [b"close", b"2"]
+    assert pool.stats()["stale"] == 1
+    assert pool.stats()["connect"] == 2
+    pool.close()
+
+
+def test_request_is_not_sent_twice_when_the_response_is_lost(server):
+    pool = HttpConnectionPool()
+    url = get_url(server)
+    pool.post(url, b"1", {})
+    with pytest.raises(http.client.RemoteDisconnected):
+        pool.post(url, b"drop", {})
+    # サーバに届いた可能性があるため再送しない
+    assert server.received == [b"1", b"drop"]
+    assert pool.stats()["reconnect"] == 0
+    pool.close()
@@ -0,0 +1,67 @@
+from interval_index import IntervalIndex, SensorIntervalIndex, SensorRuleIndex
+
+
+def test_overlapping_intervals_are_merged():
+    index = IntervalIndex([(500, 900), (100, 300), (250, 400), (1000, 1000), (700, 800)])
+    assert index.begins == [100, 500, 1000]
+    assert index.ends == [400, 900, 1000]
+
+
+def test_contains_includes_begin_and_end():
+    index = IntervalIndex([(100, 200), (400, 500)])
+    assert [index.contains(t) for t in (99, 100, 150, 200, 201, 399, 400, 500, 501)] == \
+        [False, True, True, True, False, False, True, True, False]
+
+
+def test_contains_after_time_goes_back():
+    # 時間が戻った場合は前回の検索位置を使わずに検索し直す
+    index = IntervalIndex([(100, 200), (400, 500)])
+    assert index.contains(450)
+    assert index.contains(150)
+    assert not index.contains(300)
+    assert index.contains(400)
+
+
+def test_reversed_interval_is_ignored():
+    index = IntervalIndex([(300, 100)])
+    assert len(index) == 0
+    assert not index.contains(200)
+
+
+def test_sensor_zero_applies_to_every_sensor_of_the_node():
+    index = SensorIntervalIndex([
+        (1, 0, 100, 200),
+        (1, 5, 300, 400),
+        (2, 5, 500, 600),
+    ])
+    assert index.contains(1, 5, 150)
+    assert index.contains(1, 5, 350)
+    assert index.contains(1, 7, 150)
+    assert not index.contains(1, 7, 350)
+    assert not index.contains(2, 5, 150)
+    assert index.contains(2, 5, 550)
+    assert not index.contains(3, 5, 150)
+
+
+def test_rule_index_prefers_the_earliest_defined_rule():
+    index = SensorRuleIndex([
+        (1, 5, 100, 500, "first"),
+        (1, 5, 200, 300, "second"),
+        (1, 0, 0, 1000, "all"),
+    ])
+    assert index.find(1, 5, 250) == "first"
+    assert index.find(1, 5, 600) == "all"
+    assert index.find(1, 7, 250) == "all"
+    assert index.find(1, 5, 1001) is None
+    assert index.find(2, 5, 250) is None
+
+
+def test_rule_index_finds_rule_behind_a_later_short_rule():
+    # Beginが後のルールが終わっていても、前から続いている長いルールを見つける
+    index = SensorRuleIndex([
+        (1, 5, 400, 450, "short"),
+        (1, 5, 0, 1000, "long"),
+    ])
+    assert index.find(1, 5, 420) == "short"
+    assert index.find(1, 5, 500) == "long"
+    assert index.find(1, 5, 0) == "long"